@@ -1,14 +1,12 @@
 """From alignment info summary to generate graph."""
 import re
 import igraph as ig
-from dataclasses import astuple, asdict
-from utils import load_pickle
+import registry
+from registry import DATA
 import bitexts
 
-DB = load_pickle("../cache/bitexts.db")
-translator_lst = DB.translators
-metacode2lemma_map_src = load_pickle("../cache/metacode2lemma_src.pkl")
-metacode2lemma_map_tar = load_pickle("../cache/metacode2lemma_tar.pkl")
+# DB, translator_lst and metacode2lemma_map_* are loaded on first use
+__getattr__ = registry.module_getattr(__name__)
 romaji2kanji_map = {
     "kaneko": "金子",
     "katagiri": "片桐",
@@ -47,9 +45,9 @@ def retrive_igraph(*source_words):
     :return graph: igraph-converted information.
     """
     target_word_set = set()
-    alignment_lst = DB.query_improper_alignment_by_word(*source_words)    
+    alignment_lst = DATA.db.query_improper_alignment_by_word(*source_words)    
     alignment_lst = list(_filter(alignment_lst))
-    alignment_summary = bitexts.AlignmentSummary(alignment_lst)
+    alignment_summary = bitexts.AlignmentSummary(alignment_lst, DATA.translators)
     edge_info = alignment_summary.summary  # For edges' annotation
 
     # Aligned target word generator
@@ -65,7 +63,7 @@ def retrive_igraph(*source_words):
     def source_nodes():
         for word in source_words:
             name = word
-            node = metacode2lemma_map_src[word]
+            node = DATA.metacode2lemma_src[word]
             node_type = 1
             type_label = "source"
             weight = 0
@@ -83,7 +81,7 @@ def retrive_igraph(*source_words):
     def target_nodes():
         for word in target_words():
             name = word
-            node = metacode2lemma_map_tar[word]
+            node = DATA.metacode2lemma_tar[word]
             node_type = 2
             type_label = "target"
             weight = 0
@@ -98,8 +96,8 @@ def retrive_igraph(*source_words):
                 if source_metacode[:4] == target_metacode[:4]:
                     node_type = 3
                     type_label = "dublicate"
-                path = "{} <= {}".format(metacode2lemma_map_src[source_node],
-                                         metacode2lemma_map_tar[target_node])
+                path = "{} <= {}".format(DATA.metacode2lemma_src[source_node],
+                                         DATA.metacode2lemma_tar[target_node])
                 if path not in meta_attr_dict:
                     meta_attr_dict[path] = {}
                 source = f"[Source text {int(info.poem):04d}] {info.source_surface}"
@@ -112,15 +110,14 @@ def retrive_igraph(*source_words):
 
     # Edge generator with detailed information
     def edges():
-        for info in edge_info:
-            info = astuple(info)
-            weight = info[1]
-            source_node = info[0][0]
-            target_node = info[0][1]
-            path = "{} <= {}".format(metacode2lemma_map_src[source_node],
-                                     metacode2lemma_map_tar[target_node])
-            weight = info[1]
-            fields = [f"{i:2d} ({i/weight*100:000.1f}%)" for i in info[2:]]
+        for stat in edge_info:
+            source_node, target_node = stat.alignment
+            path = "{} <= {}".format(DATA.metacode2lemma_src[source_node],
+                                     DATA.metacode2lemma_tar[target_node])
+            weight = stat.total
+            fields = [
+                f"{i:2d} ({i/weight*100:000.1f}%)" for i in stat.counts.tolist()
+            ]
             yield (source_node, target_node, weight, path, *fields)
 
     # Igraph construction
@@ -128,7 +125,7 @@ def retrive_igraph(*source_words):
     edge_lst = list(edges())
     graph = ig.Graph.TupleList(edge_lst,
                                directed=False,
-                               edge_attrs=["weight", "path", *translator_lst])
+                               edge_attrs=["weight", "path", *DATA.translators])
     for node_attr in node_lst:
         name, node, node_type, type_label, weight, meta_attr_dict = node_attr
         for v in graph.vs:
@@ -150,9 +147,9 @@ def retrive_igraph_by_translator(*source_words):
     """
     target_word_set = set()
     source_word_translator_set = set()
-    alignment_lst = DB.query_improper_alignment_by_word(*source_words)    
+    alignment_lst = DATA.db.query_improper_alignment_by_word(*source_words)    
     alignment_lst = list(_filter(alignment_lst))
-    alignment_summary = bitexts.AlignmentSummary(alignment_lst)
+    alignment_summary = bitexts.AlignmentSummary(alignment_lst, DATA.translators)
     edge_info = alignment_summary.alignment_info  # For edges' annotation
 
     # Edge by translator generator
@@ -160,10 +157,7 @@ def retrive_igraph_by_translator(*source_words):
         for stat in alignment_summary.summary:
             source_word = stat.alignment[0]
             target_word = stat.alignment[1]
-            stat = asdict(stat)
             for (key, value) in stat.items():
-                if (key == "alignment") or (key == "total"):
-                    continue
                 source_node = f"{source_word}-{key}"
                 target_node = target_word
                 weight = value
@@ -199,7 +193,7 @@ def retrive_igraph_by_translator(*source_words):
             source_word = row[0]
             translator = row[1]
             name = source_word + "-" + translator
-            node = f"{metacode2lemma_map_src[source_word]} ({romaji2kanji_map[translator]})"
+            node = f"{DATA.metacode2lemma_src[source_word]} ({romaji2kanji_map[translator]})"
             node_type = 1
             type_label = "source"
             weight = 0
@@ -214,7 +208,7 @@ def retrive_igraph_by_translator(*source_words):
     def target_nodes():
         for word in target_words():
             name = word
-            node = metacode2lemma_map_tar[word]
+            node = DATA.metacode2lemma_tar[word]
             node_type = 2
             type_label = "target"
             weight = 0
@@ -253,9 +247,9 @@ def retrive_igraph_by_poem_by_translator(idx: str, *source_words):
     """
     target_word_set = set()
     source_word_translator_set = set()
-    alignment_lst = DB.query_improper_alignment_by_word_in_poem(idx, *source_words)    
+    alignment_lst = DATA.db.query_improper_alignment_by_word_in_poem(idx, *source_words)    
     alignment_lst = list(_filter(alignment_lst))
-    alignment_summary = bitexts.AlignmentSummary(alignment_lst)
+    alignment_summary = bitexts.AlignmentSummary(alignment_lst, DATA.translators)
     edge_info = alignment_summary.alignment_info  # For edges" annotation
 
     # Edge by translator generator
@@ -263,10 +257,7 @@ def retrive_igraph_by_poem_by_translator(idx: str, *source_words):
         for stat in alignment_summary.summary:
             source_word = stat.alignment[0]
             target_word = stat.alignment[1]
-            stat = asdict(stat)
             for (key, value) in stat.items():
-                if (key == "alignment") or (key == "total"):
-                    continue
                 source_node = f"{source_word}-{key}"
                 target_node = target_word
                 weight = value
@@ -302,7 +293,7 @@ def retrive_igraph_by_poem_by_translator(idx: str, *source_words):
             source_word = row[0]
             translator = row[1]
             name = source_word + "-" + translator
-            node = f"{metacode2lemma_map_src[source_word]} ({romaji2kanji_map[translator]})"
+            node = f"{DATA.metacode2lemma_src[source_word]} ({romaji2kanji_map[translator]})"
             node_type = 1
             type_label = "source"
             weight = 0
@@ -317,7 +308,7 @@ def retrive_igraph_by_poem_by_translator(idx: str, *source_words):
     def target_nodes():
         for word in target_words():
             name = word
-            node = metacode2lemma_map_tar[word]
+            node = DATA.metacode2lemma_tar[word]
             node_type = 2
             type_label = "target"
             weight = 0
@@ -1,15 +1,13 @@
-"""Dash board."""
-import pandas as pd
-from plotly.graph_objs import Scatter, Layout, Figure
-from plotly.graph_objs.layout import XAxis, YAxis, Margin
+"""Dash board.
+
+Figures, pandas and the shared data are loaded by the callbacks that use
+them, so that starting the app stays fast.
+"""
+from functools import lru_cache
 import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
-from bitexts import AlignmentInfo
-from utils import load_pickle, lemma2metacode
-from visualize_indivisual import draw_plotly_by_translator_by_poem
-from visualize_aggregate_translator import draw_plotly_by_translator
-from visualize_alignment import query, alignment_table, visualize_heatmap 
+from registry import DATA
 
 fullname2id_map = {
     "[金子] Kaneko, Motoomi (1933)": "kaneko",
@@ -24,14 +22,24 @@ fullname2id_map = {
     "[片桐] Katagiri, Yoichi (1998)": "katagiri",
 }
 translator_lst = fullname2id_map.keys()
-metacode2lemma_map_src = load_pickle("../cache/metacode2lemma_src.pkl")
-word_lst = [k + ":" + v  for k, v in metacode2lemma_map_src.items() if k[:8] == "BG-01-55"]
-word_lst.sort()
-with open("../README-app.md", 'r') as f: 
-    readme = f.read()
+
+
+@lru_cache(maxsize=None)
+def _readme():
+    with open("../README-app.md", 'r') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def _word_lst():
+    """Return "metacode:lemma" options of the word dropdown, sorted."""
+    index = DATA.metacode2lemma_src
+    return sorted(k + ":" + index[k] for k in index.with_prefix("BG-01-55"))
 
 
 def _blank(width, height, text, font_size): 
+    from plotly.graph_objs import Scatter, Layout, Figure
+    from plotly.graph_objs.layout import XAxis, YAxis, Margin
     Xn = [0]
     Yn = [0]
     trace = Scatter(
@@ -95,7 +103,7 @@ app = dash.Dash(
     ],
 )
 
-app.layout = html.Div(
+layout = html.Div(
     children=[
         # title
         html.H1(
@@ -119,7 +127,7 @@ app.layout = html.Div(
                     children=html.Div(
                         className="control-tab",
                         children=[
-                            dcc.Markdown(readme),
+                            dcc.Markdown(id="readme"),  # serve_layout
                         ],
                     ),
                 ),
@@ -139,10 +147,7 @@ app.layout = html.Div(
                                         html.Label("Word:"),
                                         dcc.Dropdown(
                                             id="target",
-                                            options=[
-                                                {"label": i, "value": i} 
-                                                for i in word_lst
-                                            ],
+                                            options=[],  # serve_layout
                                             value="BG-01-5520-05-0106:女郎花",
                                             multi=False,
                                         ),
@@ -295,6 +300,25 @@ app.layout = html.Div(
                       )
 
 
+def serve_layout():
+    """Return the layout with the README and the word options.
+
+    Dash calls it on page load, so the README and the metacode2lemma map
+    are read on the first request instead of at import.
+    """
+    layout["readme"].children = _readme()
+    layout["target"].options = [
+        {"label": i, "value": i} for i in _word_lst()
+    ]
+    return layout
+
+
+# Callbacks are validated against the static layout; otherwise assigning
+# the layout function would call it right away.
+app.validation_layout = layout
+app.layout = serve_layout
+
+
 # Data table
 @app.callback(
     [Output("datatable-paging", "page_current"),
@@ -307,6 +331,8 @@ app.layout = html.Div(
     [State("datatable-paging", "data")]
 )
 def update_table(page_current, page_size, target, translator, table_data):
+    import pandas as pd
+    from visualize_alignment import query
     target, word = target.split(":")
     translator = fullname2id_map[translator]
     candidates = query(target, translator)
@@ -342,6 +368,8 @@ def update_table(page_current, page_size, target, translator, table_data):
 def update_alignment_and_individual_network_graph(
         active_cell, page_current, page_size, 
         translator, target, table_data):
+    from visualize_indivisual import draw_plotly_by_translator_by_poem
+    from visualize_alignment import query, alignment_table, visualize_heatmap
     try:
         target, word = target.split(":")
         translator = fullname2id_map[translator]
@@ -383,6 +411,7 @@ def update_alignment_and_individual_network_graph(
     [Input("target", "value")]
 )
 def update_translator_network(target):
+    from visualize_aggregate_translator import draw_plotly_by_translator
     try:
         target = target.split(":")[0]
         fig = draw_plotly_by_translator(target)
@@ -0,0 +1,518 @@
+"""Benchmark pipeline stages and write timings to ../artifacts."""
+import csv
+import os
+import subprocess
+import sys
+import time
+import argparse
+from logging import basicConfig, getLogger, DEBUG
+import numpy as np
+from utils import load_corpus, load_hyparam
+
+
+def _best_of(func, repeat):
+    """Return best wall time in seconds and the last result of func."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), res
+
+
+def _write(name, header, rows):
+    """Output benchmark table as ../artifacts/benchmark_{name}.csv."""
+    with open(f"../artifacts/benchmark_{name}.csv", "w") as fp:
+        writer = csv.writer(fp, delimiter=",")
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def em_shards(args):
+    """Sharded E-step against the single-process trainer.
+
+    Sharding only pays off with a core per worker and a corpus whose
+    E-step outweighs the per-iteration exchange with the workers;
+    ``--em_scale`` repeats the bitexts to time larger corpora.
+    """
+    from methods import ibm2_numpy
+    logger = getLogger(__name__)
+    bitexts = load_corpus(args.corpus_path, ["source", "target"])
+    hyparams = load_hyparam("hyparam_ibm2.yaml")
+    corpus = ibm2_numpy.prepare(
+        bitexts.source.tolist() * args.em_scale,
+        bitexts.target.tolist() * args.em_scale)
+    cpus = os.cpu_count()
+    if max(args.workers) > cpus:
+        logger.warning(f"[WARNING] {cpus} CPU(s) for up to "
+                       f"{max(args.workers)} workers: extra workers only "
+                       "add overhead")
+    rows = []
+    baseline = None
+    for workers in args.workers:
+        elapsed, (translation, alignment) = _best_of(
+            lambda: ibm2_numpy.fit(corpus, hyparams.iterations, workers),
+            args.repeat)
+        _, (translation_again, _) = _best_of(
+            lambda: ibm2_numpy.fit(corpus, hyparams.iterations, workers), 1)
+        if baseline is None:
+            baseline = elapsed, translation
+        deterministic = bool((translation == translation_again).all())
+        max_diff = float(np.abs(translation - baseline[1]).max())
+        logger.info(f"[INFO] {workers} worker(s): {elapsed:.2f}s, "
+                    f"speedup {baseline[0] / elapsed:.2f}x, "
+                    f"max diff {max_diff:.1e}, deterministic {deterministic}")
+        rows.append([
+            workers, cpus,
+            len(bitexts) * args.em_scale, f"{elapsed:.3f}",
+            f"{baseline[0] / elapsed:.2f}", f"{max_diff:.1e}", deterministic
+        ])
+    _write("em_shards", [
+        "workers", "cpus", "bitexts", "seconds", "speedup",
+        "max diff to first", "deterministic"
+    ], rows)
+
+
+def alignment_summary(args):
+    """Indexed AlignmentSummary queries against linear scans.
+
+    Uses the source word with the most improper alignments and repeats the
+    queries made while building its graph: details of every source and
+    target node, and the summary of every edge.
+    """
+    import bitexts
+    import registry
+    logger = getLogger(__name__)
+    db = registry.get_db(args.db_path)
+    counts = {}
+    for bitext in db:
+        for source, _ in bitext.improper_alignment():
+            counts[source] = counts.get(source, 0) + 1
+    word = max(counts, key=counts.get)
+    summary = bitexts.AlignmentSummary(
+        list(db.query_improper_alignment_by_word(word)), db.translators)
+    targets = list(dict.fromkeys(stat.alignment[1] for stat in summary.summary))
+    alignments = [stat.alignment for stat in summary.summary]
+
+    def scan():
+        list(info for info in summary.alignment_info
+             if info.alignment[0] == word)
+        for target in targets:
+            list(info for info in summary.alignment_info
+                 if info.alignment[1] == target)
+        for alignment in alignments:
+            list(stat for stat in summary.summary
+                 if stat.alignment == alignment)
+
+    def indexed():
+        list(summary.query_details_by_source(word))
+        for target in targets:
+            list(summary.query_details_by_target(target))
+        for alignment in alignments:
+            list(summary.query_summary(alignment))
+
+    scan_elapsed, _ = _best_of(scan, args.repeat)
+    indexed_elapsed, _ = _best_of(indexed, args.repeat)
+    logger.info(f"[INFO] {word}: {len(summary.alignment_info)} alignments, "
+                f"{len(targets)} target nodes; scan {scan_elapsed:.4f}s, "
+                f"indexed {indexed_elapsed:.4f}s")
+    _write("alignment_summary",
+           ["word", "alignments", "target nodes", "scan", "indexed"],
+           [[word, len(summary.alignment_info), len(targets),
+             f"{scan_elapsed:.6f}", f"{indexed_elapsed:.6f}"]])
+
+
+def poem_strings(args):
+    """Grouped poem assembly against per-poem prefix matching."""
+    import make_bitext
+    logger = getLogger(__name__)
+    kokin_voc = make_bitext._read_kokin_voc(args.src_path)
+
+    def per_poem():
+        poems = kokin_voc.poem_id.unique()
+        rows = []
+        for poem_idx in poems:
+            token = kokin_voc[kokin_voc.poem_id.str.match(poem_idx)]
+            surface = "".join(map(str, token.surface))
+            bg_id = "/".join(filter(lambda x: "BG-16" not in x, token.bg_id))
+            rows.append((poem_idx, bg_id, surface))
+        return rows
+
+    per_poem_elapsed, reference = _best_of(per_poem, args.repeat)
+    grouped_elapsed, poems = _best_of(
+        lambda: make_bitext._poem2str(kokin_voc), args.repeat)
+    differ = sum(
+        ref != row for ref, row in zip(reference, poems.itertuples(
+            index=False, name=None)))
+    logger.info(f"[INFO] {len(poems)} poems, {len(kokin_voc)} tokens: "
+                f"per poem {per_poem_elapsed:.3f}s, "
+                f"grouped {grouped_elapsed:.3f}s, {differ} poem(s) differ")
+    _write("poem_strings",
+           ["poems", "tokens", "per poem", "grouped", "poems differ"],
+           [[len(poems), len(kokin_voc), f"{per_poem_elapsed:.4f}",
+             f"{grouped_elapsed:.4f}", differ]])
+
+
+def _memory_mb():
+    """Return (RSS, PSS, private) memory of this process in MB."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as fp:
+        for line in fp:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return (fields["Rss"], fields["Pss"],
+            fields["Private_Clean"] + fields["Private_Dirty"])
+
+
+def _db_worker(path, barrier, queue):
+    """Load the DB through the registry, query it and report memory."""
+    import registry
+    start = time.perf_counter()
+    db = registry.get_db(path)
+    elapsed = time.perf_counter() - start
+    words = db.vocabulary.tokens[:10]
+    list(db.query_improper_alignment_by_word(*words))
+    for bitext in db:
+        bitext.source_surface, bitext.target_surface
+    barrier.wait()  # measure while every worker holds the DB
+    queue.put((elapsed, *_memory_mb()))
+    barrier.wait()
+
+
+def db_memory(args):
+    """Memory of forked workers holding a pickled or memory-mapped DB.
+
+    Each worker loads the DB through ``registry.get_db`` (after the parent
+    did, with ``preload``) and queries it; RSS, PSS (shared pages divided
+    among the processes mapping them) and private memory are measured
+    while all workers are alive.  The total PSS of the workers is what
+    they cost together.
+    """
+    import multiprocessing
+    import registry
+    logger = getLogger(__name__)
+    context = multiprocessing.get_context("fork")
+    n_workers = max(args.workers)
+    rows = []
+    for path in args.db_paths:
+        for preload in (False, True):
+            if preload:
+                registry.get_db(path)
+            barrier = context.Barrier(n_workers)
+            queue = context.Queue()
+            workers = [
+                context.Process(target=_db_worker,
+                                args=(path, barrier, queue))
+                for _ in range(n_workers)
+            ]
+            for worker in workers:
+                worker.start()
+            results = np.array([queue.get() for _ in workers])
+            for worker in workers:
+                worker.join()
+            registry.clear()
+            elapsed, rss, pss, private = results.mean(axis=0)
+            total_pss = results[:, 2].sum()
+            logger.info(f"[INFO] {path} (preload {preload}), {n_workers} "
+                        f"workers: load {elapsed:.3f}s, per worker RSS "
+                        f"{rss:.1f}MB, PSS {pss:.1f}MB, private "
+                        f"{private:.1f}MB; total PSS {total_pss:.1f}MB")
+            rows.append([
+                path, preload, n_workers, f"{elapsed:.4f}", f"{rss:.1f}",
+                f"{pss:.1f}", f"{private:.1f}", f"{total_pss:.1f}"
+            ])
+    _write("db_memory", [
+        "db", "preload", "workers", "load seconds", "RSS MB", "PSS MB",
+        "private MB", "total PSS MB"
+    ], rows)
+
+
+def lemma_lookup(args):
+    """Lemma -> metacodes and prefix lookups: map scans against the index."""
+    import registry
+    from utils import lemma2metacode
+    logger = getLogger(__name__)
+    index = registry.get_metacode2lemma(args.map_path,
+                                        registry.METACODE2LEMMA_SRC_PICKLE)
+    map_dict = dict(index.items())
+    lemmas = list(dict.fromkeys(map_dict.values()))[:args.lemmas]
+
+    def scan():
+        return ([lemma2metacode(lemma, map_dict, "all") for lemma in lemmas],
+                sorted(k for k in map_dict if k[:8] == "BG-01-55"))
+
+    def indexed():
+        return ([lemma2metacode(lemma, index, "all") for lemma in lemmas],
+                index.with_prefix("BG-01-55"))
+
+    scan_elapsed, expected = _best_of(scan, args.repeat)
+    indexed_elapsed, res = _best_of(indexed, args.repeat)
+    logger.info(f"[INFO] {len(map_dict)} metacodes, {len(lemmas)} lemmas: "
+                f"scan {scan_elapsed:.4f}s, indexed {indexed_elapsed:.4f}s, "
+                f"same {res == expected}")
+    _write("lemma_lookup",
+           ["metacodes", "lemmas", "scan", "indexed", "same"],
+           [[len(map_dict), len(lemmas), f"{scan_elapsed:.6f}",
+             f"{indexed_elapsed:.6f}", res == expected]])
+
+
+def metacode2lemma(args):
+    """Map building per worker count and pickle against index loading."""
+    import os
+    import tempfile
+    import lemma_index
+    from make_metacode2lemma import build_maps
+    from utils import write_pickle, load_pickle
+    logger = getLogger(__name__)
+    files = {"source": args.src_path, "target": args.tar_path}
+    rows = []
+    for workers in args.workers:
+        elapsed, maps = _best_of(lambda: build_maps(files, workers),
+                                 args.repeat)
+        logger.info(f"[INFO] build with {workers} workers: {elapsed:.4f}s")
+        rows.append(["build", workers, f"{elapsed:.6f}"])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for db_format, (map_dict, _) in maps.items():
+            pkl_path = os.path.join(tmpdir, f"{db_format}.pkl")
+            idx_path = os.path.join(tmpdir, f"{db_format}.idx")
+            write_pickle(map_dict, pkl_path)
+            lemma_index.write(idx_path, map_dict)
+            metacode = next(reversed(map_dict))
+            pkl_elapsed, _ = _best_of(lambda: load_pickle(pkl_path)[metacode],
+                                      args.repeat)
+            idx_elapsed, _ = _best_of(
+                lambda: lemma_index.load(idx_path)[metacode], args.repeat)
+            logger.info(f"[INFO] load {db_format} ({len(map_dict)} "
+                        f"metacodes): pickle {pkl_elapsed:.4f}s, "
+                        f"index {idx_elapsed:.4f}s")
+            rows.append([f"load_pickle_{db_format}", "", f"{pkl_elapsed:.6f}"])
+            rows.append([f"load_index_{db_format}", "", f"{idx_elapsed:.6f}"])
+    _write("metacode2lemma", ["step", "workers", "seconds"], rows)
+
+
+STARTUP_MODULES = [
+    "align2graph", "show_alignment", "visualize_alignment",
+    "visualize_indivisual", "visualize_aggregate_translator",
+    "visualize_aggregate_overall", "visualize", "accuracy", "stat", "app"
+]
+FIRST_USE = ("import registry; registry.DATA.db; "
+             "registry.DATA.metacode2lemma_src; "
+             "registry.DATA.metacode2lemma_tar")
+
+
+def _import_time(statement, module):
+    """Run statement in a fresh interpreter with ``python -X importtime``.
+
+    :return: (wall seconds, cumulative import seconds of module, error)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True,
+                          text=True)
+    elapsed = time.perf_counter() - start
+    cumulative = None
+    other = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if fields[-1].strip() == module and fields[1].strip().isdigit():
+            cumulative = int(fields[1]) / 1e6
+    error = other[-1] if proc.returncode and other else ""
+    return elapsed, cumulative, error
+
+
+def startup(args):
+    """Cold-start time of importing the CLI entry points and the app.
+
+    Each module is imported in a fresh interpreter; the cumulative time of
+    the module reported by ``-X importtime`` includes everything it runs
+    at import.  The last row loads the shared data through
+    ``registry.DATA``, the cost deferred to first use.
+    """
+    logger = getLogger(__name__)
+    rows = []
+    statements = [(f"import {module}", module) for module in args.modules]
+    statements.append((FIRST_USE, "registry"))
+    for statement, module in statements:
+        elapsed, res = _best_of(lambda: _import_time(statement, module),
+                                args.repeat)
+        _, cumulative, error = res
+        cumulative = "" if cumulative is None else f"{cumulative:.3f}"
+        logger.info(f"[INFO] {statement}: {elapsed:.3f}s, import "
+                    f"{cumulative or '-'}s {error}")
+        rows.append([statement, f"{elapsed:.3f}", cumulative, error])
+    _write("startup", ["statement", "wall seconds", "import seconds", "error"],
+           rows)
+
+
+def warm_start(args):
+    """Warm-start update of IBM 2 models against full retraining.
+
+    Models trained without the bitexts of ``--new_translators`` are updated
+    with them (and a replayed share of the others); AER of every model is
+    measured with ``accuracy.evaluate`` on the bitexts of all translators.
+    """
+    import accuracy
+    from bitexts import Bitexts
+    from methods import ibm2_numpy
+    logger = getLogger(__name__)
+    bitexts = load_corpus(args.corpus_path, ["source", "target", "translator"])
+    hyparams = load_hyparam("hyparam_ibm2.yaml")
+    src = bitexts.source.tolist()
+    tar = bitexts.target.tolist()
+    new = bitexts.translator.isin(args.new_translators).to_numpy()
+    old = np.flatnonzero(~new)
+
+    def train(rows):
+        source = [src[i] for i in rows]
+        target = [tar[i] for i in rows]
+        return (ibm2_numpy.train(source, target, hyparams.iterations,
+                                 workers=hyparams.workers,
+                                 model_format="array"),
+                ibm2_numpy.train(target, source, hyparams.iterations,
+                                 workers=hyparams.workers,
+                                 model_format="array"))
+
+    def update(rows, models):
+        source = [src[i] for i in rows]
+        target = [tar[i] for i in rows]
+        weight = len(rows) / len(src)
+        return (ibm2_numpy.train_warm(source, target, models[0],
+                                      hyparams.warm_iterations, weight,
+                                      workers=hyparams.workers,
+                                      model_format="array"),
+                ibm2_numpy.train_warm(target, source, models[1],
+                                      hyparams.warm_iterations, weight,
+                                      workers=hyparams.workers,
+                                      model_format="array"))
+
+    db = Bitexts(sorted(bitexts.translator.unique()),
+                 "ibm2",
+                 lazy=True,
+                 corpus_path=args.corpus_path)
+
+    def aer(models):
+        db.redecode(models)
+        db.precompute()
+        return [f"{res['AER'] * 100:.2f}" for res in accuracy.evaluate(db)]
+
+    rows = []
+    full_time, models = _best_of(lambda: train(np.arange(len(src))),
+                                 args.repeat)
+    rows.append(["full", "", f"{full_time:.3f}", ""] + aer(models))
+    _, old_models = _best_of(lambda: train(old), 1)
+    rows.append(["old only", "", "", ""] + aer(old_models))
+    rng = np.random.default_rng(hyparams.seed)
+    for replay in args.replays:
+        replayed = rng.choice(old, int(replay * len(old)), replace=False)
+        batch = np.sort(np.concatenate([np.flatnonzero(new), replayed]))
+        elapsed, models = _best_of(lambda: update(batch, old_models),
+                                   args.repeat)
+        rows.append([
+            "warm", replay, f"{elapsed:.3f}", f"{full_time / elapsed:.1f}"
+        ] + aer(models))
+    for row in rows:
+        logger.info(f"[INFO] {row}")
+    _write("warm_start", [
+        "training", "replay", "seconds", "speedup", "AER source2target",
+        "AER target2source", "AER bidirection"
+    ], rows)
+
+
+BENCHMARKS = {
+    "em_shards": em_shards,
+    "alignment_summary": alignment_summary,
+    "poem_strings": poem_strings,
+    "db_memory": db_memory,
+    "startup": startup,
+    "lemma_lookup": lemma_lookup,
+    "metacode2lemma": metacode2lemma,
+    "warm_start": warm_start,
+}
+
+
+def main(args):
+    """Run selected benchmarks."""
+    basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
+    logger = getLogger(__name__)
+    logger.info(f"[INFO] args: {args}")
+    for name in args.benchmarks:
+        logger.info(f"[INFO] Running {name}...")
+        BENCHMARKS[name](args)
+    logger.info("[INFO] Done.")
+
+
+def cli_main():
+    """Arguement parser setting."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b",
+                        "--benchmarks",
+                        nargs="+",
+                        choices=list(BENCHMARKS),
+                        help="benchmarks to run")
+    parser.add_argument("-c",
+                        "--corpus_path",
+                        default="../cache/bitexts.csv",
+                        help="path of bitexts")
+    parser.add_argument("-s",
+                        "--src_path",
+                        default="../data/hachidaishu/hachidai.db",
+                        help="path of Hachidaishu file")
+    parser.add_argument("-t",
+                        "--tar_path",
+                        default="../data/translations/all_translations.txt",
+                        help="path of translations file")
+    parser.add_argument("-d",
+                        "--db_path",
+                        default="../cache/bitexts.db",
+                        help="path of DB (pickle or memory-mapped)")
+    parser.add_argument("--db_paths",
+                        nargs="+",
+                        default=["../cache/bitexts.pkl", "../cache/bitexts.db"],
+                        help="DBs to compare in db_memory")
+    parser.add_argument("-r",
+                        "--repeat",
+                        type=int,
+                        default=3,
+                        help="runs per measurement (best is reported)")
+    parser.add_argument("-w",
+                        "--workers",
+                        type=int,
+                        nargs="+",
+                        default=[1, 2, 4],
+                        help="E-step worker counts to compare (the largest "
+                        "is the number of DB workers in db_memory)")
+    parser.add_argument("--em_scale",
+                        type=int,
+                        default=1,
+                        help="times the bitexts are repeated in em_shards")
+    parser.add_argument("--map_path",
+                        default="../cache/metacode2lemma_src.idx",
+                        help="metacode2lemma map of lemma_lookup")
+    parser.add_argument("--lemmas",
+                        type=int,
+                        default=1000,
+                        help="lemmas to look up in lemma_lookup")
+    parser.add_argument("--modules",
+                        nargs="+",
+                        default=STARTUP_MODULES,
+                        help="modules to import in startup")
+    parser.add_argument("--new_translators",
+                        nargs="+",
+                        default=["takeoka"],
+                        help="translators added by warm start in warm_start")
+    parser.add_argument("--replays",
+                        type=float,
+                        nargs="+",
+                        default=[0.0, 0.1],
+                        help="shares of the other bitexts replayed in "
+                        "warm_start")
+    args = parser.parse_args()
+    main(args)
+
+
+if __name__ == "__main__":
+    cli_main()
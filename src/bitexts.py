@@ -1,9 +1,14 @@
 """Bitext loader with query tools for search alignment information."""
-from dataclasses import dataclass, field, asdict
-from typing import List, Any
+import csv
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Tuple
 import argparse
 from logging import basicConfig, getLogger, DEBUG
-from utils import write_pickle
+import numpy as np
+from utils import write_pickle, write_arrays, load_arrays
+from vocab import Vocabulary
+import corpus_store
 from methods import ibm2
 
 
@@ -21,42 +26,81 @@ class AlignmentInfo:
 
 @dataclass
 class AlignmentStat:
-    """Word alignment information collective count statistics."""
+    """Word alignment information collective count statistics.
+
+    ``counts`` holds one count per translator, in the order of
+    ``translators``.
+    """
 
     alignment: tuple
-    total: int = field(default=0)
-    kaneko: int = field(default=0)
-    katagiri: int = field(default=0)
-    kojimaarai: int = field(default=0)
-    komachiya: int = field(default=0)
-    kubota: int = field(default=0)
-    kyusojin: int = field(default=0)
-    matsuda: int = field(default=0)
-    okumura: int = field(default=0)
-    ozawa: int = field(default=0)
-    takeoka: int = field(default=0)
+    counts: np.ndarray = field(repr=False)
+    translators: List[str] = field(repr=False)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def count(self, translator):
+        """Return the count of a single translator."""
+        return int(self.counts[self.translators.index(translator)])
+
+    def items(self):
+        """Return (translator, count) pairs."""
+        return zip(self.translators, self.counts.tolist())
 
 
 @dataclass
 class AlignmentSummary:
-    """Word alignment information summary."""
+    """Word alignment information summary.
+
+    Details are indexed by source word and target word, and statistics by
+    alignment pair, so every query costs the size of its result.
+    Counts are aggregated into an (alignment, translator) matrix whose
+    columns follow ``translators``, usually ``Bitexts.translators``.
+    """
 
     alignment_info: List[AlignmentInfo] = field(repr=False)
+    translators: List[str] = field(default=None)
+    counts: np.ndarray = field(init=False, repr=False)
     summary: List[AlignmentStat] = field(init=False)
+    details_by_source: Dict[str, List[AlignmentInfo]] = field(init=False,
+                                                              repr=False)
+    details_by_target: Dict[str, List[AlignmentInfo]] = field(init=False,
+                                                              repr=False)
+    summary_by_alignment: Dict[tuple, AlignmentStat] = field(init=False,
+                                                             repr=False)
 
     def __post_init__(self):
+        if self.translators is None:
+            self.translators = sorted(
+                {info.translator
+                 for info in self.alignment_info})
+        self.translators = list(self.translators)
         self.summary = list(self._summary())
+        self.details_by_source = {}
+        self.details_by_target = {}
+        for info in self.alignment_info:
+            source, target = info.alignment
+            self.details_by_source.setdefault(source, []).append(info)
+            self.details_by_target.setdefault(target, []).append(info)
+        self.summary_by_alignment = {
+            stat.alignment: stat
+            for stat in self.summary
+        }
 
     def _summary(self):
-        alignment_dict = {}
-        for info in self.alignment_info:
-            alignment = info.alignment
-            if alignment not in alignment_dict:
-                alignment_dict[alignment] = asdict(AlignmentStat(alignment))
-            alignment_dict[alignment]["total"] += 1
-            alignment_dict[alignment][info.translator] += 1
-        for stat in alignment_dict.values():
-            yield AlignmentStat(**stat)
+        translator_idx = {t: i for i, t in enumerate(self.translators)}
+        alignment_idx = {}
+        rows = [
+            alignment_idx.setdefault(info.alignment, len(alignment_idx))
+            for info in self.alignment_info
+        ]
+        cols = [translator_idx[info.translator] for info in self.alignment_info]
+        self.counts = np.zeros((len(alignment_idx), len(self.translators)),
+                               dtype=np.int64)
+        np.add.at(self.counts, (rows, cols), 1)
+        for alignment, row in alignment_idx.items():
+            yield AlignmentStat(alignment, self.counts[row], self.translators)
 
     def query_details_by_source(self, source):
         """Return alignment details (poems where the alignment appeared).
@@ -64,10 +108,7 @@ class AlignmentSummary:
         Search by source for retrive hub nodes.
         :param source: str; source word.
         """
-        for info in self.alignment_info:
-            if info.alignment[0] != source:
-                continue
-            yield info
+        return iter(self.details_by_source.get(source, ()))
 
     def query_details_by_target(self, target):
         """Return alignment details (poems where the alignment appeared).
@@ -75,10 +116,7 @@ class AlignmentSummary:
         Search by target for retrive periphery (translational word) nodes.
         :param target: str; target word.
         """
-        for info in self.alignment_info:
-            if info.alignment[1] != target:
-                continue
-            yield info
+        return iter(self.details_by_target.get(target, ()))
 
     def query_summary(self, alignment):
         """Return collective summary (by which translator).
@@ -86,35 +124,358 @@ class AlignmentSummary:
         Search information summary by translators for edge annotation.
         :param alignment: tuple; source - target pair.
         """
-        for stat in self.summary:
-            if stat.alignment != alignment:
-                continue
-            yield stat
+        if alignment in self.summary_by_alignment:
+            yield self.summary_by_alignment[alignment]
+
+
+NULL_POSITION = -1  # packed alignment position of NULL
 
 
 @dataclass
-class Bitext:
-    """Aligned bitext."""
+class PackedBitexts:
+    """Bitexts packed into contiguous arrays.
 
-    poem: str
-    source: List[str] = field(init=False, repr=False)
-    source_raw: str = field(repr=False)
-    source_surface: str
-    target: List[str] = field(init=False, repr=False)
-    target_raw: str = field(repr=False)
-    target_surface: str
-    translator: str
+    Tokens of bitext k are ``source_ids[source_offsets[k]:source_offsets[k
+    + 1]]`` (likewise for targets).  Alignments are stored parallel to the
+    tokens as the aligned position on the other side, NULL_POSITION for
+    NULL; a direction is valid only where it is flagged as decoded.
+    Surfaces are UTF-8 blobs (uint8 arrays) with offsets.
+    """
+
+    ARRAYS = ("poems", "translators", "source_ids", "source_offsets",
+              "target_ids", "target_offsets", "src2tar", "tar2src",
+              "decoded_src2tar", "decoded_tar2src")
+
+    poems: np.ndarray = field(repr=False)  # int32 poem index
+    translators: np.ndarray = field(repr=False)  # int8 code
+    translator_names: List[str]
+    source_ids: np.ndarray = field(repr=False)
+    source_offsets: np.ndarray = field(repr=False)
+    target_ids: np.ndarray = field(repr=False)
+    target_offsets: np.ndarray = field(repr=False)
+    source_surfaces: Tuple[np.ndarray, np.ndarray] = field(repr=False)
+    target_surfaces: Tuple[np.ndarray, np.ndarray] = field(repr=False)
+    vocabulary: Vocabulary = field(repr=False)
     model_source2target: Any = field(repr=False)
     model_target2source: Any = field(repr=False)
     method: str = field(default="ibm2", repr=False)
-    alignment_source2target: List[tuple] = field(init=False, repr=False)
-    alignment_target2source: List[tuple] = field(init=False, repr=False)
+    src2tar: np.ndarray = field(init=False, repr=False)
+    tar2src: np.ndarray = field(init=False, repr=False)
+    decoded_src2tar: np.ndarray = field(init=False, repr=False)
+    decoded_tar2src: np.ndarray = field(init=False, repr=False)
 
     def __post_init__(self):
-        self.source = self.source_raw.split("/")
-        self.target = self.target_raw.split("/")
-        self.alignment_source2target = list(self._alignment_src2tar())
-        self.alignment_target2source = list(self._alignment_tar2src())
+        self.reset_alignments()
+
+    def __len__(self):
+        return len(self.poems)
+
+    def reset_alignments(self):
+        """Forget all alignments (e.g. after the models changed)."""
+        self.src2tar = np.full(len(self.source_ids), NULL_POSITION, np.int32)
+        self.tar2src = np.full(len(self.target_ids), NULL_POSITION, np.int32)
+        self.decoded_src2tar = np.zeros(len(self.poems), dtype=bool)
+        self.decoded_tar2src = np.zeros(len(self.poems), dtype=bool)
+
+    @staticmethod
+    def _pack_surfaces(surfaces):
+        encoded = [surface.encode() for surface in surfaces]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(surface) for surface in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    @classmethod
+    def pack(cls, poems, sources, source_surfaces, targets, target_surfaces,
+             translators, vocabulary, model_source2target,
+             model_target2source, method):
+        """Pack per-bitext columns (token IDs as arrays) into one corpus."""
+        translator_names = list(dict.fromkeys(translators))
+        codes = {name: code for code, name in enumerate(translator_names)}
+        columns = {}
+        for name, sentences in (("source", sources), ("target", targets)):
+            offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+            np.cumsum([len(sentence) for sentence in sentences],
+                      out=offsets[1:])
+            columns[f"{name}_ids"] = np.concatenate(
+                [np.empty(0, dtype=np.int32), *sentences]).astype(np.int32)
+            columns[f"{name}_offsets"] = offsets
+        return cls(poems=np.array(poems, dtype=np.int32),
+                   translators=np.array(
+                       [codes[name] for name in translators], dtype=np.int8),
+                   translator_names=translator_names,
+                   source_surfaces=cls._pack_surfaces(source_surfaces),
+                   target_surfaces=cls._pack_surfaces(target_surfaces),
+                   vocabulary=vocabulary,
+                   model_source2target=model_source2target,
+                   model_target2source=model_target2source,
+                   method=method,
+                   **columns)
+
+    def arrays(self):
+        """Return the packed corpus as a dict of arrays (no vocabulary)."""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        for name in ("source_surfaces", "target_surfaces"):
+            arrays[f"{name}_blob"], arrays[f"{name}_offsets"] = getattr(
+                self, name)
+        arrays["translator_names"] = np.array(self.translator_names,
+                                              dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, vocabulary, model_source2target,
+                    model_target2source, method):
+        """Wrap arrays returned by ``arrays`` (e.g. memory-mapped)."""
+        packed = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(packed, name, arrays[name])
+        for name in ("source_surfaces", "target_surfaces"):
+            setattr(packed, name,
+                    (arrays[f"{name}_blob"], arrays[f"{name}_offsets"]))
+        packed.translator_names = arrays["translator_names"].tolist()
+        packed.vocabulary = vocabulary
+        packed.model_source2target = model_source2target
+        packed.model_target2source = model_target2source
+        packed.method = method
+        return packed
+
+    def extend(self, other):
+        """Append the bitexts of another packed corpus of the same vocabulary.
+
+        Alignments and their decoded flags are appended as they are.
+        """
+        self.translator_names = list(self.translator_names)
+        codes = []
+        for name in other.translator_names:
+            if name not in self.translator_names:
+                self.translator_names.append(name)
+            codes.append(self.translator_names.index(name))
+        self.translators = np.concatenate([
+            self.translators,
+            np.array(codes, dtype=np.int8)[other.translators]
+        ])
+        for name in ("source_surfaces", "target_surfaces"):
+            (blob, offsets), (other_blob, other_offsets) = (getattr(self, name),
+                                                          getattr(other, name))
+            setattr(self, name, (np.concatenate([blob, other_blob]),
+                                 np.concatenate(
+                                     [offsets, other_offsets[1:] + offsets[-1]])))
+        for name in ("source_offsets", "target_offsets"):
+            offsets = getattr(self, name)
+            setattr(self, name, np.concatenate(
+                [offsets, getattr(other, name)[1:] + offsets[-1]]))
+        for name in ("poems", "source_ids", "target_ids", "src2tar", "tar2src",
+                     "decoded_src2tar", "decoded_tar2src"):
+            setattr(self, name, np.concatenate(
+                [getattr(self, name), getattr(other, name)]))
+
+    @staticmethod
+    def _kept_offsets(offsets, keep):
+        kept = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(np.diff(offsets)[keep], out=kept[1:])
+        return kept
+
+    def keep_rows(self, keep):
+        """Drop the bitexts not flagged in keep (bool per bitext)."""
+        for name, positions in (("source", "src2tar"), ("target", "tar2src")):
+            offsets = getattr(self, f"{name}_offsets")
+            tokens = np.repeat(keep, np.diff(offsets))
+            setattr(self, f"{name}_ids", getattr(self, f"{name}_ids")[tokens])
+            setattr(self, positions, getattr(self, positions)[tokens])
+            setattr(self, f"{name}_offsets", self._kept_offsets(offsets, keep))
+        for name in ("source_surfaces", "target_surfaces"):
+            blob, offsets = getattr(self, name)
+            setattr(self, name, (blob[np.repeat(keep, np.diff(offsets))],
+                                 self._kept_offsets(offsets, keep)))
+        codes = np.unique(self.translators[keep])
+        recode = np.zeros(len(self.translator_names), dtype=np.int8)
+        recode[codes] = np.arange(len(codes))
+        self.translator_names = [self.translator_names[c] for c in codes]
+        self.translators = recode[self.translators[keep]]
+        for name in ("poems", "decoded_src2tar", "decoded_tar2src"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def source_span(self, row):
+        return int(self.source_offsets[row]), int(self.source_offsets[row + 1])
+
+    def target_span(self, row):
+        return int(self.target_offsets[row]), int(self.target_offsets[row + 1])
+
+    @staticmethod
+    def surface(surfaces, row):
+        blob, offsets = surfaces
+        return blob[offsets[row]:offsets[row + 1]].tobytes().decode()
+
+    def set_alignment(self, row, src2tar=None, tar2src=None):
+        """Store (j, i or None) alignments of one bitext."""
+        for alignment, positions, span, decoded in (
+            (src2tar, self.src2tar, self.source_span(row),
+             self.decoded_src2tar),
+            (tar2src, self.tar2src, self.target_span(row),
+             self.decoded_tar2src)):
+            if alignment is None:
+                continue
+            start, end = span
+            positions[start:end] = NULL_POSITION
+            for j, i in alignment:
+                if i is not None:
+                    positions[start + j] = i
+            decoded[row] = True
+
+
+def _pack_legacy(rows, vocabulary, model_source2target, model_target2source,
+                 method):
+    """Pack bitexts pickled by the baseline version with their alignments.
+
+    :param rows: list; (poem, source, source_surface, target,
+        target_surface, translator, src2tar, tar2src) with metacode tokens
+    """
+    columns = [[] for _ in corpus_store.COLUMNS]
+    for row in rows:
+        poem, source, src_surface, target, tar_surface, translator = row[:6]
+        for column, value in zip(columns, (int(poem), vocabulary.encode(source),
+                                           src_surface,
+                                           vocabulary.encode(target),
+                                           tar_surface, translator)):
+            column.append(value)
+    packed = PackedBitexts.pack(*columns, vocabulary, model_source2target,
+                                model_target2source, method)
+    for idx, row in enumerate(rows):
+        packed.set_alignment(idx, *row[6:])
+    return packed
+
+
+class Bitext:
+    """Aligned bitext, a view of one row of ``PackedBitexts``.
+
+    Tokens are kept as IDs of the shared metacode vocabulary.  Alignments
+    not decoded yet are decoded on first access and stored in the packed
+    corpus.
+    """
+
+    __slots__ = ("packed", "row", "_alignment_idx")
+
+    def __init__(self, packed, row):
+        self.packed = packed
+        self.row = row
+        self._alignment_idx = None
+
+    def __getstate__(self):
+        return self.packed, self.row
+
+    def __setstate__(self, state):
+        """Restore a view, or a bitext pickled by the baseline version.
+
+        The baseline pickled each bitext as a dataclass with its tokens and
+        decoded alignments; it becomes a one-row packed corpus.
+        """
+        if isinstance(state, dict):
+            if not {"source", "alignment_source2target"} <= set(state):
+                raise ValueError("unknown bitexts DB format, rebuild it with "
+                                 "make save_db")
+            row = (state["poem"], state["source"], state["source_surface"],
+                   state["target"], state["target_surface"],
+                   state["translator"], state["alignment_source2target"],
+                   state["alignment_target2source"])
+            state = (_pack_legacy([row], Vocabulary(),
+                                  state["model_source2target"],
+                                  state["model_target2source"],
+                                  state["method"]), 0)
+        self.packed, self.row = state
+        self._alignment_idx = None
+
+    def __repr__(self):
+        return (f"Bitext(poem={self.poem!r}, "
+                f"source_surface={self.source_surface!r}, "
+                f"target_surface={self.target_surface!r}, "
+                f"translator={self.translator!r})")
+
+    @property
+    def poem(self):
+        return str(self.packed.poems[self.row])
+
+    @property
+    def translator(self):
+        return self.packed.translator_names[self.packed.translators[self.row]]
+
+    @property
+    def source_surface(self):
+        return self.packed.surface(self.packed.source_surfaces, self.row)
+
+    @property
+    def target_surface(self):
+        return self.packed.surface(self.packed.target_surfaces, self.row)
+
+    @property
+    def source_ids(self):
+        start, end = self.packed.source_span(self.row)
+        return self.packed.source_ids[start:end]
+
+    @property
+    def target_ids(self):
+        start, end = self.packed.target_span(self.row)
+        return self.packed.target_ids[start:end]
+
+    @property
+    def vocabulary(self):
+        return self.packed.vocabulary
+
+    @property
+    def model_source2target(self):
+        return self.packed.model_source2target
+
+    @property
+    def model_target2source(self):
+        return self.packed.model_target2source
+
+    @property
+    def method(self):
+        return self.packed.method
+
+    @property
+    def source(self):
+        """Source metacodes (decoded from ``source_ids``)."""
+        return self.vocabulary.decode(self.source_ids)
+
+    @property
+    def target(self):
+        """Target metacodes (decoded from ``target_ids``)."""
+        return self.vocabulary.decode(self.target_ids)
+
+    @staticmethod
+    def _unpack(positions):
+        return [(j, None if i == NULL_POSITION else i)
+                for j, i in enumerate(positions.tolist())]
+
+    @property
+    def alignment_source2target(self):
+        """Alignment from source to target, decoded on first access."""
+        if not self.packed.decoded_src2tar[self.row]:
+            self.alignment_source2target = list(self._alignment_src2tar())
+        start, end = self.packed.source_span(self.row)
+        return self._unpack(self.packed.src2tar[start:end])
+
+    @alignment_source2target.setter
+    def alignment_source2target(self, alignment):
+        self.packed.set_alignment(self.row, src2tar=alignment)
+        self._alignment_idx = None
+
+    @property
+    def alignment_target2source(self):
+        """Alignment from target to source, decoded on first access."""
+        if not self.packed.decoded_tar2src[self.row]:
+            self.alignment_target2source = list(self._alignment_tar2src())
+        start, end = self.packed.target_span(self.row)
+        return self._unpack(self.packed.tar2src[start:end])
+
+    @alignment_target2source.setter
+    def alignment_target2source(self, alignment):
+        self.packed.set_alignment(self.row, tar2src=alignment)
+        self._alignment_idx = None
+
+    def is_decoded(self):
+        """Return whether both alignments have been decoded."""
+        return bool(self.packed.decoded_src2tar[self.row]
+                    and self.packed.decoded_tar2src[self.row])
 
     def _alignment_src2tar(self):
         """Return aligment from source to target."""
@@ -152,43 +513,68 @@ class Bitext:
         # elif other alignment methods
         # ...
 
+    def _proper_improper_idx(self):
+        """Return (proper, improper) aligned index tuples, computed once.
+
+        Proper pairs keep source-to-target order and improper pairs keep
+        target-to-source order; membership is tested against sets.
+        """
+        if self._alignment_idx is None:
+            tar2src_inverse = [i[::-1] for i in self.alignment_target2source]
+            tar2src_set = set(tar2src_inverse)
+            proper = tuple(x for x in self.alignment_source2target
+                           if x in tar2src_set)
+            proper_set = set(proper)
+            improper = tuple(x for x in tar2src_inverse
+                             if x not in proper_set and None not in x)
+            self._alignment_idx = (proper, improper)
+        return self._alignment_idx
+
     def proper_alignment_idx(self):
         """Return proper aligned token index in both direction.
 
-        :return: filter(List[tuple(int=src_idx,int=tar_idx)])
+        :return: iter(List[tuple(int=src_idx,int=tar_idx)])
         """
-        src2tar = self.alignment_source2target
-        tar2src = self.alignment_target2source
-        tar2src_inverse = [i[::-1] for i in tar2src]
-        return filter(lambda x: x in tar2src_inverse, src2tar)
+        return iter(self._proper_improper_idx()[0])
 
     def improper_alignment_idx(self):
         """Return aligned token index in only target-to-source direction.
 
-        :return: filter(List[tuple(int=src_idx,int=tar_idx)])
+        :return: iter(List[tuple(int=src_idx,int=tar_idx)])
         """
-        src2tar = self.alignment_source2target
-        tar2src = self.alignment_target2source
-        tar2src_inverse = [i[::-1] for i in tar2src]
-        proper_aligned = [i for i in src2tar if i in tar2src_inverse]
-        return filter(lambda x: (x not in proper_aligned) & (None not in x),
-                      tar2src_inverse)
+        return iter(self._proper_improper_idx()[1])
+
+    def proper_alignment_ids(self):
+        """Generate aligned token IDs in both directions."""
+        source_ids = self.source_ids.tolist()
+        target_ids = self.target_ids.tolist()
+        for src_id, tar_id in self.proper_alignment_idx():
+            yield (source_ids[src_id], target_ids[tar_id])
+
+    def improper_alignment_ids(self):
+        """Generate aligned token IDs in only target-to-source direction."""
+        source_ids = self.source_ids.tolist()
+        target_ids = self.target_ids.tolist()
+        for src_id, tar_id in self.improper_alignment_idx():
+            yield (source_ids[src_id], target_ids[tar_id])
 
     def proper_alignment(self):
         """Generate aligned token in both directions.
 
         :type: List[tuple(str=src_token,str=tar_token)]
         """
-        for src_id, tar_id in self.proper_alignment_idx():
-            yield (self.source[src_id], self.target[tar_id])
+        tokens = self.vocabulary.tokens
+        for src_id, tar_id in self.proper_alignment_ids():
+            yield (tokens[src_id], tokens[tar_id])
 
     def improper_alignment(self):
         """Generate proper_alignment token in both directions.
 
         :type: List[tuple(str=src_token,str=tar_token)]
         """
-        for src_id, tar_id in self.improper_alignment_idx():
-            yield (self.source[src_id], self.target[tar_id])
+        tokens = self.vocabulary.tokens
+        for src_id, tar_id in self.improper_alignment_ids():
+            yield (tokens[src_id], tokens[tar_id])
 
     def query_proper_alignment_by_token(self, token):
         """Return token"s alignment in both directions."""
@@ -219,27 +605,202 @@ class Bitext:
                     yield (i, j)
 
 
+class _SortedArrays:
+    """Parallel arrays kept sorted, stored as ``{prefix}.{name}`` arrays."""
+
+    __slots__ = ()
+
+    def arrays(self, prefix):
+        return {
+            f"{prefix}.{name}": getattr(self, name)
+            for name in self.__slots__
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        """Wrap arrays returned by ``arrays`` without sorting them again."""
+        index = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(index, name, arrays[f"{prefix}.{name}"])
+        return index
+
+    def _order(self, n_rows):
+        """Return (first array, rows) as one sortable int64 key."""
+        return getattr(self, self.__slots__[0]).astype(np.int64) * n_rows + (
+            self.rows)
+
+    def insert(self, other):
+        """Merge the entries of other (sorted likewise) in place.
+
+        Entries of one bitext already present are kept before the inserted
+        ones, so the order of each bitext's pairs is preserved.
+        """
+        n_rows = max(int(self.rows.max(initial=-1)),
+                     int(other.rows.max(initial=-1))) + 1
+        at = np.searchsorted(self._order(n_rows), other._order(n_rows),
+                             side="right")
+        for name in self.__slots__:
+            setattr(self, name, np.insert(getattr(self, name), at,
+                                          getattr(other, name)))
+
+    def keep_rows(self, keep):
+        """Drop entries of bitexts not flagged in keep and renumber rows.
+
+        :param keep: np.ndarray; bool per bitext
+        """
+        entries = keep[self.rows]
+        renumber = (np.cumsum(keep) - 1).astype(self.rows.dtype)
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name)[entries])
+        self.rows = renumber[self.rows]
+
+
+class PostingIndex(_SortedArrays):
+    """Sorted (key, bitext index) pairs with dict-like ``get``."""
+
+    __slots__ = ("keys", "rows")
+
+    def __init__(self, keys, rows):
+        order = np.lexsort((rows, keys))
+        self.keys = keys[order]
+        self.rows = rows[order]
+
+    def get(self, key, default=()):
+        """Return sorted bitext indices of key."""
+        start = int(np.searchsorted(self.keys, key, side="left"))
+        end = int(np.searchsorted(self.keys, key, side="right"))
+        if start == end:
+            return default
+        return self.rows[start:end].tolist()
+
+
+class AlignmentTable(_SortedArrays):
+    """Token pairs of all bitexts, sorted by source token ID then bitext.
+
+    Pairs of one bitext keep their order within it.
+    """
+
+    __slots__ = ("src_ids", "rows", "tar_ids")
+
+    def __init__(self, src_ids, rows, tar_ids):
+        order = np.lexsort((rows, src_ids))  # stable
+        self.src_ids = src_ids[order]
+        self.rows = rows[order]
+        self.tar_ids = tar_ids[order]
+
+    def _span(self, src_id):
+        return (int(np.searchsorted(self.src_ids, src_id, side="left")),
+                int(np.searchsorted(self.src_ids, src_id, side="right")))
+
+    def bitexts(self, src_id):
+        """Return indices of bitexts with pairs of src_id as a set."""
+        start, end = self._span(src_id)
+        return set(self.rows[start:end].tolist())
+
+    def pairs(self, src_id, row):
+        """Return (src_id, tar_id) pairs of one bitext."""
+        start, end = self._span(src_id)
+        rows = self.rows[start:end]
+        first = start + int(np.searchsorted(rows, row, side="left"))
+        last = start + int(np.searchsorted(rows, row, side="right"))
+        return [(src_id, tar_id) for tar_id in self.tar_ids[first:last].tolist()]
+
+
 @dataclass
 class Bitexts:
-    """Aligned bitexts."""
+    """Aligned bitexts.
+
+    With ``lazy=True`` no alignment is decoded up front; each bitext
+    decodes its own on first access, and ``precompute`` decodes all the
+    remaining ones in one batch.
+    Queries are answered from posting lists (sorted bitext indices) of
+    source tokens, poems and translators built with the DB.  Once all
+    alignments are decoded, proper and improper token pairs of the whole
+    corpus are tabulated in ``AlignmentTable``s.
+    Tokens, posting list keys and tabulated pairs are IDs of the shared
+    metacode ``vocabulary``; queries take and return metacodes.
+    ``corpus_path`` is a bitexts .csv file or a columnar corpus store.
+    Bitexts are held in one ``PackedBitexts``; indexing and iteration
+    return ``Bitext`` views of its rows.
+    ``save_mapped`` writes the decoded DB as a directory of arrays which
+    ``load_mapped`` memory-maps read-only.
+    A saved DB is updated without rebuilding it: ``add_translators`` and
+    ``drop_translators`` patch the packed bitexts and every index, and
+    ``redecode`` replaces only the alignments after the models changed.
+    """
 
     translators: List[str] = field(default_factory=list)
     method: str = field(default="ibm2", repr=False)
-    bitexts: List[Bitext] = field(init=False, repr=False)
+    lazy: bool = field(default=False, repr=False)
+    corpus_path: str = field(default="../cache/bitexts.csv", repr=False)
+    vocabulary: Vocabulary = field(default=None, init=False, repr=False)
+    packed: PackedBitexts = field(init=False, repr=False)
     model_source2target: Any = field(init=False, repr=False)
     model_target2source: Any = field(init=False, repr=False)
+    token_index: PostingIndex = field(init=False, repr=False)
+    poem_index: Dict[str, List[int]] = field(init=False, repr=False)
+    translator_index: Dict[str, List[int]] = field(init=False, repr=False)
+    proper_table: AlignmentTable = field(default=None,
+                                         init=False,
+                                         repr=False)
+    improper_table: AlignmentTable = field(default=None,
+                                           init=False,
+                                           repr=False)
 
     def __post_init__(self):
         self.model_source2target, self.model_target2source = self._load_models(
         )
-        self.bitexts = list(self._read_bitexts())
+        self.packed = self._read_bitexts()
+        self._build_indexes()
+        if not self.lazy:
+            self.precompute()
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __setstate__(self, state):
+        """Restore a DB, repacking one pickled by the baseline version.
+
+        The baseline kept a list of decoded ``Bitext`` dataclasses; their
+        tokens and alignments are packed and the indexes built again.
+        """
+        if "packed" in state:
+            self.__dict__.update(state)
+            return
+        if set(state) != {"translators", "method", "bitexts",
+                          "model_source2target", "model_target2source"}:
+            raise ValueError("unknown bitexts DB format, rebuild it with "
+                             "make save_db")
+        self.translators = state["translators"]
+        self.method = state["method"]
+        self.lazy = False
+        self.corpus_path = "../cache/bitexts.csv"
+        self.vocabulary = Vocabulary()
+        self.model_source2target = state["model_source2target"]
+        self.model_target2source = state["model_target2source"]
+        rows = [(bitext.poem, bitext.source, bitext.source_surface,
+                 bitext.target, bitext.target_surface, bitext.translator,
+                 bitext.alignment_source2target,
+                 bitext.alignment_target2source)
+                for bitext in state["bitexts"]]
+        self.packed = _pack_legacy(rows, self.vocabulary,
+                                   self.model_source2target,
+                                   self.model_target2source, self.method)
+        self._build_indexes()
+        self._build_alignment_tables()
 
     def __getitem__(self, index):
-        return self.bitexts[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("bitext index out of range")
+        return Bitext(self.packed, index)
 
     def __iter__(self):
-        for bitext in self.bitexts:
-            yield bitext
+        for index in range(len(self)):
+            yield Bitext(self.packed, index)
 
     def _load_models(self):
         """Load model."""
@@ -249,86 +810,427 @@ class Bitexts:
         # elif other alignment methods
         # ...
 
-    def _read_bitexts(self):
-        with open("../cache/bitexts.csv") as fp:
-            next(fp)
-            for row in fp.readlines():
-                fields = row.strip().split(",")
-                if fields[-1] not in self.translators:
+    def _align_corpus(self, sources, targets):
+        """Return alignments of all bitexts (ID arrays) in both directions."""
+        if self.method == "ibm2":
+            return (ibm2.align_corpus(sources, targets,
+                                      self.model_source2target,
+                                      self.vocabulary),
+                    ibm2.align_corpus(targets, sources,
+                                      self.model_target2source,
+                                      self.vocabulary))
+        # elif other alignment methods
+        # ...
+
+    def _read_bitexts(self, translators=None):
+        """Return bitexts of translators (the selected ones), packed.
+
+        The vocabulary is created by the first read and extended by later
+        ones.
+        """
+        if translators is None:
+            translators = self.translators
+        if os.path.isdir(self.corpus_path):
+            columns = self._read_store(translators)
+        else:
+            columns = self._read_csv(translators)
+        return PackedBitexts.pack(*columns, self.vocabulary,
+                                  self.model_source2target,
+                                  self.model_target2source, self.method)
+
+    def _read_csv(self, translators):
+        if self.vocabulary is None:
+            self.vocabulary = Vocabulary()
+        columns = [[] for _ in corpus_store.COLUMNS]
+        with open(self.corpus_path, newline="") as fp:
+            reader = csv.reader(fp)
+            next(reader)
+            for poem, source, src_surface, target, tar_surface, translator in (
+                    reader):
+                if translator not in translators:
                     continue
-                yield Bitext(*fields, self.model_source2target,
-                             self.model_target2source, self.method)
+                row = (int(poem), self.vocabulary.encode(source.split("/")),
+                       src_surface, self.vocabulary.encode(target.split("/")),
+                       tar_surface, translator)
+                for column, value in zip(columns, row):
+                    column.append(value)
+        return columns
+
+    def _read_store(self, translators):
+        store = corpus_store.load(self.corpus_path)
+        rows = np.flatnonzero(store["translator"].isin(translators)).tolist()
+        columns = {"idx": np.asarray(store["idx"])[rows]}
+        for column in corpus_store.TOKEN_COLUMNS:
+            ids = np.asarray(store[column].ids)
+            offsets = store[column].offsets.tolist()
+            columns[column] = [ids[offsets[i]:offsets[i + 1]] for i in rows]
+        if self.vocabulary is None:
+            self.vocabulary = store.vocabulary()
+        else:
+            # Store IDs -> DB IDs of the metacodes of these rows only
+            tokens = np.asarray(store["vocab"])
+            used = np.unique(np.concatenate(
+                [np.empty(0, dtype=np.int32)] +
+                [ids for c in corpus_store.TOKEN_COLUMNS for ids in columns[c]]))
+            lookup = np.zeros(len(tokens), dtype=np.int32)
+            lookup[used] = self.vocabulary.encode(tokens[used].tolist())
+            for column in corpus_store.TOKEN_COLUMNS:
+                columns[column] = [lookup[ids] for ids in columns[column]]
+        for column in corpus_store.TEXT_COLUMNS + ["translator"]:
+            values = store[column]
+            columns[column] = [values[i] for i in rows]
+        return [columns[column] for column in corpus_store.COLUMNS]
+
+    def _token_ids(self, words):
+        """Return vocabulary IDs of words (UNKNOWN for unknown words)."""
+        return [self.vocabulary.id(word) for word in words]
+
+    def _build_indexes(self):
+        """Build token/poem/translator -> bitext posting lists."""
+        self.token_index = self._token_postings()
+        self._build_field_indexes()
+
+    def _token_postings(self, first=0):
+        """Return token -> bitext posting lists of bitexts from first on."""
+        packed = self.packed
+        start = packed.source_offsets[first]
+        rows = np.repeat(np.arange(first, len(packed)),
+                         np.diff(packed.source_offsets[first:]))
+        pairs = np.unique(
+            np.stack([packed.source_ids[start:].astype(np.int64), rows],
+                     axis=1),
+            axis=0).reshape(-1, 2)
+        return PostingIndex(pairs[:, 0].astype(np.int32),
+                            pairs[:, 1].astype(np.int32))
+
+    def _build_field_indexes(self, first=0):
+        """Build poem/translator -> bitext posting lists.
+
+        :param first: int; only add the bitexts from first on
+        """
+        if first == 0:
+            self.poem_index = {}
+            self.translator_index = {}
+        packed = self.packed
+        poems = packed.poems.tolist()
+        translators = packed.translators.tolist()
+        for idx in range(first, len(packed)):
+            self.poem_index.setdefault(str(poems[idx]), []).append(idx)
+            self.translator_index.setdefault(
+                packed.translator_names[translators[idx]], []).append(idx)
+
+    @staticmethod
+    def _postings(index, keys):
+        """Return union of posting lists of keys as a set."""
+        postings = set()
+        for key in keys:
+            postings.update(index.get(key, ()))
+        return postings
+
+    def query_bitexts(self, words=None, poems=None, translators=None):
+        """Query bitexts matching any of the words, poems and translators.
+
+        Each given criterion is the union of its posting lists, and the
+        criteria are intersected; bitexts are returned once, in DB order.
+        """
+        if words is not None:
+            words = self._token_ids(words)
+        criteria = [(self.token_index, words), (self.poem_index, poems),
+                    (self.translator_index, translators)]
+        postings = None
+        for index, keys in criteria:
+            if keys is None:
+                continue
+            matched = self._postings(index, keys)
+            postings = matched if postings is None else postings & matched
+        if postings is None:
+            postings = range(len(self))
+        for idx in sorted(postings):
+            yield self[idx]
+
+    def precompute(self):
+        """Decode alignments of all bitexts not decoded yet in one batch."""
+        packed = self.packed
+        pending = np.flatnonzero(
+            ~(packed.decoded_src2tar & packed.decoded_tar2src)).tolist()
+        if not pending:
+            return
+        self._decode(pending)
+        self._build_alignment_tables()
+
+    def _decode(self, rows):
+        """Decode alignments of bitexts rows in one batch."""
+        alignments = self._align_corpus(
+            [self[row].source_ids for row in rows],
+            [self[row].target_ids for row in rows])
+        for row, src2tar, tar2src in zip(rows, *alignments):
+            self.packed.set_alignment(row, src2tar, tar2src)
+
+    def _build_alignment_tables(self):
+        """Tabulate proper and improper token pairs of all bitexts."""
+        self.proper_table, self.improper_table = self._alignment_tables()
+
+    def _alignment_tables(self, first=0):
+        """Return proper and improper pair tables of bitexts from first on.
+
+        Same pairs as ``Bitext.proper_alignment_ids`` and
+        ``improper_alignment_ids``, computed on the packed alignments: a
+        link is proper when the other direction links back to it.
+        """
+        packed = self.packed
+        src_start = packed.source_offsets[first]
+        tar_start = packed.target_offsets[first]
+        source_rows = np.repeat(np.arange(first, len(packed)),
+                                np.diff(packed.source_offsets[first:]))
+        target_rows = np.repeat(np.arange(first, len(packed)),
+                                np.diff(packed.target_offsets[first:]))
+        # source-to-target links, parallel to source tokens
+        j = np.arange(src_start, len(packed.source_ids)) - (
+            packed.source_offsets[source_rows])
+        i = packed.src2tar[src_start:]
+        linked = i != NULL_POSITION
+        tar_pos = packed.target_offsets[source_rows] + i
+        proper = linked & (packed.tar2src[np.where(linked, tar_pos, 0)] == j)
+        proper_table = AlignmentTable(packed.source_ids[src_start:][proper],
+                                      source_rows[proper],
+                                      packed.target_ids[tar_pos[proper]])
+        # target-to-source links, parallel to target tokens
+        i = np.arange(tar_start, len(packed.target_ids)) - (
+            packed.target_offsets[target_rows])
+        j = packed.tar2src[tar_start:]
+        linked = j != NULL_POSITION
+        src_pos = packed.source_offsets[target_rows] + j
+        improper = linked & (packed.src2tar[np.where(linked, src_pos, 0)] != i)
+        improper_table = AlignmentTable(packed.source_ids[src_pos[improper]],
+                                        target_rows[improper],
+                                        packed.target_ids[tar_start:][improper])
+        return proper_table, improper_table
+
+    def add_translators(self, translators):
+        """Append the bitexts of translators read from ``corpus_path``.
+
+        Only the new bitexts are read, decoded and indexed; their entries
+        are merged into the posting lists and, when the DB has them, the
+        alignment tables.  ``corpus_path`` may be a newer corpus than the
+        one the DB was built from.
+        """
+        translators = [t for t in translators if t not in self.translators]
+        if not translators:
+            return
+        first = len(self)
+        self.packed.extend(self._read_bitexts(translators))
+        self.translators = list(self.translators) + translators
+        self.token_index.insert(self._token_postings(first))
+        self._build_field_indexes(first)
+        if self.proper_table is not None or not self.lazy:
+            self._decode(list(range(first, len(self))))
+        if self.proper_table is not None:
+            proper_table, improper_table = self._alignment_tables(first)
+            self.proper_table.insert(proper_table)
+            self.improper_table.insert(improper_table)
+
+    def drop_translators(self, translators):
+        """Remove the bitexts of translators from the DB and its indexes."""
+        packed = self.packed
+        dropped = [
+            code for code, name in enumerate(packed.translator_names)
+            if name in translators
+        ]
+        keep = ~np.isin(packed.translators, dropped)
+        packed.keep_rows(keep)
+        self.translators = [t for t in self.translators if t not in translators]
+        for index in (self.token_index, self.proper_table, self.improper_table):
+            if index is not None:
+                index.keep_rows(keep)
+        self._build_field_indexes()
+
+    def redecode(self, models=None):
+        """Decode all alignments again after the models were retrained.
+
+        Tokens and posting lists are kept; the models are reloaded and the
+        alignments and alignment tables are replaced.
+        :param models: tuple; (source to target, target to source) models
+            to use instead of the saved ones
+        """
+        self.model_source2target, self.model_target2source = (
+            models if models is not None else self._load_models())
+        packed = self.packed
+        packed.model_source2target = self.model_source2target
+        packed.model_target2source = self.model_target2source
+        packed.reset_alignments()
+        self.proper_table = self.improper_table = None
+        if not self.lazy:
+            self.precompute()
+
+    def _alignments_by_word(self, proper, words, postings=None):
+        """Generate (bitext, word, alignment) in DB order, then word order.
+
+        Reads the corpus-wide table when present, otherwise the bitexts.
+        :param proper: bool; proper (True) or improper (False) alignment
+        :param postings: set; restrict to these bitext indices
+        """
+        table = self.proper_table if proper else self.improper_table
+        word_ids = self._token_ids(words)
+        if table is None:
+            candidates = self._postings(self.token_index, word_ids)
+        else:
+            candidates = set()
+            for word_id in word_ids:
+                candidates.update(table.bitexts(word_id))
+        if postings is not None:
+            candidates &= postings
+        tokens = self.vocabulary.tokens
+        for idx in sorted(candidates):
+            bitext = self[idx]
+            for word, word_id in zip(words, word_ids):
+                if table is not None:
+                    alignment_lst = [(tokens[src_id], tokens[tar_id])
+                                     for src_id, tar_id in table.pairs(
+                                         word_id, idx)]
+                elif proper:
+                    alignment_lst = bitext.query_proper_alignment_by_token(word)
+                else:
+                    alignment_lst = bitext.query_improper_alignment_by_token(
+                        word)
+                for alignment in alignment_lst:
+                    yield bitext, word, alignment
 
     def query_bitext_by_word(self, *words):
         """Query bitext by words."""
-        for bitext in self.bitexts:
-            for word in words:
-                if word not in bitext.source:
-                    continue
-                yield bitext
+        return self.query_bitexts(words=words)
 
     def query_by_poem(self, idx: str):
         """Query bitext by words."""
-        for bitext in self.bitexts:
-            if idx != bitext.poem:
-                continue
-            yield bitext
+        return self.query_bitexts(poems=[idx])
 
     def query_bitext_by_translator(self, *translators):
         """Query bitext by translators."""
-        for bitext in self.bitexts:
-            for translator in translators:
-                if translator != bitext.translator:
-                    continue
-                yield bitext
+        return self.query_bitexts(translators=translators)
 
     def query_proper_alignment_by_word(self, *words):
         """Return proper alignment by words with full information."""
-        bitexts_by_words = self.query_bitext_by_word(*words)
-        for bitext in bitexts_by_words:
-            for word in words:
-                proper_alignment = bitext.query_proper_alignment_by_token(word)
-                for alignment in proper_alignment:
-                    yield AlignmentInfo(word, bitext.poem,
-                                        bitext.source_surface,
-                                        bitext.target_surface,
-                                        bitext.translator, alignment)
+        for bitext, word, alignment in self._alignments_by_word(True, words):
+            yield AlignmentInfo(word, bitext.poem, bitext.source_surface,
+                                bitext.target_surface, bitext.translator,
+                                alignment)
 
     def query_improper_alignment_by_word(self, *words):
         """Return alignment only from translation-to-source words and info."""
-        bitexts_by_words = self.query_bitext_by_word(*words)
-        for bitext in bitexts_by_words:
-            for word in words:
-                improper_alignment = bitext.query_improper_alignment_by_token(
-                    word)
-                for alignment in improper_alignment:
-                    yield AlignmentInfo(word, bitext.poem,
-                                        bitext.source_surface,
-                                        bitext.target_surface,
-                                        bitext.translator, alignment)
+        for bitext, word, alignment in self._alignments_by_word(False, words):
+            yield AlignmentInfo(word, bitext.poem, bitext.source_surface,
+                                bitext.target_surface, bitext.translator,
+                                alignment)
 
     def query_improper_alignment_by_word_in_poem(self, idx: str, *words: str):
         """Return alignment only from translation-to-source words and info of one poem."""
-        bitexts_by_words = self.query_bitext_by_word(*words)
-        bitexts_by_words = [bitext for bitext in bitexts_by_words if bitext.poem == idx]
+        postings = set(self.poem_index.get(idx, ()))
         for word in words:
-            for bitext in bitexts_by_words:
-                improper_alignment = bitext.query_improper_alignment_by_token(word)
-                for alignment in improper_alignment:
-                    yield AlignmentInfo(word, bitext.poem,
-                                        bitext.source_surface,
-                                        bitext.target_surface,
-                                        bitext.translator, alignment)
+            for bitext, _, alignment in self._alignments_by_word(
+                    False, [word], postings):
+                yield AlignmentInfo(word, bitext.poem, bitext.source_surface,
+                                    bitext.target_surface, bitext.translator,
+                                    alignment)
+
+    def save_mapped(self, dirname):
+        """Output the DB as a directory of .npy files.
+
+        All alignments are decoded and tabulated first, and models are
+        stored as arrays, so the saved DB is complete and read-only.
+        """
+        self.precompute()
+        if self.proper_table is None:
+            self._build_alignment_tables()
+        arrays = self.packed.arrays()
+        arrays["vocab"] = np.array(self.vocabulary.tokens, dtype=str)
+        arrays["selected_translators"] = np.array(self.translators, dtype=str)
+        arrays["meta"] = np.array([self.method, self.corpus_path], dtype=str)
+        arrays.update(self.token_index.arrays("token_index"))
+        arrays.update(self.proper_table.arrays("proper_table"))
+        arrays.update(self.improper_table.arrays("improper_table"))
+        for prefix, model in (("model_source2target", self.model_source2target),
+                              ("model_target2source", self.model_target2source)):
+            for name, array in self._model_arrays(model).items():
+                arrays[f"{prefix}.{name}"] = array
+        write_arrays(dirname, arrays)
+
+    @classmethod
+    def load_mapped(cls, dirname):
+        """Memory-map a DB saved by ``save_mapped``.
+
+        Arrays are read-only and shared through the page cache by every
+        process mapping the same directory; only the vocabulary and the
+        poem/translator posting lists are built in memory.
+        """
+        arrays = {
+            name: np.asarray(array)
+            for name, array in load_arrays(dirname).items()
+        }
+        db = cls.__new__(cls)
+        db.method, db.corpus_path = arrays["meta"].tolist()
+        db.translators = arrays["selected_translators"].tolist()
+        db.lazy = False
+        db.vocabulary = Vocabulary(arrays["vocab"].tolist())
+        db.model_source2target, db.model_target2source = (
+            db._model_from_arrays({
+                name[len(prefix) + 1:]: array
+                for name, array in arrays.items()
+                if name.startswith(f"{prefix}.")
+            }) for prefix in ("model_source2target", "model_target2source"))
+        db.packed = PackedBitexts.from_arrays(arrays, db.vocabulary,
+                                              db.model_source2target,
+                                              db.model_target2source,
+                                              db.method)
+        db.token_index = PostingIndex.from_arrays(arrays, "token_index")
+        db.proper_table = AlignmentTable.from_arrays(arrays, "proper_table")
+        db.improper_table = AlignmentTable.from_arrays(arrays,
+                                                       "improper_table")
+        db._build_field_indexes()
+        return db
+
+    def _model_arrays(self, model):
+        """Return model as a dict of arrays."""
+        if self.method == "ibm2":
+            return ibm2.to_arrays(model)
+        # elif other alignment methods
+        # ...
+
+    def _model_from_arrays(self, arrays):
+        """Return model over arrays of ``_model_arrays``."""
+        if self.method == "ibm2":
+            return ibm2.from_arrays(arrays)
+        # elif other alignment methods
+        # ...
 
 
 def main(args):
     basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
     logger = getLogger(__name__)
     logger.info(f"[INFO] args: {args}")
-    logger.info("[INFO] Loading DB...")
-    db = Bitexts(args.translators, args.method)
+    if args.update_path is not None:
+        import registry
+        logger.info(f"[INFO] Loading DB {args.update_path} to update...")
+        db = registry.get_db(args.update_path)
+        if args.drop:
+            logger.info(f"[INFO] Dropping {args.drop}...")
+            db.drop_translators(args.drop)
+        if args.redecode:
+            logger.info("[INFO] Decoding alignments with the current models...")
+            db.redecode()
+        if args.add:
+            logger.info(f"[INFO] Adding {args.add} from {args.corpus_path}...")
+            db.corpus_path = args.corpus_path
+            db.add_translators(args.add)
+    else:
+        logger.info("[INFO] Loading DB...")
+        db = Bitexts(args.translators,
+                     args.method,
+                     lazy=args.lazy,
+                     corpus_path=args.corpus_path)
     logger.info("[INFO] Saving DB...")
-    write_pickle(db, args.output_path)
+    if args.mapped:
+        db.save_mapped(args.output_path)
+    else:
+        write_pickle(db, args.output_path)
     logger.info("[INFO] Done.")
 
 
@@ -343,9 +1245,43 @@ def cli_main():
                         choices=["ibm2"],
                         help="selection of word alignment model")
     parser.add_argument("-o", "--output_path", help="path of output file")
+    parser.add_argument("-c",
+                        "--corpus_path",
+                        default="../cache/bitexts.csv",
+                        help="path of bitexts (.csv or corpus store)")
+    parser.add_argument("--lazy",
+                        action="store_true",
+                        help="save DB without decoding alignments up front")
+    parser.add_argument("--mapped",
+                        action="store_true",
+                        help="save DB as a memory-mapped directory")
+    parser.add_argument("-u",
+                        "--update_path",
+                        default=None,
+                        help="path of a saved DB (pickle or memory-mapped) to "
+                        "update instead of building a new one")
+    parser.add_argument("-a",
+                        "--add",
+                        nargs="+",
+                        default=[],
+                        help="translators to add from the bitexts (update)")
+    parser.add_argument("-d",
+                        "--drop",
+                        nargs="+",
+                        default=[],
+                        help="translators to drop (update)")
+    parser.add_argument("-r",
+                        "--redecode",
+                        action="store_true",
+                        help="decode alignments again with the current models "
+                        "(update)")
     args = parser.parse_args()
     main(args)
 
 
 if __name__ == "__main__":
-    cli_main()
+    # Run from the importable module, so that the pickled DB refers to
+    # bitexts.Bitext instead of carrying copies of __main__ classes whose
+    # lazy methods could not reach this module's imports.
+    import bitexts
+    bitexts.cli_main()
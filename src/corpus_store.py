@@ -0,0 +1,320 @@
+"""Columnar bitext corpus store.
+
+A store is a directory of .npy files, moved into place when complete as
+with ``utils.write_arrays``:
+
+- ``idx``: poem index of every bitext
+- ``translator`` / ``translator_vocab``: translator codes and names
+- ``{source,target}_ids`` / ``_offsets``: "/"-separated metacodes as token
+  IDs, bitext i spanning ``ids[offsets[i]:offsets[i+1]]``
+- ``vocab``: metacodes of the shared vocabulary (``vocab.Vocabulary``) by ID
+- ``{src,tar}_surface_blob`` / ``_offsets``: UTF-8 surface strings
+
+Columns are memory-mapped on load and only the requested ones are opened.
+``StoreWriter`` appends rows chunk by chunk, so writing a store needs
+memory for one chunk and the vocabularies only.
+"""
+import itertools
+import os
+import shutil
+import struct
+import tempfile
+import numpy as np
+from utils import load_arrays, move_into_place
+from vocab import Vocabulary
+
+COLUMNS = [
+    "idx", "source", "src_surface", "target", "tar_surface", "translator"
+]
+TOKEN_COLUMNS = ["source", "target"]
+TEXT_COLUMNS = ["src_surface", "tar_surface"]
+SEP = "/"
+
+
+class TokenColumn:
+    """Token sequences stored as IDs and offsets."""
+
+    def __init__(self, ids, offsets, vocab):
+        self.ids = ids
+        self.offsets = offsets
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def token_ids(self, i):
+        """Return token IDs of the i-th sequence (a view)."""
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i):
+        return self.vocab[self.token_ids(i)].tolist()
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def tolist(self):
+        """Return sequences as "/"-separated strings."""
+        vocab = self.vocab.tolist()
+        ids = self.ids.tolist()
+        offsets = self.offsets.tolist()
+        return [
+            SEP.join([vocab[token] for token in ids[start:end]])
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+
+class TextColumn:
+    """Strings stored as one UTF-8 blob and offsets."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def tolist(self):
+        blob = bytes(self.blob)
+        offsets = self.offsets.tolist()
+        return [
+            blob[start:end].decode()
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+
+class CategoryColumn:
+    """Strings stored as codes into a small vocabulary."""
+
+    def __init__(self, codes, vocab):
+        self.codes = codes
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return str(self.vocab[self.codes[i]])
+
+    def isin(self, values):
+        """Return boolean mask of rows whose value is one of values."""
+        return np.isin(self.codes,
+                       np.flatnonzero(np.isin(self.vocab, list(values))))
+
+    def tolist(self):
+        return self.vocab[self.codes].tolist()
+
+
+def _files(column):
+    """Return .npy stems of a column."""
+    if column in TOKEN_COLUMNS:
+        return [f"{column}_ids", f"{column}_offsets", "vocab"]
+    if column in TEXT_COLUMNS:
+        return [f"{column}_blob", f"{column}_offsets"]
+    if column == "translator":
+        return ["translator", "translator_vocab"]
+    return [column]
+
+
+class CorpusStore:
+    """Read-only view of a columnar store."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def __len__(self):
+        for name, array in self.arrays.items():
+            if name.endswith("_offsets"):
+                return len(array) - 1
+            if not name.endswith(("vocab", "_ids", "_blob")):
+                return len(array)
+        return 0
+
+    def __getitem__(self, column):
+        arrays = self.arrays
+        if column in TOKEN_COLUMNS:
+            return TokenColumn(arrays[f"{column}_ids"],
+                               arrays[f"{column}_offsets"], arrays["vocab"])
+        if column in TEXT_COLUMNS:
+            return TextColumn(arrays[f"{column}_blob"],
+                              arrays[f"{column}_offsets"])
+        if column == "translator":
+            return CategoryColumn(arrays["translator"],
+                                  arrays["translator_vocab"])
+        return arrays[column]
+
+    def vocabulary(self):
+        """Return the shared metacode vocabulary of the store."""
+        return Vocabulary(self.arrays["vocab"].tolist())
+
+    def to_frame(self, columns=None):
+        """Decode columns into a pandas.DataFrame (as read from .csv)."""
+        import pandas as pd
+        if columns is None:
+            columns = [c for c in COLUMNS if _files(c)[0] in self.arrays]
+        return pd.DataFrame({
+            column: (self[column] if column == "idx" else
+                     self[column].tolist())
+            for column in columns
+        })
+
+
+# Columns appended row by row; the vocabularies are saved on close
+DTYPES = {
+    "idx": np.int32,
+    "translator": np.int16,
+    **{f"{column}_ids": np.int32 for column in TOKEN_COLUMNS},
+    **{f"{column}_blob": np.uint8 for column in TEXT_COLUMNS},
+    **{
+        f"{column}_offsets": np.int64
+        for column in TOKEN_COLUMNS + TEXT_COLUMNS
+    },
+}
+HEADER_SIZE = 128
+
+
+def _npy_header(dtype, length):
+    """Return a .npy (version 1.0) header of HEADER_SIZE bytes.
+
+    The header has a fixed size whatever the length, so it can be
+    rewritten in place once all rows are appended.
+    """
+    header = repr({
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": (length, ),
+    })
+    header = header.ljust(HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H",
+                                               len(header)) + header.encode()
+
+
+class StoreWriter:
+    """Write a columnar store chunk by chunk.
+
+    Every chunk is encoded and appended to the column files at once; the
+    .npy headers get their lengths when the writer is closed, which moves
+    the store into place (see ``utils.write_arrays``).
+    """
+
+    def __init__(self, dirname, vocabulary=None):
+        """
+        :param vocabulary: vocab.Vocabulary; shared vocabulary to encode
+            with, extended in place (a new one by default)
+        """
+        self.dirname = dirname
+        self.vocabulary = Vocabulary() if vocabulary is None else vocabulary
+        self.translator_vocab = {}
+        self.tmp_dirname = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(dirname)), prefix=".tmp-")
+        self.files = {}
+        self.lengths = dict.fromkeys(DTYPES, 0)
+        self.ends = {}
+        for name, dtype in DTYPES.items():
+            self.files[name] = open(
+                os.path.join(self.tmp_dirname, f"{name}.npy"), "wb")
+            self.files[name].write(_npy_header(dtype, 0))
+            if name.endswith("_offsets"):
+                self.ends[name] = 0
+                self._append(name, [0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _append(self, name, values):
+        array = np.asarray(values, dtype=DTYPES[name])
+        self.files[name].write(array.tobytes())
+        self.lengths[name] += len(array)
+
+    def append(self, rows):
+        """Encode and append bitext rows.
+
+        :param rows: iter; (idx, source, src_surface, target, tar_surface,
+            translator) tuples, e.g. ``DataFrame.itertuples(index=False)``
+        """
+        idx = []
+        translator = []
+        tokens = {column: ([], []) for column in TOKEN_COLUMNS}
+        texts = {column: (bytearray(), []) for column in TEXT_COLUMNS}
+        for row in rows:
+            row = dict(zip(COLUMNS, row))
+            idx.append(int(row["idx"]))
+            translator.append(
+                self.translator_vocab.setdefault(row["translator"],
+                                                 len(self.translator_vocab)))
+            for column in TOKEN_COLUMNS:
+                ids, offsets = tokens[column]
+                value = row[column] if isinstance(row[column], str) else ""
+                ids.extend(
+                    self.vocabulary.add(token) for token in value.split(SEP))
+                offsets.append(len(ids))
+            for column in TEXT_COLUMNS:
+                blob, offsets = texts[column]
+                value = row[column] if isinstance(row[column], str) else ""
+                blob.extend(value.encode())
+                offsets.append(len(blob))
+        self._append("idx", idx)
+        self._append("translator", translator)
+        for column, (ids, offsets) in tokens.items():
+            self._append(f"{column}_ids", ids)
+            self._append_offsets(column, offsets)
+        for column, (blob, offsets) in texts.items():
+            self._append(f"{column}_blob", np.frombuffer(blob, dtype=np.uint8))
+            self._append_offsets(column, offsets)
+
+    def _append_offsets(self, column, offsets):
+        """Append offsets of a chunk, shifted past the rows written."""
+        name = f"{column}_offsets"
+        self._append(name, np.asarray(offsets, dtype=np.int64) + self.ends[name])
+        if offsets:
+            self.ends[name] += offsets[-1]
+
+    def close(self):
+        """Write the headers and vocabularies and move the store into place."""
+        for name, fp in self.files.items():
+            fp.seek(0)
+            fp.write(_npy_header(DTYPES[name], self.lengths[name]))
+            fp.close()
+        np.save(os.path.join(self.tmp_dirname, "translator_vocab.npy"),
+                np.array(list(self.translator_vocab), dtype=str))
+        np.save(os.path.join(self.tmp_dirname, "vocab.npy"),
+                np.array(self.vocabulary.tokens, dtype=str))
+        move_into_place(self.tmp_dirname, self.dirname)
+
+    def abort(self):
+        """Discard everything written."""
+        for fp in self.files.values():
+            fp.close()
+        shutil.rmtree(self.tmp_dirname)
+
+
+def write(dirname, rows, vocabulary=None, chunksize=10000):
+    """Write bitext rows as a columnar store.
+
+    Rows are consumed ``chunksize`` at a time (see ``StoreWriter``).
+    :param rows: iter; (idx, source, src_surface, target, tar_surface,
+        translator) tuples, e.g. ``DataFrame.itertuples(index=False)``
+    :param vocabulary: vocab.Vocabulary; shared vocabulary to encode with,
+        extended in place (a new one by default)
+    """
+    rows = iter(rows)
+    with StoreWriter(dirname, vocabulary) as writer:
+        for chunk in iter(lambda: list(itertools.islice(rows, chunksize)),
+                          []):
+            writer.append(chunk)
+
+
+def load(dirname, columns=None):
+    """Memory-map a columnar store, opening only the given columns."""
+    names = None
+    if columns is not None:
+        names = [name for column in columns for name in _files(column)]
+    return CorpusStore(load_arrays(dirname, names))
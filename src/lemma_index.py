@@ -0,0 +1,88 @@
+"""Metacode -> lemma map with reverse and prefix indexes.
+
+An index is a directory of .npy files written with ``utils.write_arrays``:
+
+- ``metacodes``: metacodes of the map, sorted
+- ``lemmas``: lemma of every sorted metacode
+- ``positions``: position of every sorted metacode in the original map
+- ``by_lemma`` / ``lemma_keys``: metacode indices sorted by lemma (then by
+  position) and their lemmas
+
+Lookups by metacode, lemma or metacode prefix are binary searches over the
+memory-mapped arrays.
+"""
+from collections.abc import Mapping
+import numpy as np
+from utils import write_arrays, load_arrays
+
+
+def _span(keys, start_key, end_key=None):
+    """Return [start, end) of keys within [start_key, end_key]."""
+    start = int(np.searchsorted(keys, start_key, side="left"))
+    end = int(np.searchsorted(keys, start_key if end_key is None else end_key,
+                              side="left" if end_key else "right"))
+    return start, end
+
+
+class LemmaIndex(Mapping):
+    """Read-only metacode -> lemma mapping over sorted arrays.
+
+    Iteration follows the order of the original map.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = {name: np.asarray(array) for name, array in arrays.items()}
+
+    def __len__(self):
+        return len(self.arrays["metacodes"])
+
+    def __getitem__(self, metacode):
+        start, end = _span(self.arrays["metacodes"], metacode)
+        if start == end:
+            raise KeyError(metacode)
+        return str(self.arrays["lemmas"][start])
+
+    def __iter__(self):
+        metacodes = self.arrays["metacodes"]
+        return iter(metacodes[np.argsort(self.arrays["positions"])].tolist())
+
+    def metacodes(self, lemma):
+        """Return metacodes of lemma in the order of the original map."""
+        start, end = _span(self.arrays["lemma_keys"], lemma)
+        rows = self.arrays["by_lemma"][start:end]
+        return self.arrays["metacodes"][rows].tolist()
+
+    def with_prefix(self, prefix):
+        """Return metacodes starting with prefix (e.g. "BG-01-55"), sorted."""
+        if not prefix:
+            return self.arrays["metacodes"].tolist()
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        start, end = _span(self.arrays["metacodes"], prefix, upper)
+        return self.arrays["metacodes"][start:end].tolist()
+
+
+def build(map_dict):
+    """Return LemmaIndex of a metacode -> lemma dict."""
+    metacodes = np.array(list(map_dict), dtype=str)
+    lemmas = np.array(list(map_dict.values()), dtype=str)
+    order = np.argsort(metacodes, kind="stable")
+    metacodes = metacodes[order]
+    lemmas = lemmas[order]
+    by_lemma = np.lexsort((order, lemmas)).astype(np.int32)
+    return LemmaIndex({
+        "metacodes": metacodes,
+        "lemmas": lemmas,
+        "positions": order.astype(np.int32),
+        "by_lemma": by_lemma,
+        "lemma_keys": lemmas[by_lemma],
+    })
+
+
+def write(dirname, map_dict):
+    """Output index of a metacode -> lemma dict."""
+    write_arrays(dirname, build(map_dict).arrays)
+
+
+def load(dirname):
+    """Memory-map an index."""
+    return LemmaIndex(load_arrays(dirname))
@@ -1,8 +1,13 @@
 """Use Konkinwakashu and translations to construct bitexts."""
 import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 from logging import basicConfig, getLogger, DEBUG
 import re
 import pandas as pd
+import corpus_store
+import vocab
 
 translator_lst = [
     'kaneko', 'katagiri', 'kojimaarai', 'komachiya', 'kubota', 'kyusojin',
@@ -10,93 +15,165 @@ translator_lst = [
 ]
 
 
-def _idx2str(corpus, poem_idx):
-    """Obtain poem string from corpus.
+def _poem2str(corpus, key="poem_id"):
+    """Obtain poem strings of every poem from corpus in one pass.
 
+    Tokens are grouped by exact ``key``, poems keep their order of first
+    appearance.
     :param corpus: pandas.DataFrame; vocabulary database
-    :param poem_idx: str; poem index
-    :param corpus_type: str: target or source
+    :param key: str; column identifying a poem
 
-    :return bg_id: str; BunruiGoiShu id string
-    :return surface: str; surface form string
+    :return poems: pandas.DataFrame; idx, bg_id string and surface string
     """
-    token = corpus[corpus.poem_id.str.match(poem_idx)]
-    surface = "".join(map(str, token.surface))
+    groups = corpus.groupby(key, sort=False)
+    surface = groups.surface.agg(lambda x: "".join(map(str, x)))
     # Keep noun (no include pronoun), verb (no include passive), 
     # adv (no include ない), adj (no include ない), and proper name;
     # pattern = re.compile(r'BG-16|BG-0[456789]|BG-03-1000|BG-03-1200-02|BG-03-1400-04-200-A|BG-03-1300-01|BG-02-1110|BG-01-1[07]00|BG-01-1010')  
-    bg_id = "/".join(filter(lambda x: "BG-16" not in x, token.bg_id))
-    return bg_id, surface
+    bg_id = groups.bg_id.agg(
+        lambda x: "/".join(filter(lambda y: "BG-16" not in y, x)))
+    return pd.DataFrame({
+        "idx": surface.index,
+        "bg_id": bg_id.values,
+        "surface": surface.values
+    })
 
 
-def load_kokin(fname):
-    """Load source (Kokinwakashu original texts)."""
+KOKIN_TOKEN_TYPES = [
+    "A00",  # simplex without variant complex
+    "B00",  # complex
+    "D00",  # proper noun complex
+]
+
+
+def _read_hachidai(fname, chunksize=None):
+    """Read the Hachidaishu file, whole or as an iterator of chunks."""
+    return pd.read_table(fname,
+                         usecols=range(9),
+                         sep=" ",
+                         names=[
+                             "idx", "token_type", "bg_id", "chasen_id",
+                             "surface", "lemma", "lemma_reading", "kanji",
+                             "kanji_reading"
+                         ],
+                         chunksize=chunksize)
+
+
+def _kokin_rows(hachidai):
+    """Derive id columns and keep Kokinwakashu vocabulary rows."""
+    hachidai = hachidai.copy()
+    idx_fields = hachidai.idx.str.split(":", expand=True)
+    hachidai[["anthology_id", "poem_id",
+              "token_id"]] = idx_fields.reindex(columns=range(3))
+    bg_fields = hachidai.bg_id.str.split("-", expand=True)
+    hachidai[["general_id", "pos_id", "group_id", "filed_id",
+              "exact_id"]] = bg_fields.reindex(columns=range(5))
+    kokin_voc = hachidai[
+        hachidai.token_type.str[:3].isin(KOKIN_TOKEN_TYPES)
+        & hachidai.anthology_id.str.startswith("01")  # only kokinshu
+    ]
+    return kokin_voc
+
+
+def _read_kokin_voc(fname, chunksize=None):
+    """Read Kokinwakashu vocabulary rows from the Hachidaishu file.
+
+    :param chunksize: int; if given, read the file in chunks of this many
+        lines and keep only Kokinshu (anthology 01) rows of each chunk
+    """
+    if chunksize is None:
+        return _kokin_rows(_read_hachidai(fname))
+    return _kokin_rows(
+        pd.concat([
+            chunk[chunk.idx.str.startswith("01")]
+            for chunk in _read_hachidai(fname, chunksize)
+        ],
+                  ignore_index=True))
+
+
+def load_kokin(fname, chunksize=None):
+    """Load source (Kokinwakashu original texts).
+
+    :param chunksize: int; read only Kokinshu rows, chunk by chunk
+    """
     logger = getLogger(__name__)
     logger.info(f"[INFO] Loading {fname} for Kokinwakashu texts...")
-    hachidai = pd.read_table(fname,
-                             usecols=range(9),
-                             sep=" ",
-                             names=[
-                                 "idx", "token_type", "bg_id", "chasen_id",
-                                 "surface", "lemma", "lemma_reading", "kanji",
-                                 "kanji_reading"
-                             ])
-    hachidai["anthology_id"] = hachidai.idx.map(lambda x: x.split(":")[0])
-    hachidai["poem_id"] = hachidai.idx.map(lambda x: x.split(":")[1])
-    hachidai["token_id"] = hachidai.idx.map(lambda x: x.split(":")[2])
-    hachidai["general_id"] = hachidai.bg_id.map(lambda x: x.split("-")[0])
-    hachidai["pos_id"] = hachidai.bg_id.map(lambda x: x.split("-")[1])
-    hachidai["group_id"] = hachidai.bg_id.map(lambda x: x.split("-")[2])
-    hachidai["filed_id"] = hachidai.bg_id.map(lambda x: x.split("-")[3])
-    hachidai["exact_id"] = hachidai.bg_id.map(lambda x: x.split("-")[4])
-    kokin_voc = hachidai[(
-        hachidai.token_type.str.match("A00")
-        |  # simplex without variant complex
-        hachidai.token_type.str.match("B00") |  # complex
-        hachidai.token_type.str.match("D00")  # proper noun complex
-    ) & hachidai.anthology_id.str.match("01")  # only kokinshu
-                         ]
-    kokin = pd.DataFrame()
-    kokin["idx"] = kokin_voc.poem_id.unique()
-    kokin["source"], kokin["src_surface"] = tuple(
-        zip(*kokin.idx.map(lambda x: _idx2str(kokin_voc, x))))
+    kokin = _poem2str(_read_kokin_voc(fname, chunksize)).rename(columns={
+        "bg_id": "source",
+        "surface": "src_surface"
+    })
     kokin["idx"] = kokin.idx.map(int)
     return kokin
 
 
+def _read_translations(fname, chunksize=None):
+    """Read all translations with explicit dtypes (kept as raw strings)."""
+    return pd.read_table(fname,
+                         usecols=[1, 2, 3, 7, 8],
+                         sep=" ",
+                         names=[
+                             "variant", "translator", "poem_id", "variant_id",
+                             "a", "b", "c", "bg_id", "surface", "reading",
+                             "lemma"
+                         ],
+                         dtype={
+                             "translator": "category",
+                             "poem_id": str,
+                             "variant_id": str,
+                             "bg_id": str,
+                             "surface": str,
+                         },
+                         chunksize=chunksize)
+
+
+def _feasible(target_voc):
+    """Exclude infeasible translation variants."""
+    return target_voc[(target_voc.variant_id == "1") |
+                      (target_voc.variant_id == "0")]
+
+
+def _target_frame(target_voc_by_translator, translator):
+    """Build the target frame of one translator from its vocabulary rows."""
+    target_by_translator = _poem2str(_feasible(target_voc_by_translator)).rename(
+        columns={
+            "bg_id": "target",
+            "surface": "tar_surface"
+        })
+    target_by_translator["translator"] = translator
+    target_by_translator["idx"] = target_by_translator.idx.map(int)
+    return target_by_translator
+
+
 def load_translation(fname, translator):
     """Load target (translations of Kokinwakashu)."""
     logger = getLogger(__name__)
     logger.info(f"[INFO] Loading {fname} for {translator}'s traslation...")
-    target_voc = pd.read_table(fname,
-                               usecols=range(11),
-                               sep=" ",
-                               names=[
-                                   "variant", "translator", "poem_id",
-                                   "variant_id", "a", "b", "c", "bg_id",
-                                   "surface", "reading", "lemma"
-                               ],
-                               dtype={
-                                   "variant": "string",
-                                   "poem_id": "string",
-                                   "variant_id": "string",
-                               })
-    target_voc_by_translator = target_voc[target_voc.translator ==
-                                          translator]  # select translator
-    target_voc_by_translator = target_voc_by_translator[(
-        (target_voc_by_translator.variant_id == "1") |
-        (target_voc_by_translator.variant_id == "0")
-    )  # exclude infeasible variant
-                                                        ]
-    target_by_translator = pd.DataFrame()
-    target_by_translator["idx"] = target_voc_by_translator.poem_id.unique()
-    target_by_translator["target"], target_by_translator[
-        "tar_surface"] = tuple(
-            zip(*target_by_translator.idx.map(
-                lambda x: _idx2str(target_voc_by_translator, x))))
-    target_by_translator["translator"] = translator
-    target_by_translator["idx"] = target_by_translator.idx.map(int)
-    return target_by_translator
+    target_voc = _read_translations(fname)
+    return _target_frame(target_voc[target_voc.translator == translator],
+                         translator)
+
+
+def load_translations(fname, translators, workers=1):
+    """Load targets of several translators, parsing the file once.
+
+    :param translators: list; translator names
+    :param workers: int; processes building the per-translator frames
+
+    :return target_dfs: list; target frames in the order of translators
+    """
+    logger = getLogger(__name__)
+    logger.info(f"[INFO] Loading {fname} for {len(translators)} translators...")
+    target_voc = _read_translations(fname)
+    partition = dict(
+        tuple(target_voc.groupby("translator", sort=False, observed=True)))
+    target_vocs = [
+        partition.get(translator, target_voc.iloc[:0])
+        for translator in translators
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_target_frame, target_vocs, translators))
+    return list(map(_target_frame, target_vocs, translators))
 
 
 def _make_bitext(source_df, target_df):
@@ -111,12 +188,124 @@ def _make_bitext(source_df, target_df):
     return bitext_df
 
 
-def _make_bitext_by_translator(fname, source_df, tanslator):
+def _make_bitext_by_translator(source_df, target_df):
     """Make by-translator source-target bitexts."""
     return _make_bitext(
-        source_df,
-        load_translation(fname, tanslator).sort_values(by="idx",
-                                                       ignore_index=True))
+        source_df, target_df.sort_values(by="idx", ignore_index=True))
+
+
+def _stream_poems(chunks, key):
+    """Yield poem strings chunk by chunk.
+
+    Token rows of a poem must be contiguous, as in both databases.  The
+    last poem of a chunk may continue in the next one, so its rows are
+    carried over until its key changes.
+    :param chunks: iter; pandas.DataFrame chunks with key, bg_id and surface
+    :param key: str; column identifying a poem
+
+    :yield poem: tuple; key, bg_id string and surface string
+    """
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        if chunk.empty:
+            pending = chunk
+            continue
+        unfinished = chunk[key] == chunk[key].iloc[-1]
+        last_run = unfinished[::-1].cummin()[::-1]
+        pending = chunk[last_run]
+        yield from _poem2str(chunk[~last_run],
+                             key).itertuples(index=False, name=None)
+    if pending is not None and not pending.empty:
+        yield from _poem2str(pending, key).itertuples(index=False, name=None)
+
+
+def stream_kokin(fname, chunksize):
+    """Yield Kokinwakashu poems as (idx, source, src_surface)."""
+
+    def chunks():
+        for chunk in _read_hachidai(fname, chunksize):
+            chunk = chunk[chunk.idx.str.startswith("01")]
+            if not chunk.empty:
+                yield _kokin_rows(chunk)
+
+    for poem_id, source, surface in _stream_poems(chunks(), "poem_id"):
+        yield int(poem_id), source, surface
+
+
+def stream_translations(fname, translators, chunksize):
+    """Yield translated poems as (translator, idx, target, tar_surface)."""
+
+    def chunks():
+        for chunk in _read_translations(fname, chunksize):
+            chunk = _feasible(chunk[chunk.translator.isin(translators)])
+            chunk = chunk.assign(poem_key=chunk.translator.astype(str) + " " +
+                                 chunk.poem_id)
+            yield chunk
+
+    for poem_key, target, surface in _stream_poems(chunks(), "poem_key"):
+        translator, poem_id = poem_key.split(" ")
+        yield translator, int(poem_id), target, surface
+
+
+def stream_bitexts(src_path,
+                   tar_path,
+                   out_path,
+                   translators,
+                   chunksize,
+                   store_path=None,
+                   vocabulary=None):
+    """Write bitexts incrementally while streaming both databases.
+
+    Only the Kokinwakashu poem strings are kept in memory; translations are
+    read chunk by chunk and every bitext is written as soon as its poem is
+    complete, in the order of the translation file.
+    :param store_path: str; also write a columnar corpus store
+    :param vocabulary: vocab.Vocabulary; shared vocabulary of the store
+    """
+    logger = getLogger(__name__)
+    logger.info(f"[INFO] Streaming {src_path} for Kokinwakashu texts...")
+    source = {
+        idx: (source, surface)
+        for idx, source, surface in stream_kokin(src_path, chunksize)
+    }
+    logger.info(f"[INFO] Streaming {tar_path} for translations...")
+    n_bitext = 0
+    with open(out_path, "w", newline="") as fp:
+        writer = csv.writer(fp, lineterminator="\n")
+        writer.writerow(corpus_store.COLUMNS)
+
+        def rows():
+            nonlocal n_bitext
+            for translator, idx, target, surface in stream_translations(
+                    tar_path, translators, chunksize):
+                if idx not in source:
+                    continue
+                row = (idx, *source[idx], target, surface, translator)
+                writer.writerow(row)
+                n_bitext += 1
+                yield row
+
+        if store_path is None:
+            for _ in rows():
+                pass
+        else:
+            corpus_store.write(store_path, rows(), vocabulary)
+    logger.info(f"[INFO] Wrote {n_bitext} bitexts.")
+
+
+def _load_vocabulary(fname):
+    """Load the shared vocabulary to extend, or start a new one."""
+    if fname is not None and os.path.exists(fname):
+        return vocab.load(fname)
+    return vocab.Vocabulary()
+
+
+def _save_vocabulary(fname, vocabulary):
+    if fname is not None:
+        getLogger(__name__).info(f"[INFO] Saving vocabulary {fname}...")
+        vocab.save(fname, vocabulary)
 
 
 def main(args):
@@ -124,16 +313,33 @@ def main(args):
     basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
     logger = getLogger(__name__)
     logger.info(f"[INFO] args: {args}")
-    source_df = load_kokin(args.src_path).sort_values(by="idx",
+    vocabulary = _load_vocabulary(args.vocab_path)
+    if args.stream:
+        stream_bitexts(args.src_path, args.tar_path, args.out_path,
+                       translator_lst, args.chunksize or 100000,
+                       args.store_path, vocabulary)
+        _save_vocabulary(args.vocab_path, vocabulary)
+        logger.info("[INFO] Made bitexts.")
+        return
+    source_df = load_kokin(args.src_path, args.chunksize).sort_values(by="idx",
                                                       ignore_index=True)
     translators = translator_lst
-    bitext_lst = list(
-        map(
-            lambda translator: _make_bitext_by_translator(
-                args.tar_path, source_df, translator), translators))
+    target_dfs = load_translations(args.tar_path, translators, args.jobs)
+    bitext_lst = [
+        _make_bitext_by_translator(source_df, target_df)
+        for target_df in target_dfs
+    ]
     logger.info("[INFO] Concating bitexts...")
     all_bitext = pd.concat(bitext_lst, axis=0, ignore_index=True)
     all_bitext.to_csv(args.out_path, index=False)
+    if args.store_path is not None:
+        logger.info(f"[INFO] Writing corpus store {args.store_path}...")
+        corpus_store.write(
+            args.store_path,
+            all_bitext[corpus_store.COLUMNS].itertuples(index=False,
+                                                        name=None),
+            vocabulary)
+        _save_vocabulary(args.vocab_path, vocabulary)
     logger.info("[INFO] Made bitexts.")
 
 
@@ -143,6 +349,28 @@ def cli_main():
     parser.add_argument("-s", "--src_path", help="path of source DB")
     parser.add_argument("-t", "--tar_path", help="path of target DB")
     parser.add_argument("-o", "--out_path", help="path of output file")
+    parser.add_argument("--store_path",
+                        default=None,
+                        help="path of output columnar corpus store")
+    parser.add_argument("-v",
+                        "--vocab_path",
+                        default=None,
+                        help="path of shared metacode vocabulary (.npy), "
+                        "extended if it exists")
+    parser.add_argument("-c",
+                        "--chunksize",
+                        type=int,
+                        default=None,
+                        help="read only Kokinshu rows in chunks of this size")
+    parser.add_argument("--stream",
+                        action="store_true",
+                        help="stream both databases chunk by chunk and "
+                        "write bitexts incrementally")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=1,
+                        help="processes building per-translator targets")
     args = parser.parse_args()
     main(args)
 
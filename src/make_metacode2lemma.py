@@ -1,60 +1,176 @@
-"""Make metacode to lemma mapping dictionary."""
+"""Make metacode to lemma mapping dictionaries.
+
+Source (Hachidaishu) and target (translations) maps are built in one run.
+Files are split into chunks at line boundaries and parsed in parallel;
+every chunk keeps the first lemma of each metacode and chunks are merged
+in file order, so the maps are the same as with a sequential scan.  Maps
+are saved as ``lemma_index`` directories.
+"""
+import io
+import os
 import re
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from logging import basicConfig, getLogger, DEBUG
-from utils import write_pickle
+import lemma_index
+import vocab
+
+PATTERNS = {
+    "source": re.compile(r"(?:BG|CH|PR|JO)-.{2}-.{4}-.{2}-.{4}"),
+    "target": re.compile(r"(?:BG|CH|PR|JO)-.{2}-.{4}-.{2}-.{3}-."),
+}
+
+
+def _parse_source(lines):
+    """Return first lemma of every metacode and lines without metacode."""
+    search = PATTERNS["source"].search
+    map_dict = {}
+    missing = 0
+    for line in lines:
+        if line[:2] != "01":
+            continue
+        fields = line.split()
+        if fields[1][0] in "CE":
+            continue
+        match = search(line)
+        if match is None:
+            missing += 1
+        elif match.group() not in map_dict:
+            map_dict[match.group()] = fields[5]
+    return map_dict, missing
+
+
+def _parse_target(lines):
+    """Return first lemma of every metacode and lines without metacode."""
+    search = PATTERNS["target"].search
+    map_dict = {}
+    missing = 0
+    for line in lines:
+        match = search(line)
+        if match is None:
+            missing += 1
+        elif match.group() not in map_dict:
+            map_dict[match.group()] = line.split()[-1]
+    return map_dict, missing
+
+
+PARSERS = {"source": _parse_source, "target": _parse_target}
+
+
+def _chunks(fname, chunksize):
+    """Return (start, end) byte ranges of fname ending at line ends."""
+    size = os.path.getsize(fname)
+    bounds = [0]
+    with open(fname, "rb") as fp:
+        while bounds[-1] < size:
+            fp.seek(min(bounds[-1] + chunksize, size))
+            fp.readline()
+            bounds.append(min(fp.tell(), size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_chunk(db_format, fname, start, end):
+    """Parse lines of fname in the byte range [start, end)."""
+    with open(fname, "rb") as fp:
+        fp.seek(start)
+        data = fp.read(end - start).decode()
+    # Same lines as iterating the file in text mode (universal newlines)
+    return PARSERS[db_format](io.StringIO(data, newline=None))
+
+
+def build_maps(files, jobs=1, chunksize=1 << 22):
+    """Build metacode to lemma maps of several files.
+
+    :param files: dict; db format ("source"/"target") -> file path
+    :param jobs: int; number of worker processes
+    :param chunksize: int; approximate bytes per chunk
+    :return: dict; db format -> (map, number of lines without metacode)
+    """
+    tasks = [(db_format, fname, start, end)
+             for db_format, fname in files.items()
+             for start, end in _chunks(fname, chunksize)]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_parse_chunk, *zip(*tasks)))
+    else:
+        results = [_parse_chunk(*task) for task in tasks]
+
+    maps = {db_format: ({"NULL": "NULL"}, 0) for db_format in files}
+    for (db_format, *_), (chunk_map, missing) in zip(tasks, results):
+        map_dict, n_missing = maps[db_format]
+        for metacode, lemma in chunk_map.items():
+            map_dict.setdefault(metacode, lemma)
+        maps[db_format] = map_dict, n_missing + missing
+    return maps
 
 
 def main(args):
-    """Make metacode to lemma mapping dictionary."""
+    """Make metacode to lemma mapping dictionaries."""
     basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
     logger = getLogger(__name__)
     logger.info(f"[INFO] args: {args}")
-    map_dict = {"NULL": "NULL"}
-    with open(args.file_path) as fp:
-        for line in fp:
-            try:
-                if args.db_format == "source":
-                    if line[:2] != "01":
-                        continue
-                    decomp = line.split()[1]
-                    if (decomp[0] == "C") | (decomp[0] == "E"):
-                        continue
-                    metacode = re.search(r'(BG|CH|PR|JO)-.{2}-.{4}-.{2}-.{4}',
-                                         line).group()
-                elif args.db_format == "target":
-                    metacode = re.search(
-                        r'(BG|CH|PR|JO)-.{2}-.{4}-.{2}-.{3}-.', line).group()
-                else:
-                    continue
-            except AttributeError:
-                logger.debug("[Debug] No metacode at '{}' in {} texts.".format(
-                    line.strip(), args.db_format))
-                metacode = None
-            if metacode:
-                if metacode not in map_dict.keys():
-                    if args.db_format == "source":
-                        lemma = line.strip().split()[5]
-                        map_dict[metacode] = lemma
-                    elif args.db_format == "target":
-                        lemma = line.strip().split()[-1]
-                        map_dict[metacode] = lemma
-                    else:
-                        continue
-    logger.info(f"[INFO] Saving {args.output_path}...")
-    write_pickle(map_dict, args.output_path)
+    files = {}
+    outputs = {}
+    for db_format, fname, output_path in (
+        ("source", args.source_path, args.source_output),
+        ("target", args.target_path, args.target_output)):
+        if fname is not None:
+            files[db_format] = fname
+            outputs[db_format] = output_path
+    maps = build_maps(files, args.jobs, args.chunksize)
+    for db_format, (map_dict, missing) in maps.items():
+        if missing:
+            logger.debug(f"[Debug] {missing} lines without metacode in "
+                         f"{db_format} texts.")
+        logger.info(f"[INFO] Saving {outputs[db_format]} "
+                    f"({len(map_dict)} metacodes)...")
+        lemma_index.write(outputs[db_format], map_dict)
+    if args.vocab_path is not None:
+        # Register every mapped metacode, so that IDs of the shared
+        # vocabulary cover the lemma maps as well as the bitexts
+        vocabulary = (vocab.load(args.vocab_path) if os.path.exists(
+            args.vocab_path) else vocab.Vocabulary())
+        for map_dict, _ in maps.values():
+            for metacode in map_dict:
+                if metacode != "NULL":
+                    vocabulary.add(metacode)
+        logger.info(f"[INFO] Saving vocabulary {args.vocab_path}...")
+        vocab.save(args.vocab_path, vocabulary)
     logger.info("[INFO] Done.")
 
 
 def cli_main():
     """Arguement parser setting."""
     parser = argparse.ArgumentParser()
-    parser.add_argument("-f", "--file_path", help="path of vocabulary dataset")
-    parser.add_argument("-o", "--output_path", help="path of output file")
+    parser.add_argument("-s",
+                        "--source_path",
+                        default=None,
+                        help="path of Hachidaishu file")
     parser.add_argument("-t",
-                        "--db_format",
-                        choices=["source", "target"],
-                        help="input database format: source/target")
+                        "--target_path",
+                        default=None,
+                        help="path of translations file")
+    parser.add_argument("--source_output",
+                        default="../cache/metacode2lemma_src.idx",
+                        help="path of source map (lemma_index directory)")
+    parser.add_argument("--target_output",
+                        default="../cache/metacode2lemma_tar.idx",
+                        help="path of target map (lemma_index directory)")
+    parser.add_argument("-v",
+                        "--vocab_path",
+                        default=None,
+                        help="path of shared metacode vocabulary (.npy) "
+                        "to extend")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=1,
+                        help="number of worker processes")
+    parser.add_argument("-c",
+                        "--chunksize",
+                        type=int,
+                        default=1 << 22,
+                        help="approximate bytes per parsed chunk")
     args = parser.parse_args()
     main(args)
 
@@ -1,11 +1,21 @@
 """Train model using IBM 2 model with nltk."""
+import hashlib
+import math
+import os
+import pickle as stdlib_pickle
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from logging import getLogger
 import dill as pickle
-from pandas import DataFrame
-from nltk.translate import AlignedSent, IBMModel2
+import numpy as np
+from methods import ibm2_array
 
 
 def bitext(source: str, target: str, sep: str = "/"):
     """Return AlignedSent."""
+    from nltk.translate import AlignedSent
     return AlignedSent(words=source.split(sep), mots=target.split(sep))
 
 
@@ -14,25 +24,246 @@ def corpus(source: iter, target: iter, sep: str = "/"):
     return list(map(lambda x: bitext(x[0], x[1], sep), zip(source, target)))
 
 
-def train(source: iter, target: iter, max_iter: int, sep="/"):
+def _plain(table):
+    """Return nested defaultdicts as plain dicts (fast to pickle)."""
+    if isinstance(table, dict):
+        return {key: _plain(value) for key, value in table.items()}
+    return table
+
+
+def _update(table, plain):
+    """Set the entries of plain into nested defaultdicts, keeping defaults."""
+    for key, value in plain.items():
+        if isinstance(value, dict):
+            _update(table[key], value)
+        else:
+            table[key] = value
+
+
+def _digest(aligned_corpus):
+    """Return sha256 of the tokens of an aligned corpus."""
+    digest = hashlib.sha256()
+    for aligned_sentence in aligned_corpus:
+        digest.update("\x1f".join(aligned_sentence.words).encode() + b"\x1e" +
+                      "\x1f".join(aligned_sentence.mots).encode() + b"\x1d")
+    return digest.hexdigest()
+
+
+def _model_classes():
+    """Return NLTK IBM 1 and IBM 2 classes summing the log-likelihood.
+
+    The E-step already sums ``t(w_j | s_i) a(i | j, l, m)`` over i for
+    every target position; ``log_likelihood`` accumulates the logs of these
+    sums, i.e. log P(words | mots) under the probabilities the iteration
+    starts from, at no extra pass over the corpus.
+    """
+    from nltk.translate import IBMModel1, IBMModel2
+
+    class LogLikelihoodIBMModel1(IBMModel1):
+
+        def train(self, parallel_corpus):
+            self.log_likelihood = 0.0
+            super().train(parallel_corpus)
+
+        def prob_all_alignments(self, src_sentence, trg_sentence):
+            alignment_prob_for_t = defaultdict(float)
+            for t in trg_sentence:
+                prob = 0.0
+                for s in src_sentence:
+                    point = self.prob_alignment_point(s, t)
+                    alignment_prob_for_t[t] += point  # same sums as NLTK
+                    prob += point
+                self.log_likelihood += math.log(
+                    max(prob / len(src_sentence), self.MIN_PROB))
+            return alignment_prob_for_t
+
+    class LogLikelihoodIBMModel2(IBMModel2):
+
+        def train(self, parallel_corpus):
+            self.log_likelihood = 0.0
+            super().train(parallel_corpus)
+
+        def prob_all_alignments(self, src_sentence, trg_sentence):
+            alignment_prob_for_t = defaultdict(float)
+            for j in range(1, len(trg_sentence)):
+                t = trg_sentence[j]
+                prob = 0.0
+                for i in range(0, len(src_sentence)):
+                    point = self.prob_alignment_point(i, j, src_sentence,
+                                                      trg_sentence)
+                    alignment_prob_for_t[t] += point  # same sums as NLTK
+                    prob += point
+                self.log_likelihood += math.log(max(prob, self.MIN_PROB))
+            return alignment_prob_for_t
+
+    return LogLikelihoodIBMModel1, LogLikelihoodIBMModel2
+
+
+def _untrained(model_class, aligned_corpus, tables=None):
+    """Return an NLTK model over aligned_corpus, uniform or with tables.
+
+    Unlike the NLTK constructors, nothing is trained and the corpus is not
+    aligned.  The translation table gets the uniform rows of IBM 1, whose
+    defaults (``1 / |trg_vocab|``) IBM 2 inherits when it starts from the
+    IBM 1 table.
+    :param tables: dict; table name -> entries (see ``_plain``) set over the
+        uniform tables
+    """
+    from nltk.translate import IBMModel1
+    model = model_class([],
+                        0,
+                        probability_tables={
+                            "translation_table": None,
+                            "alignment_table": None
+                        })
+    model.init_vocab(aligned_corpus)
+    model.reset_probabilities()
+    IBMModel1.set_uniform_probabilities(model, aligned_corpus)
+    if not isinstance(model, IBMModel1):
+        model.set_uniform_probabilities(aligned_corpus)
+    for name, plain in (tables or {}).items():
+        _update(getattr(model, name), plain)
+    return model
+
+
+def _dump(fname, obj, dump=pickle.dump):
+    """Pickle obj to a temporary file next to fname, then rename it."""
+    fd, tmp_fname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)),
+                                     prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            dump(obj, fp)
+        if os.path.isdir(fname):  # replacing an array model
+            shutil.rmtree(fname)
+        os.replace(tmp_fname, fname)
+    except BaseException:
+        os.remove(tmp_fname)
+        raise
+
+
+def log_iteration(name, phase, iteration, n_iter, log_likelihood, seconds):
+    """Log the progress of one EM iteration."""
+    getLogger(__name__).info(
+        f"[INFO] {name + ': ' if name else ''}{phase} iteration "
+        f"{iteration}/{n_iter}, log-likelihood {log_likelihood:.6e}, "
+        f"{seconds:.1f}s")
+
+
+def train(source: iter,
+          target: iter,
+          max_iter: int,
+          sep="/",
+          checkpoint=None,
+          resume=False,
+          name=None):
     """Train IBM 2 alignment model.
 
     Source and target should be iterable object of comma-delimitated strings.
+    Same schedule and result as ``nltk.translate.IBMModel2``: ``2 *
+    max_iter`` IBM Model 1 iterations, then ``max_iter`` IBM Model 2
+    iterations.  Every iteration logs the corpus log-likelihood under the
+    probabilities it starts from and its wall time.
+    :param checkpoint: str; file rewritten atomically after every iteration
+    :param resume: bool; continue from checkpoint if it exists; it must have
+        been written for the same corpus and max_iter
+    :param name: str; label of the log lines, e.g. the model file
     """
+    from nltk.translate import IBMModel2
     aligned_corpus = corpus(source, target, sep)
-    return IBMModel2(aligned_corpus, max_iter)
+    key = {"corpus": _digest(aligned_corpus), "max_iter": max_iter}
+    state = {"phase": "IBM 1", "done": 0, "tables": None, "history": []}
+    if resume and checkpoint is not None and os.path.isfile(checkpoint):
+        state = load(checkpoint)
+        if state.get("key") != key:
+            raise ValueError(f"{checkpoint} was written for another corpus "
+                             "or number of iterations")
+    state["key"] = key
+
+    ibm1_class, ibm2_class = _model_classes()
+    schedule = [("IBM 1", ibm1_class, 2 * max_iter),
+                ("IBM 2", ibm2_class, max_iter)]
+    translation_table = None
+    for phase, model_class, n_iter in schedule:
+        if phase == "IBM 2" and state["phase"] == "IBM 1":
+            state.update(phase=phase, done=0, tables=None)
+        if state["phase"] != phase:
+            continue
+        model = _untrained(model_class, aligned_corpus, state["tables"])
+        if translation_table is not None:
+            # IBM 2 starts from the IBM 1 translation table
+            model.translation_table = translation_table
+        while state["done"] < n_iter:
+            start = time.perf_counter()
+            model.train(aligned_corpus)
+            seconds = time.perf_counter() - start
+            state["done"] += 1
+            state["history"].append(
+                (phase, state["done"], model.log_likelihood, seconds))
+            log_iteration(name, phase, state["done"], n_iter,
+                          model.log_likelihood, seconds)
+            if checkpoint is not None:
+                state["tables"] = {
+                    "translation_table": _plain(model.translation_table)
+                }
+                if phase == "IBM 2":
+                    state["tables"]["alignment_table"] = _plain(
+                        model.alignment_table)
+                # Plain dicts: the C pickler is much faster than dill
+                _dump(checkpoint, state, stdlib_pickle.dump)
+        translation_table = model.translation_table
+
+    # Saved models stay plain NLTK models
+    trained = IBMModel2([],
+                        0,
+                        probability_tables={
+                            "translation_table": model.translation_table,
+                            "alignment_table": model.alignment_table
+                        })
+    trained.src_vocab = model.src_vocab
+    trained.trg_vocab = model.trg_vocab
+    return trained
+
+
+def train_warm(source: iter, target: iter, model, max_iter: int,
+               weight: float, sep="/", **options):
+    """Update a trained IBM 2 model with new bitexts.
+
+    See ``ibm2_numpy.train_warm``; the incremental EM passes run on its
+    batched engine.
+    """
+    from methods import ibm2_numpy
+    return ibm2_numpy.train_warm(source, target, model, max_iter, weight,
+                                 sep, **options)
 
 
 def save(fname, model):
-    """Output model as pickle."""
-    fp = open(fname, "wb")
-    pickle.dump(model, fp)
+    """Output model as pickle, or as arrays for ``ibm2_array.ArrayModel``.
+
+    The pickle is written to a temporary file next to ``fname`` and then
+    renamed, so an interrupted run never leaves a truncated model behind.
+    """
+    if isinstance(model, ibm2_array.ArrayModel):
+        ibm2_array.save(fname, model)
+        return
+    _dump(fname, model)
 
 
 def load(fname):
-    """Load model."""
-    fp = open(fname, "rb")
-    return pickle.load(fp)
+    """Load model; array models (directories) are memory-mapped."""
+    if os.path.isdir(fname):
+        return ibm2_array.load(fname)
+    with open(fname, "rb") as fp:
+        return pickle.load(fp)
+
+
+def to_arrays(model):
+    """Return model as a dict of arrays (see ``ibm2_array``)."""
+    return ibm2_array.from_nltk(model).arrays
+
+
+def from_arrays(arrays):
+    """Return model over arrays of ``to_arrays``, e.g. memory-mapped."""
+    return ibm2_array.ArrayModel(arrays)
 
 
 def aligned(source: list, target: list, model):
@@ -54,6 +285,57 @@ def aligned(source: list, target: list, model):
         yield (j, best_alignment_point)
 
 
+def _flat_ids(sentences, lookup, vocabulary):
+    """Return model IDs of all tokens of sentences, concatenated."""
+    if vocabulary is None:
+        return lookup([t for sentence in sentences for t in sentence])
+    if not sentences:
+        return np.empty(0, dtype=np.int64)
+    # Translate shared vocabulary IDs once, then gather
+    return lookup(vocabulary.tokens)[np.concatenate(sentences)]
+
+
+def align_corpus(sources: list, targets: list, model, vocabulary=None):
+    """Return aligned bitexts of a whole corpus, one list per bitext.
+
+    Same result as ``aligned`` on every pair, including its tie-breaking
+    (NULL wins only when strictly better, later positions win ties), but
+    decoded per (l, m) length pair: the alignment tensor is sliced once
+    per group and the argmax runs over stacked probability matrices.
+    :param vocabulary: vocab.Vocabulary; if given, sentences are arrays of
+        its token IDs instead of token lists
+    """
+    model = ibm2_array.from_nltk(model)
+    src_lens = np.array([len(source) for source in sources], dtype=np.int64)
+    tar_lens = np.array([len(target) for target in targets], dtype=np.int64)
+    src_flat = _flat_ids(sources, model.trg_ids, vocabulary)
+    tar_flat = _flat_ids(targets, model.src_ids, vocabulary)
+    src_starts = np.cumsum(src_lens) - src_lens
+    tar_starts = np.cumsum(tar_lens) - tar_lens
+    null_id = model.src_ids([None])
+
+    groups = defaultdict(list)
+    for k, (l, m) in enumerate(zip(tar_lens.tolist(), src_lens.tolist())):
+        groups[(l, m)].append(k)
+
+    alignments = [None] * len(sources)
+    for (l, m), members in groups.items():
+        src = src_flat[src_starts[members][:, None] + np.arange(m)]
+        tar = tar_flat[tar_starts[members][:, None] + np.arange(l)]
+        tar = np.concatenate([np.broadcast_to(null_id, (len(members), 1)), tar],
+                             axis=1)
+        prob = (model.translation_probs(src[:, :, None], tar[:, None, :]) *
+                model.alignment_probs(l, m).T)  # (B, m, l + 1)
+        null_prob = np.maximum(prob[:, :, 0], model.MIN_PROB)
+        reverse = prob[:, :, :0:-1]  # positions l - 1, ..., 0
+        best = (l - 1 - reverse.argmax(axis=2)).tolist()
+        keep = (reverse.max(axis=2) >= null_prob).tolist()
+        for k, best_k, keep_k in zip(members, best, keep):
+            alignments[k] = [(j, i if ok else None)
+                             for j, (i, ok) in enumerate(zip(best_k, keep_k))]
+    return alignments
+
+
 # def alignment(aligned_sent: AlignedSent):
 # """Return alignments List[Tuple(int,int)]."""
 # return sorted(list(aligned_sent.alignment))
@@ -66,6 +348,7 @@ def aligned(source: list, target: list, model):
 
 def alignment_table(source, target, alignment, model):
     """Return alignment table with details."""
+    from pandas import DataFrame
     len_src = len(source)
     len_tar = len(target)
 
@@ -0,0 +1,269 @@
+"""IBM 2 model stored as flat arrays, loaded through numpy.memmap.
+
+The vocabularies are sorted string arrays searched with ``searchsorted``,
+the translation table is a CSR matrix (one row per target word of the
+table, columns over source words with NULL as the reserved ``NULL`` word) and
+the alignment table is a dense tensor indexed by (i, j, l, m).  Nothing is
+turned into Python containers when a model is loaded; the
+``translation_table`` and ``alignment_table`` adapters answer the same
+subscripts as the nested dictionaries of ``nltk.translate.IBMModel2``.
+
+Models keep their own string vocabularies instead of IDs of the shared
+``vocab.Vocabulary``: that vocabulary is extended by later stages
+(make_metacode2lemma), so a model keyed by its IDs would only be valid
+with the vocab.npy it was trained against, and NLTK models are keyed by
+strings anyway.  Batch paths still run on integers: ``ibm2_numpy``
+interns tokens before EM and ``ibm2.align_corpus`` maps shared IDs to
+model IDs once per call.
+"""
+from collections import defaultdict
+import numpy as np
+from utils import write_arrays, load_arrays
+
+MIN_PROB = 1.0e-12  # nltk.translate.IBMModel.MIN_PROB, without importing nltk
+# NULL (None) in the source vocabulary.  Not a possible metacode, unlike
+# the empty string, which is a token of empty metacode cells; models saved
+# with LEGACY_NULL are still read with it.
+NULL = "\x00NULL"
+LEGACY_NULL = ""
+
+
+def _lookup_all(vocab, tokens):
+    """Return indices of tokens in sorted vocab, -1 for unknown tokens."""
+    tokens = np.asarray(tokens, dtype=str)
+    if not len(vocab):
+        return np.full(tokens.shape, -1, dtype=np.int64)
+    idx = np.minimum(np.searchsorted(vocab, tokens), len(vocab) - 1)
+    return np.where(vocab[idx] == tokens, idx, -1)
+
+
+def _lookup(vocab, token):
+    """Return index of token in sorted vocab, or -1."""
+    idx = int(np.searchsorted(vocab, token))
+    if idx < len(vocab) and vocab[idx] == token:
+        return idx
+    return -1
+
+
+class _ConstantRow:
+    """Translation row of a word unknown to the model."""
+
+    def __getitem__(self, src_token):
+        return MIN_PROB
+
+
+class _TranslationRow:
+    """Probabilities P(t | s) of one target word t over source words s."""
+
+    def __init__(self, model, trg_id):
+        arrays = model.arrays
+        start, end = arrays["indptr"][trg_id:trg_id + 2]
+        self.src_vocab = arrays["src_vocab"]
+        self.null = model.null
+        self.indices = arrays["indices"][start:end]
+        self.data = arrays["data"][start:end]
+        self.default = model.initial_prob
+
+    def __getitem__(self, src_token):
+        src_id = _lookup(self.src_vocab,
+                         self.null if src_token is None else src_token)
+        if src_id < 0:
+            return self.default
+        pos = int(np.searchsorted(self.indices, src_id))
+        if pos < len(self.indices) and self.indices[pos] == src_id:
+            return self.data.item(pos)
+        return self.default
+
+
+class _TranslationTable:
+    """``translation_table[t][s]`` over the CSR arrays."""
+
+    def __init__(self, model):
+        self.model = model
+        self.rows = {}
+
+    def __getitem__(self, trg_token):
+        if trg_token not in self.rows:
+            trg_id = _lookup(self.model.arrays["trg_vocab"], trg_token)
+            self.rows[trg_token] = (_TranslationRow(self.model, trg_id)
+                                    if trg_id >= 0 else _ConstantRow())
+        return self.rows[trg_token]
+
+
+class _AlignmentTable:
+    """``alignment_table[i][j][l][m]`` over the dense tensor."""
+
+    def __init__(self, tensor, index=()):
+        self.tensor = tensor
+        self.index = index
+
+    def __getitem__(self, key):
+        index = self.index + (key, )
+        if len(index) < 4:
+            return _AlignmentTable(self.tensor, index)
+        try:
+            if min(index) >= 0:
+                return self.tensor.item(index)
+        except (TypeError, IndexError):  # None or out-of-range subscripts
+            pass
+        return MIN_PROB
+
+
+class ArrayModel:
+    """IBM 2 model backed by (memory-mapped) arrays."""
+
+    MIN_PROB = MIN_PROB
+
+    def __init__(self, arrays, path=None):
+        # Plain ndarray views of the maps skip memmap's per-access overhead
+        self.arrays = {
+            name: np.asarray(array)
+            for name, array in arrays.items()
+        }
+        self.path = path
+        self.null = (NULL if _lookup(self.arrays["src_vocab"], NULL) >= 0 else
+                     LEGACY_NULL)
+        self.initial_prob = float(arrays["defaults"][0])
+        self._keys = None  # CSR entries as trg_id * |src_vocab| + src_id
+        self.translation_table = _TranslationTable(self)
+        self.alignment_table = _AlignmentTable(arrays["alignment"])
+
+    def trg_ids(self, tokens):
+        """Return IDs of target words (-1 for unknown words)."""
+        return _lookup_all(self.arrays["trg_vocab"], tokens)
+
+    def src_ids(self, tokens):
+        """Return IDs of source words (-1 for unknown, NULL for None)."""
+        return _lookup_all(self.arrays["src_vocab"],
+                           [self.null if s is None else s for s in tokens])
+
+    def translation_probs(self, trg_ids, src_ids, missing=None):
+        """Return ``translation_table[t][s]`` for broadcast ID arrays.
+
+        :param missing: float; probability of pairs not in the table
+            instead of the model's defaults
+        """
+        if self._keys is None:
+            n_rows = np.diff(self.arrays["indptr"])
+            rows = np.repeat(np.arange(len(n_rows)), n_rows)
+            self._keys = (rows * len(self.arrays["src_vocab"]) +
+                          self.arrays["indices"])
+        trg_ids, src_ids = np.broadcast_arrays(trg_ids, src_ids)
+        query = trg_ids * len(self.arrays["src_vocab"]) + src_ids
+        if missing is None:
+            probs = np.where(trg_ids >= 0, self.initial_prob, MIN_PROB)
+        else:
+            probs = np.full(trg_ids.shape, float(missing))
+        if not len(self._keys):
+            return probs
+        pos = np.minimum(np.searchsorted(self._keys, query),
+                         len(self._keys) - 1)
+        found = (self._keys[pos] == query) & (trg_ids >= 0) & (src_ids >= 0)
+        probs[found] = self.arrays["data"][pos[found]]
+        return probs
+
+    def alignment_probs(self, l, m):
+        """Return ``alignment_table[i][j][l][m]`` as (l + 1, m) array.
+
+        Rows are i = 0 (NULL), ..., l and columns j = 1, ..., m.
+        """
+        tensor = self.arrays["alignment"]
+        if l < tensor.shape[2] and m < tensor.shape[3]:
+            return tensor[:l + 1, 1:m + 1, l, m]
+        return np.full((l + 1, m), MIN_PROB)
+
+    def __reduce__(self):
+        # Saved models are pickled by reference so that every unpickled
+        # copy maps the same files.
+        if self.path is not None:
+            return (load, (self.path, ))
+        return (ArrayModel, ({k: np.asarray(v)
+                              for k, v in self.arrays.items()}, ))
+
+
+def build(trg_vocab, src_vocab, pair_trg, pair_src, prob, alignment,
+          initial_prob):
+    """Build ArrayModel from co-occurrence pairs.
+
+    :param trg_vocab: List[str]; target words by ID
+    :param src_vocab: List[str]; source words by ID, None for NULL
+    :param pair_trg, pair_src, prob: np.ndarray; translation entries
+    :param alignment: dict; (l, m) -> (m, l + 1) array of a(i | j, l, m)
+    :param initial_prob: float; P(t | s) of known t with unseen s
+    """
+    trg_sorted = np.array(sorted(trg_vocab), dtype=str)
+    src_sorted = np.array(sorted(NULL if s is None else s for s in src_vocab),
+                          dtype=str)
+    trg_new = np.searchsorted(trg_sorted, np.array(trg_vocab, dtype=str))
+    src_new = np.searchsorted(
+        src_sorted,
+        np.array([NULL if s is None else s for s in src_vocab], dtype=str))
+    rows = trg_new[np.asarray(pair_trg, dtype=np.int64)]
+    cols = src_new[np.asarray(pair_src, dtype=np.int64)]
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(len(trg_sorted) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(trg_sorted)), out=indptr[1:])
+
+    max_l = max((l for l, _ in alignment), default=0)
+    max_m = max((m for _, m in alignment), default=0)
+    tensor = np.full((max_l + 1, max_m + 1, max_l + 1, max_m + 1), MIN_PROB)
+    for (l, m), table in alignment.items():
+        # table[j - 1, i] -> tensor[i, j, l, m]
+        tensor[:l + 1, 1:m + 1, l, m] = np.asarray(table).T
+
+    return ArrayModel({
+        "trg_vocab": trg_sorted,
+        "src_vocab": src_sorted,
+        "indptr": indptr,
+        "indices": cols[order].astype(np.int32),
+        "data": np.asarray(prob, dtype=np.float64)[order],
+        "alignment": tensor,
+        "defaults": np.array([initial_prob, MIN_PROB]),
+    })
+
+
+def from_nltk(model):
+    """Convert ``nltk.translate.IBMModel2`` to ArrayModel."""
+    if isinstance(model, ArrayModel):
+        return model
+    trg_vocab = sorted(model.trg_vocab)
+    src_index = {None: 0}
+    pair_trg, pair_src, prob = [], [], []
+    for trg_id, t in enumerate(trg_vocab):
+        for s, p in model.translation_table[t].items():
+            pair_trg.append(trg_id)
+            pair_src.append(src_index.setdefault(s, len(src_index)))
+            prob.append(p)
+    initial_prob = (model.translation_table[trg_vocab[0]].default_factory()
+                    if trg_vocab else MIN_PROB)
+
+    alignment = defaultdict(dict)
+    for i, j_s in model.alignment_table.items():
+        for j, l_s in j_s.items():
+            for l, m_s in l_s.items():
+                for m, p in m_s.items():
+                    if p != MIN_PROB:  # MIN_PROB is the default anyway
+                        alignment[(l, m)][(i, j)] = p
+    tables = {}
+    for (l, m), cells in alignment.items():
+        if not all(isinstance(k, int) for k in (l, m)):
+            continue
+        table = np.full((m, l + 1), MIN_PROB)
+        for (i, j), p in cells.items():
+            if isinstance(i, int) and isinstance(j, int) and (
+                    0 <= i <= l and 1 <= j <= m):
+                table[j - 1, i] = p
+        tables[(l, m)] = table
+
+    return build(trg_vocab, sorted(src_index, key=src_index.get), pair_trg,
+                 pair_src, prob, tables, initial_prob)
+
+
+def save(dirname, model):
+    """Output model as a directory of .npy files."""
+    write_arrays(dirname, from_nltk(model).arrays)
+
+
+def load(dirname):
+    """Load model through numpy.memmap."""
+    return ArrayModel(load_arrays(dirname), path=dirname)
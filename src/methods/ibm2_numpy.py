@@ -0,0 +1,568 @@
+"""Train IBM 2 model with batched NumPy EM.
+
+Follows the naming of ``nltk.translate.AlignedSent``: ``words`` (the source
+argument of ``train``) are generated from ``mots`` (the target argument).
+Tokens are interned to integer IDs and bitexts are bucketed by their
+(l, m) length pair, so every E-step and M-step runs as array operations
+over whole buckets instead of nested dictionary loops.
+"""
+import hashlib
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing.sharedctypes import RawArray
+from typing import List
+import numpy as np
+from nltk.translate import IBMModel, IBMModel2
+from methods import ibm2_array
+from methods.ibm2 import log_iteration
+from utils import write_arrays, load_arrays
+
+MIN_PROB = IBMModel.MIN_PROB
+
+
+@dataclass
+class Bucket:
+    """Bitexts sharing the same (l, m) length pair."""
+
+    l: int
+    m: int
+    pairs: np.ndarray = field(repr=False)  # (B, m, l + 1) pair IDs
+    same: np.ndarray = field(default=None, repr=False)  # (B, m, m) or None
+
+
+@dataclass
+class EMCorpus:
+    """Interned and length-bucketed corpus."""
+
+    trg_vocab: List[str] = field(repr=False)
+    src_vocab: List[str] = field(repr=False)  # src_vocab[0] is NULL (None)
+    pair_trg: np.ndarray = field(repr=False)
+    pair_src: np.ndarray = field(repr=False)
+    buckets: List[Bucket] = field(repr=False)
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_trg)
+
+
+def _intern(sentences, vocab):
+    """Replace tokens by integer IDs, extending vocab in place."""
+    for sentence in sentences:
+        yield [vocab.setdefault(token, len(vocab)) for token in sentence]
+
+
+def prepare(source: iter, target: iter, sep: str = "/"):
+    """Intern tokens and bucket the corpus by (l, m) length pair."""
+    trg_index = {}
+    src_index = {None: 0}
+    words = list(_intern((s.split(sep) for s in source), trg_index))
+    mots = list(_intern((t.split(sep) for t in target), src_index))
+
+    by_length = defaultdict(list)
+    for trg_ids, src_ids in zip(words, mots):
+        by_length[(len(src_ids), len(trg_ids))].append((trg_ids, src_ids))
+
+    # Pair key: trg_id * |src_vocab| + src_id, unique over co-occurrences
+    n_src = len(src_index)
+    keys = []
+    shapes = []
+    for (l, m), sentences in sorted(by_length.items()):
+        trg = np.array([s[0] for s in sentences], dtype=np.int64)
+        src = np.array([[0] + s[1] for s in sentences], dtype=np.int64)
+        keys.append((trg[:, :, None] * n_src + src[:, None, :]).ravel())
+        shapes.append((l, m, trg))
+    uniq, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    inverse = inverse.astype(np.int32)
+
+    buckets = []
+    offset = 0
+    for l, m, trg in shapes:
+        size = len(trg) * m * (l + 1)
+        pairs = inverse[offset:offset + size].reshape(len(trg), m, l + 1)
+        offset += size
+        same = trg[:, :, None] == trg[:, None, :]
+        if same.sum() == len(trg) * m:  # no repeated word in the bucket
+            same = None
+        else:
+            same = same.astype(np.float64)
+        buckets.append(Bucket(l, m, pairs, same))
+
+    return EMCorpus(trg_vocab=sorted(trg_index, key=trg_index.get),
+                    src_vocab=sorted(src_index, key=src_index.get),
+                    pair_trg=(uniq // n_src).astype(np.int32),
+                    pair_src=(uniq % n_src).astype(np.int32),
+                    buckets=buckets)
+
+
+def uniform_alignment(buckets):
+    """Return initial alignment tables, one (m, l + 1) array per bucket."""
+    return [
+        np.full((bucket.m, bucket.l + 1), 1 / (bucket.l + 1))
+        for bucket in buckets
+    ]
+
+
+def e_step(buckets, translation, alignment=None):
+    """Collect expected counts over buckets.
+
+    As in NLTK, the normalizer of a word repeated within one sentence is
+    summed over all of its positions.
+    Without ``alignment`` the counts are those of IBM Model 1.
+
+    :return lexical: np.ndarray; normalized counts, flattened bucket by bucket
+    :return aligned: List[np.ndarray]; (m, l + 1) counts per bucket
+    :return log_likelihood: float; log P(words | mots) of the buckets
+    """
+    lexical = []
+    aligned = []
+    log_likelihood = 0.0
+    for k, bucket in enumerate(buckets):
+        prob = translation[bucket.pairs]
+        if alignment is not None:
+            prob *= alignment[k]
+        total = prob.sum(axis=2)
+        log_likelihood += np.log(np.maximum(total, MIN_PROB)).sum()
+        if alignment is None:  # uniform a(i | j, l, m) = 1 / (l + 1)
+            log_likelihood -= total.size * np.log(bucket.l + 1)
+        if bucket.same is not None:
+            total = np.einsum("bjk,bk->bj", bucket.same, total)
+        prob /= total[:, :, None]
+        lexical.append(prob.ravel())
+        aligned.append(prob.sum(axis=0))
+    return np.concatenate(lexical), aligned, float(log_likelihood)
+
+
+def m_step(corpus, counts, aligned=None):
+    """Re-estimate translation (and alignment) probabilities from counts.
+
+    :param counts: np.ndarray; expected count of every co-occurring pair
+    :param aligned: List[np.ndarray]; (m, l + 1) counts per bucket
+    """
+    any_t = np.bincount(corpus.pair_src,
+                        weights=counts,
+                        minlength=len(corpus.src_vocab))
+    translation = np.maximum(counts / any_t[corpus.pair_src], MIN_PROB)
+    if aligned is None:
+        return translation, None
+    alignment = [
+        np.maximum(count / count.sum(axis=1, keepdims=True), MIN_PROB)
+        for count in aligned
+    ]
+    return translation, alignment
+
+
+def _split(buckets, n_shards):
+    """Split bucket indices into contiguous shards of similar size."""
+    sizes = np.cumsum([bucket.pairs.size for bucket in buckets])
+    bounds = np.searchsorted(sizes,
+                             np.arange(1, n_shards) * sizes[-1] / n_shards,
+                             side="right")
+    return [shard for shard in np.split(np.arange(len(buckets)), bounds)
+            if len(shard)]
+
+
+def _shard_counts(state, k, with_alignment):
+    """Collect expected counts of the k-th shard."""
+    shard = state["shards"][k]
+    buckets = [state["buckets"][b] for b in shard]
+    translation = np.frombuffer(state["translation"])
+    alignment = None
+    if with_alignment:
+        alignment_flat = np.frombuffer(state["alignment"])
+        alignment = [
+            alignment_flat[state["offsets"][b]:state["offsets"][b + 1]]
+            .reshape(state["buckets"][b].m, state["buckets"][b].l + 1)
+            for b in shard
+        ]
+    if k not in state["pair_flat"]:
+        state["pair_flat"][k] = np.concatenate(
+            [bucket.pairs.ravel() for bucket in buckets])
+    lexical, aligned, log_likelihood = e_step(buckets, translation, alignment)
+    counts = np.frombuffer(state["counts"]).reshape(-1, len(translation))
+    counts[k] = np.bincount(state["pair_flat"][k],
+                            weights=lexical,
+                            minlength=len(translation))
+    return aligned, log_likelihood
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(state):
+    _WORKER_STATE.update(state, pair_flat={})
+
+
+def _worker_shard_counts(k, with_alignment):
+    return _shard_counts(_WORKER_STATE, k, with_alignment)
+
+
+class ShardedEStep:
+    """E-step over corpus shards collected by worker processes.
+
+    Buckets are split into ``workers`` contiguous shards of similar size,
+    current probabilities are published through shared memory, and the
+    per-shard counts are reduced in shard order, so results are
+    deterministic for a fixed number of shards.  With one worker the
+    E-step runs in the calling process.  ``log_likelihood`` holds the
+    corpus log-likelihood of the probabilities of the last call.
+    """
+
+    def __init__(self, corpus, workers=1):
+        buckets = corpus.buckets
+        shards = _split(buckets, workers)
+        offsets = np.cumsum([0] + [b.m * (b.l + 1) for b in buckets])
+        self.state = {
+            "buckets": buckets,
+            "shards": shards,
+            "offsets": offsets,
+            "translation": RawArray("d", int(corpus.n_pairs)),
+            "alignment": RawArray("d", int(offsets[-1])),
+            "counts": RawArray("d", len(shards) * int(corpus.n_pairs)),
+            "pair_flat": {},
+        }
+        self.pool = None
+        self.log_likelihood = None
+        if len(self.state["shards"]) > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=len(self.state["shards"]),
+                initializer=_init_worker,
+                initargs=(self.state, ))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down worker processes."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __call__(self, translation, alignment=None):
+        """Return expected pair counts and per-bucket alignment counts."""
+        np.frombuffer(self.state["translation"])[:] = translation
+        if alignment is not None:
+            np.frombuffer(self.state["alignment"])[:] = np.concatenate(
+                [table.ravel() for table in alignment])
+        tasks = range(len(self.state["shards"]))
+        with_alignment = [alignment is not None] * len(tasks)
+        if self.pool is None:
+            results = map(_shard_counts, [self.state] * len(tasks), tasks,
+                          with_alignment)
+        else:
+            results = self.pool.map(_worker_shard_counts, tasks,
+                                    with_alignment)
+        results = list(results)
+        aligned = [table for shard, _ in results for table in shard]
+        self.log_likelihood = sum(ll for _, ll in results)
+        counts = np.frombuffer(self.state["counts"]).reshape(
+            len(tasks), -1).sum(axis=0)
+        return counts, (aligned if alignment is not None else None)
+
+
+def to_nltk(corpus, translation, alignment):
+    """Wrap probability arrays as ``nltk.translate.IBMModel2``."""
+    initial_prob = 1 / len(corpus.trg_vocab)
+    translation_table = defaultdict(lambda: defaultdict(lambda: MIN_PROB))
+    for t in corpus.trg_vocab:
+        translation_table[t] = defaultdict(lambda: initial_prob)
+    for t, s, prob in zip(corpus.pair_trg.tolist(), corpus.pair_src.tolist(),
+                          translation.tolist()):
+        translation_table[corpus.trg_vocab[t]][corpus.src_vocab[s]] = prob
+
+    alignment_table = defaultdict(lambda: defaultdict(lambda: defaultdict(
+        lambda: defaultdict(lambda: MIN_PROB))))
+    for bucket, table in zip(corpus.buckets, alignment):
+        l, m = bucket.l, bucket.m
+        for j, row in enumerate(table.tolist(), 1):
+            for i, prob in enumerate(row):
+                alignment_table[i][j][l][m] = prob
+
+    model = IBMModel2([],
+                      0,
+                      probability_tables={
+                          "translation_table": translation_table,
+                          "alignment_table": alignment_table
+                      })
+    model.trg_vocab = set(corpus.trg_vocab)
+    model.src_vocab = set(corpus.src_vocab)
+    return model
+
+
+def to_array(corpus, translation, alignment):
+    """Wrap probability arrays as ``ibm2_array.ArrayModel``."""
+    return ibm2_array.build(
+        corpus.trg_vocab, corpus.src_vocab, corpus.pair_trg, corpus.pair_src,
+        translation,
+        {(b.l, b.m): table
+         for b, table in zip(corpus.buckets, alignment)},
+        1 / len(corpus.trg_vocab))
+
+
+def _digest(corpus):
+    """Return sha256 of a prepared corpus (vocabularies and buckets)."""
+    digest = hashlib.sha256()
+    for vocab in (corpus.trg_vocab, corpus.src_vocab[1:]):
+        digest.update("\x1f".join(vocab).encode() + b"\x1d")
+    for bucket in corpus.buckets:
+        digest.update(np.array([bucket.l, bucket.m], dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(bucket.pairs).tobytes())
+    return digest.hexdigest()
+
+
+def _load_checkpoint(checkpoint, key):
+    """Return the EM state saved by ``fit`` (see ``_save_checkpoint``).
+
+    :param key: str; corpus digest and max_iter the state must be for
+    """
+    arrays = load_arrays(checkpoint)
+    if "key" not in arrays or str(arrays["key"][()]) != key:
+        raise ValueError(f"{checkpoint} was written for another corpus or "
+                         "number of iterations")
+    return (np.array(arrays["translation"]), np.array(arrays["alignment"]),
+            arrays["done"].tolist(), arrays["history"].tolist())
+
+
+def _save_checkpoint(checkpoint, key, translation, alignment, done,
+                     history):
+    """Output the EM state atomically as a directory of arrays.
+
+    :param done: List[int]; IBM 1 and IBM 2 iterations done
+    :param history: List[List[float]]; phase (1 or 2), iteration,
+        log-likelihood and seconds of every iteration
+    """
+    write_arrays(
+        checkpoint, {
+            "translation": translation,
+            "alignment": np.concatenate([table.ravel() for table in alignment]),
+            "done": np.array(done, dtype=np.int64),
+            "history": np.array(history, dtype=np.float64).reshape(-1, 4),
+            "key": np.array(key),
+        })
+
+
+def fit(corpus,
+        max_iter,
+        workers=1,
+        checkpoint=None,
+        resume=False,
+        name=None):
+    """Run EM on a prepared corpus; return translation and alignment.
+
+    Every iteration logs the corpus log-likelihood under the probabilities
+    it starts from and its wall time.
+    :param checkpoint: str; directory rewritten atomically after every
+        iteration
+    :param resume: bool; continue from checkpoint if it exists; it must have
+        been written for the same corpus and max_iter
+    :param name: str; label of the log lines, e.g. the model file
+    """
+    translation = np.full(corpus.n_pairs, 1 / len(corpus.trg_vocab))
+    alignment = uniform_alignment(corpus.buckets)
+    done = [0, 0]
+    history = []
+    key = None
+    if checkpoint is not None:
+        key = f"{_digest(corpus)}:{max_iter}"
+    if resume and checkpoint is not None and os.path.isdir(checkpoint):
+        translation, flat, done, history = _load_checkpoint(checkpoint, key)
+        offsets = np.cumsum([0] + [b.m * (b.l + 1) for b in corpus.buckets])
+        alignment = [
+            flat[start:end].reshape(b.m, b.l + 1)
+            for b, start, end in zip(corpus.buckets, offsets[:-1],
+                                     offsets[1:])
+        ]
+    with ShardedEStep(corpus, workers) as expected_counts:
+        for phase, n_iter in enumerate((2 * max_iter, max_iter)):
+            if phase == 0 and done[1] > 0:
+                continue  # IBM 2 already started
+            while done[phase] < n_iter:
+                start = time.perf_counter()
+                if phase == 0:
+                    translation, _ = m_step(corpus,
+                                            *expected_counts(translation))
+                else:
+                    translation, alignment = m_step(
+                        corpus, *expected_counts(translation, alignment))
+                seconds = time.perf_counter() - start
+                done[phase] += 1
+                history.append([
+                    phase + 1, done[phase], expected_counts.log_likelihood,
+                    seconds
+                ])
+                log_iteration(name, f"IBM {phase + 1}", done[phase],
+                              n_iter, expected_counts.log_likelihood, seconds)
+                if checkpoint is not None:
+                    _save_checkpoint(checkpoint, key, translation, alignment,
+                                     done, history)
+    return translation, alignment
+
+
+def warm_start(corpus, model):
+    """Return the probabilities of model over corpus.
+
+    :param model: IBMModel2 or ibm2_array.ArrayModel
+    :return translation: np.ndarray; model probability of every pair, 0 for
+        pairs the model has no probability of (e.g. new words)
+    :return alignment: List[np.ndarray]; model table of every bucket, None
+        for length pairs new to the model
+    :return known: np.ndarray; whether each source word (ID of
+        ``corpus.src_vocab``) is known to the model
+    """
+    model = ibm2_array.from_nltk(model)
+    trg_ids = model.trg_ids(corpus.trg_vocab)[corpus.pair_trg]
+    src_ids = model.src_ids(corpus.src_vocab)
+    translation = model.translation_probs(trg_ids,
+                                          src_ids[corpus.pair_src],
+                                          missing=0.0)
+    alignment = []
+    for bucket in corpus.buckets:
+        table = np.array(model.alignment_probs(bucket.l, bucket.m).T)
+        alignment.append(None if (table <= MIN_PROB).all() else table)
+    return translation, alignment, src_ids >= 0
+
+
+def fit_warm(corpus, model, max_iter, weight, workers=1):
+    """Run incremental EM (IBM Model 2) on corpus from a trained model.
+
+    The expected counts of the data the model was trained on are frozen
+    at the model's probabilities: every pass re-estimates the corpus and
+    interpolates ``(1 - weight) * model + weight * estimate``.  Source
+    words and length pairs new to the model take the estimate alone, so
+    every distribution stays normalized.  Pairs new to the model start
+    uniform as in IBM Model 1, normalized per source word, so that no
+    pass (``max_iter=0``) returns the model updated with that estimate.
+    :param weight: float; share of the corpus in the data of the updated
+        model, e.g. new bitexts / all bitexts
+    :return: translation and alignment of corpus
+    """
+    prior, prior_alignment, known = warm_start(corpus, model)
+    eta = np.where(known, weight, 1.0)[corpus.pair_src]
+    start = np.where(prior > 0, prior, 1 / len(corpus.trg_vocab))
+    start /= np.bincount(corpus.pair_src, start)[corpus.pair_src]
+    translation = (1 - eta) * prior + eta * start
+    uniform = uniform_alignment(corpus.buckets)
+    alignment = [
+        table if table is not None else init
+        for table, init in zip(prior_alignment, uniform)
+    ]
+    with ShardedEStep(corpus, workers) as expected_counts:
+        for _ in range(max_iter):
+            estimate, estimated_alignment = m_step(
+                corpus, *expected_counts(translation, alignment))
+            translation = (1 - eta) * prior + eta * estimate
+            alignment = [
+                estimated if table is None else (1 - weight) * table +
+                weight * estimated
+                for table, estimated in zip(prior_alignment,
+                                            estimated_alignment)
+            ]
+    return translation, alignment
+
+
+def merge(corpus, translation, alignment, weight, model):
+    """Return model updated with the probabilities of corpus.
+
+    Pairs and length pairs of the corpus replace the model's, the model's
+    other pairs of source words in the corpus are scaled by
+    ``1 - weight`` (see ``fit_warm``) and everything else is kept,
+    vocabularies being the union of both.
+    :return: (EMCorpus, translation, alignment) as taken by ``to_nltk``
+        and ``to_array``
+    """
+    model = ibm2_array.from_nltk(model)
+    arrays = model.arrays
+    trg_vocab = arrays["trg_vocab"].tolist()
+    src_vocab = [
+        None if s == model.null else s
+        for s in arrays["src_vocab"].tolist()
+    ]
+    trg_index = {t: i for i, t in enumerate(trg_vocab)}
+    src_index = {s: i for i, s in enumerate(src_vocab)}
+    trg_map = np.array(
+        [trg_index.setdefault(t, len(trg_index)) for t in corpus.trg_vocab])
+    src_map = np.array(
+        [src_index.setdefault(s, len(src_index)) for s in corpus.src_vocab])
+    n_src = len(src_index)
+
+    new_trg = trg_map[corpus.pair_trg].astype(np.int64)
+    new_src = src_map[corpus.pair_src].astype(np.int64)
+    old_trg = np.repeat(np.arange(len(trg_vocab)), np.diff(arrays["indptr"]))
+    old_src = arrays["indices"].astype(np.int64)
+    old_only = ~np.isin(old_trg * n_src + old_src, new_trg * n_src + new_src)
+    in_corpus = np.zeros(n_src, dtype=bool)
+    in_corpus[src_map] = True
+    old_prob = np.where(in_corpus[old_src], arrays["data"] * (1 - weight),
+                        arrays["data"])
+
+    tensor = arrays["alignment"]
+    tables = {}
+    for l in range(tensor.shape[2]):
+        for m in range(tensor.shape[3]):
+            table = tensor[:l + 1, 1:m + 1, l, m].T
+            if (table > MIN_PROB).any():
+                tables[(l, m)] = np.array(table)
+    for bucket, table in zip(corpus.buckets, alignment):
+        tables[(bucket.l, bucket.m)] = table
+
+    merged = EMCorpus(
+        trg_vocab=sorted(trg_index, key=trg_index.get),
+        src_vocab=sorted(src_index, key=src_index.get),
+        pair_trg=np.concatenate([old_trg[old_only], new_trg]),
+        pair_src=np.concatenate([old_src[old_only], new_src]),
+        buckets=[Bucket(l, m, None) for l, m in tables])
+    return (merged, np.concatenate([old_prob[old_only], translation]),
+            list(tables.values()))
+
+
+def train(source: iter,
+          target: iter,
+          max_iter: int,
+          sep="/",
+          workers=1,
+          model_format="nltk",
+          checkpoint=None,
+          resume=False,
+          name=None):
+    """Train IBM 2 alignment model.
+
+    Same schedule as ``nltk.translate.IBMModel2``: ``2 * max_iter`` IBM
+    Model 1 iterations initialize the translation table, followed by
+    ``max_iter`` IBM Model 2 iterations from uniform alignment.
+    :param workers: int; number of corpus shards for the E-step
+    :param model_format: str; "nltk" (IBMModel2) or "array" (ArrayModel)
+    :param checkpoint: str; see ``fit``
+    :param resume: bool; continue from checkpoint if it exists
+    :param name: str; see ``fit``
+    """
+    corpus = prepare(source, target, sep)
+    wrap = to_array if model_format == "array" else to_nltk
+    return wrap(corpus,
+                *fit(corpus, max_iter, workers, checkpoint, resume, name))
+
+
+def train_warm(source: iter,
+               target: iter,
+               model,
+               max_iter: int,
+               weight: float,
+               sep="/",
+               workers=1,
+               model_format="nltk"):
+    """Update a trained IBM 2 model with new bitexts.
+
+    Runs ``max_iter`` incremental IBM Model 2 passes (see ``fit_warm``)
+    over the new bitexts, which may include a replayed sample of the old
+    ones, and merges the result back into the model.
+    :param weight: float; share of the bitexts in the data of the updated
+        model
+    """
+    corpus = prepare(source, target, sep)
+    wrap = to_array if model_format == "array" else to_nltk
+    return wrap(*merge(corpus, *fit_warm(corpus, model, max_iter, weight,
+                                         workers), weight, model))
@@ -0,0 +1,336 @@
+"""Incremental build of the cache and model files of the Makefile stages.
+
+Every stage gets a key: a content hash of its script and the local modules
+it imports, its arguments, its input files (data, hyperparameters) and the
+keys of the stages it depends on.  Keys of the last successful runs are
+recorded in ../cache/pipeline.json; a stage is skipped while its key is
+unchanged and its outputs exist, so editing one input reruns only the
+stages downstream of it.  Stages whose dependencies are done run in
+parallel.
+"""
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logging import basicConfig, getLogger, DEBUG
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = "../cache/pipeline.json"
+TRANSLATORS = [
+    "kaneko", "katagiri", "kojimaarai", "komachiya", "kubota", "kyusojin",
+    "matsuda", "okumura", "ozawa", "takeoka"
+]
+
+# Outputs of a dependency are not hashed: its key stands for them, which
+# also keeps ../cache/vocab.npy (extended by several stages) out of keys.
+STAGES = {
+    "build_bitext": {
+        "script": "make_bitext.py",
+        "args": [
+            "-s", "../data/hachidaishu/hachidai.db", "-t",
+            "../data/translations/all_translations.txt", "-o",
+            "../cache/bitexts.csv", "--store_path", "../cache/bitexts", "-v",
+            "../cache/vocab.npy", "-j", "2"
+        ],
+        "inputs": [
+            "../data/hachidaishu/hachidai.db",
+            "../data/translations/all_translations.txt"
+        ],
+        "outputs":
+        ["../cache/bitexts.csv", "../cache/bitexts", "../cache/vocab.npy"],
+        "deps": [],
+    },
+    "build_metacode2lemma_dict": {
+        "script": "make_metacode2lemma.py",
+        "args": [
+            "-s", "../data/hachidaishu/hachidai.db", "-t",
+            "../data/translations/all_translations.txt", "--source_output",
+            "../cache/metacode2lemma_src.idx", "--target_output",
+            "../cache/metacode2lemma_tar.idx", "-v", "../cache/vocab.npy",
+            "-j", "2"
+        ],
+        "inputs": [
+            "../data/hachidaishu/hachidai.db",
+            "../data/translations/all_translations.txt"
+        ],
+        "outputs": [
+            "../cache/metacode2lemma_src.idx", "../cache/metacode2lemma_tar.idx"
+        ],
+        # Extends the vocabulary after the bitexts' metacodes
+        "deps": ["build_bitext"],
+    },
+    "train_save_ibm2": {
+        "script": "train_save_model.py",
+        "args": [
+            "-c", "../cache/bitexts", "-f", "ibm2_fwd.model", "-b",
+            "ibm2_bwd.model", "-m", "ibm2", "-j", "2"
+        ],
+        "inputs": ["../params/hyparam_ibm2.yaml"],
+        "outputs": ["../model/ibm2_fwd.model", "../model/ibm2_bwd.model"],
+        "deps": ["build_bitext"],
+    },
+    "save_db": {
+        "script": "bitexts.py",
+        "args": [
+            "-c", "../cache/bitexts", "-o", "../cache/bitexts.db", "-m",
+            "ibm2", "--mapped", "-t"
+        ] + TRANSLATORS,
+        "inputs": [],
+        "outputs": ["../cache/bitexts.db"],
+        "deps": ["build_bitext", "train_save_ibm2"],
+    },
+}
+
+
+def _file_digest(fname, file_cache):
+    """Return sha256 of a file, reusing file_cache while size and mtime hold.
+
+    :param file_cache: dict; absolute path -> [size, mtime_ns, digest]
+    """
+    stat = os.stat(fname)
+    key = os.path.abspath(fname)
+    cached = file_cache.get(key)
+    if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(fname, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(block)
+    file_cache[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return file_cache[key][2]
+
+
+def path_digest(path, file_cache):
+    """Return sha256 of a file or of every file of a directory."""
+    if not os.path.exists(path):
+        return None
+    if not os.path.isdir(path):
+        return _file_digest(path, file_cache)
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fname in sorted(files):
+            full = os.path.join(root, fname)
+            digest.update(os.path.relpath(full, path).encode())
+            digest.update(_file_digest(full, file_cache).encode())
+    return digest.hexdigest()
+
+
+def local_modules(script):
+    """Return source files of script and the modules of src it imports."""
+    found = []
+    todo = [os.path.join(SRC_PATH, script)]
+    while todo:
+        fname = todo.pop()
+        if fname in found:
+            continue
+        found.append(fname)
+        with open(fname) as fp:
+            tree = ast.parse(fp.read(), fname)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                names = [node.module] + [
+                    f"{node.module}.{alias.name}" for alias in node.names
+                ]
+            else:
+                continue
+            for name in names:
+                module = os.path.join(SRC_PATH, *name.split(".")) + ".py"
+                if os.path.exists(module):
+                    todo.append(module)
+    return sorted(found)
+
+
+def stage_keys(stages, file_cache):
+    """Return the key of every stage (dependencies first)."""
+    keys = {}
+
+    def key(name):
+        if name not in keys:
+            stage = stages[name]
+            content = {
+                "args": [stage["script"]] + stage["args"],
+                "code": {
+                    os.path.relpath(fname, SRC_PATH):
+                    path_digest(fname, file_cache)
+                    for fname in local_modules(stage["script"])
+                },
+                "inputs": {
+                    path: path_digest(path, file_cache)
+                    for path in stage["inputs"]
+                },
+                "deps": {dep: key(dep) for dep in stage["deps"]},
+            }
+            keys[name] = hashlib.sha256(
+                json.dumps(content, sort_keys=True).encode()).hexdigest()
+        return keys[name]
+
+    for name in stages:
+        key(name)
+    return keys
+
+
+def select(stages, targets):
+    """Return targets and the stages they depend on, in STAGES order."""
+    selected = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(stages[name]["deps"])
+    return [name for name in stages if name in selected]
+
+
+def load_manifest(fname):
+    """Load the manifest, empty if not written yet."""
+    if not os.path.exists(fname):
+        return {"stages": {}, "files": {}}
+    with open(fname) as fp:
+        return json.load(fp)
+
+
+def write_manifest(fname, manifest):
+    """Output the manifest atomically."""
+    tmp = f"{fname}.tmp"
+    with open(tmp, "w") as fp:
+        json.dump(manifest, fp, indent=1, sort_keys=True)
+    os.replace(tmp, fname)
+
+
+def run_stage(stage):
+    """Run the script of a stage; return (return code, wall seconds)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, stage["script"]] + stage["args"],
+                          cwd=SRC_PATH)
+    return proc.returncode, time.perf_counter() - start
+
+
+def run(stages,
+        targets,
+        manifest,
+        manifest_path=None,
+        jobs=2,
+        force=False,
+        dry_run=False):
+    """Run outdated stages of targets.
+
+    :param manifest: dict; updated with the keys of successful runs
+    :param manifest_path: str; where manifest is written after every run
+    :return: dict; stage -> (status, wall seconds)
+    """
+    logger = getLogger(__name__)
+    names = select(stages, targets)
+    keys = stage_keys(stages, manifest["files"])
+    report = {}
+    pending = []
+    for name in names:
+        recorded = manifest["stages"].get(name, {})
+        up_to_date = (recorded.get("key") == keys[name] and all(
+            os.path.exists(path) for path in stages[name]["outputs"]))
+        if up_to_date and not force:
+            report[name] = ("skipped", 0.0)
+        else:
+            pending.append(name)
+    if dry_run:
+        report.update({name: ("outdated", 0.0) for name in pending})
+        return report
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name in list(pending):
+                deps = [report.get(dep, ("", 0))[0] for dep in
+                        stages[name]["deps"] if dep in names]
+                if any(status in ("failed", "blocked") for status in deps):
+                    pending.remove(name)
+                    report[name] = ("blocked", 0.0)
+                elif all(status in ("skipped", "done") for status in deps):
+                    pending.remove(name)
+                    logger.info(f"[INFO] Running {name}...")
+                    running[executor.submit(run_stage, stages[name])] = name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode == 0:
+                    report[name] = ("done", elapsed)
+                    manifest["stages"][name] = {
+                        "key": keys[name],
+                        "seconds": round(elapsed, 3),
+                        "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                    if manifest_path is not None:
+                        write_manifest(manifest_path, manifest)
+                else:
+                    report[name] = ("failed", elapsed)
+                logger.info(f"[INFO] {name} {report[name][0]} in "
+                            f"{elapsed:.1f}s")
+    return {name: report[name] for name in names}
+
+
+def main(args):
+    """Run the pipeline and print the timing report."""
+    basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
+    logger = getLogger(__name__)
+    logger.info(f"[INFO] args: {args}")
+    manifest = load_manifest(args.manifest_path)
+    start = time.perf_counter()
+    report = run(STAGES, args.stages or list(STAGES), manifest,
+                 args.manifest_path, args.jobs, args.force, args.dry_run)
+    elapsed = time.perf_counter() - start
+    if not args.dry_run:
+        # Keeps the file digests computed even when every stage was skipped
+        write_manifest(args.manifest_path, manifest)
+    width = max(len(name) for name in report)
+    lines = [f"{'stage':<{width}}  {'status':<8}  seconds"]
+    for name, (status, seconds) in report.items():
+        lines.append(f"{name:<{width}}  {status:<8}  {seconds:7.1f}")
+    lines.append(f"{'total':<{width}}  {'':<8}  {elapsed:7.1f}")
+    logger.info("[INFO] Timing report:\n" + "\n".join(lines))
+    if any(status in ("failed", "blocked") for status, _ in report.values()):
+        sys.exit(1)
+
+
+def cli_main():
+    """Arguement parser setting."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("stages",
+                        nargs="*",
+                        metavar="stage",
+                        help="stages to bring up to date with their "
+                        "dependencies (all by default)")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=2,
+                        help="stages run at once")
+    parser.add_argument("-f",
+                        "--force",
+                        action="store_true",
+                        help="rerun stages even if up to date")
+    parser.add_argument("-n",
+                        "--dry_run",
+                        action="store_true",
+                        help="only report outdated stages")
+    parser.add_argument("--manifest_path",
+                        default=MANIFEST_PATH,
+                        help="path of the manifest of stage keys")
+    args = parser.parse_args()
+    unknown = [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages {unknown}, choose from {list(STAGES)}")
+    main(args)
+
+
+if __name__ == "__main__":
+    cli_main()
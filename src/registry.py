@@ -0,0 +1,138 @@
+"""Process-wide registry of the shared read-only data.
+
+Modules get the bitexts DB and the metacode2lemma maps from here instead
+of loading their own copies, so each is loaded once per process.  A DB
+saved with ``bitexts.py --mapped`` (a directory) is memory-mapped
+read-only: forked workers and separate processes share its pages through
+the page cache instead of each unpickling a private copy.
+
+Nothing is loaded at import: ``DATA`` loads each resource on first access,
+so importing a module that uses it stays cheap.
+"""
+import os
+from functools import cached_property
+from utils import load_pickle
+
+DB_PATH = "../cache/bitexts.db"
+METACODE2LEMMA_SRC_PATH = "../cache/metacode2lemma_src.idx"
+METACODE2LEMMA_TAR_PATH = "../cache/metacode2lemma_tar.idx"
+# Maps pickled by earlier versions of make_metacode2lemma.py
+METACODE2LEMMA_SRC_PICKLE = "../cache/metacode2lemma_src.pkl"
+METACODE2LEMMA_TAR_PICKLE = "../cache/metacode2lemma_tar.pkl"
+
+_LOADED = {}
+
+
+def get_db(path=DB_PATH):
+    """Return the bitexts DB, loaded once per process.
+
+    :param path: str; memory-mapped DB directory or pickled DB file
+    """
+    key = ("db", os.path.abspath(path))
+    if key not in _LOADED:
+        if os.path.isdir(path):
+            from bitexts import Bitexts
+            _LOADED[key] = Bitexts.load_mapped(path)
+        else:
+            _LOADED[key] = load_pickle(path)
+    return _LOADED[key]
+
+
+def get_pickle(fname):
+    """Return the content of a .pkl file, loaded once per process."""
+    key = ("pickle", os.path.abspath(fname))
+    if key not in _LOADED:
+        _LOADED[key] = load_pickle(fname)
+    return _LOADED[key]
+
+
+def get_metacode2lemma(path, pickle_path=None):
+    """Return a metacode2lemma map (``lemma_index.LemmaIndex``), loaded once
+    per process.
+
+    A map not built yet by ``make_metacode2lemma.py`` is indexed in memory
+    from its pickle.
+    :param path: str; map directory
+    :param pickle_path: str; pickled map used when path does not exist
+    """
+    key = ("metacode2lemma", os.path.abspath(path))
+    if key not in _LOADED:
+        import lemma_index
+        if os.path.isdir(path) or pickle_path is None:
+            _LOADED[key] = lemma_index.load(path)
+        else:
+            _LOADED[key] = lemma_index.build(get_pickle(pickle_path))
+    return _LOADED[key]
+
+
+class DataContext:
+    """Shared resources, each loaded on first access and then cached."""
+
+    def __init__(self,
+                 db_path=DB_PATH,
+                 metacode2lemma_src_path=METACODE2LEMMA_SRC_PATH,
+                 metacode2lemma_tar_path=METACODE2LEMMA_TAR_PATH,
+                 metacode2lemma_src_pickle=METACODE2LEMMA_SRC_PICKLE,
+                 metacode2lemma_tar_pickle=METACODE2LEMMA_TAR_PICKLE):
+        self.db_path = db_path
+        self.metacode2lemma_src_path = metacode2lemma_src_path
+        self.metacode2lemma_tar_path = metacode2lemma_tar_path
+        self.metacode2lemma_src_pickle = metacode2lemma_src_pickle
+        self.metacode2lemma_tar_pickle = metacode2lemma_tar_pickle
+
+    @cached_property
+    def db(self):
+        return get_db(self.db_path)
+
+    @cached_property
+    def translators(self):
+        return self.db.translators
+
+    @cached_property
+    def metacode2lemma_src(self):
+        return get_metacode2lemma(self.metacode2lemma_src_path,
+                                  self.metacode2lemma_src_pickle)
+
+    @cached_property
+    def metacode2lemma_tar(self):
+        return get_metacode2lemma(self.metacode2lemma_tar_path,
+                                  self.metacode2lemma_tar_pickle)
+
+    def reset(self):
+        """Drop cached resources so that they are loaded again."""
+        for name in ("db", "translators", "metacode2lemma_src",
+                     "metacode2lemma_tar"):
+            self.__dict__.pop(name, None)
+
+
+DATA = DataContext()
+
+# Module-level data names of align2graph and the visualize modules
+MODULE_DATA = {
+    "DB": "db",
+    "translator_lst": "translators",
+    "metacode2lemma_map_src": "metacode2lemma_src",
+    "metacode2lemma_map_tar": "metacode2lemma_tar",
+}
+
+
+def module_getattr(module_name):
+    """Return a module ``__getattr__`` resolving MODULE_DATA names lazily.
+
+    Keeps ``from align2graph import DB`` working without loading the DB
+    when the module is imported.
+    """
+
+    def __getattr__(name):
+        if name in MODULE_DATA:
+            return getattr(DATA, MODULE_DATA[name])
+        raise AttributeError(
+            f"module {module_name!r} has no attribute {name!r}")
+
+    return __getattr__
+
+
+def clear():
+    """Forget everything loaded, e.g. after the files were rebuilt."""
+    _LOADED.clear()
+    DATA.reset()
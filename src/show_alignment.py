@@ -4,26 +4,25 @@ from typing import Literal
 import pandas as pd
 from plotly.graph_objects import Figure, Heatmap, Layout
 from plotly.offline import plot
-from utils import load_pickle, lemma2metacode
+from utils import lemma2metacode
+import registry
+from registry import DATA
 
-DB = load_pickle("../cache/bitexts.db")
-translator_lst = DB.translators
-metacode2lemma_map_src = load_pickle("../cache/metacode2lemma_src.pkl")
-metacode2lemma_map_tar = load_pickle("../cache/metacode2lemma_tar.pkl")
+# DB, translator_lst and metacode2lemma_map_* are loaded on first use
+__getattr__ = registry.module_getattr(__name__)
 
 Direction = Literal["source2target", "target2source", "bidirection",
                     "improper"]
-Translator = Literal[translator_lst]
+Translator = str  # one of DATA.translators
 
 
 def alignment_table(word: str,
                     translator: Translator,
                     direction: Direction = "bidirection"):
     """Return alignment chessboard."""
-    word = lemma2metacode(word, metacode2lemma_map_src)
-    bitexts = DB.query_bitext_by_translator(translator)
+    word = lemma2metacode(word, DATA.metacode2lemma_src)
     print("Query results:")
-    candidates = [bitext for bitext in bitexts if word in bitext.source]
+    candidates = list(DATA.db.query_bitexts(words=[word], translators=[translator]))
     multi_choice = {}
     for idx, candidate in enumerate(candidates, 1):
         print(f"{idx:2d}: {candidate}")
@@ -40,10 +39,10 @@ def alignment_table(word: str,
         alignment = list(bitext.improper_alignment_idx())
     heatmap = {}
     for i, src in enumerate(bitext.source):
-        src = str(i + 1) + '.' + metacode2lemma_map_src[src]
+        src = str(i + 1) + '.' + DATA.metacode2lemma_src[src]
         heatmap[src] = {}
         for j, tar in enumerate(bitext.target):
-            tar = str(j + 1) + '.' + metacode2lemma_map_tar[tar]
+            tar = str(j + 1) + '.' + DATA.metacode2lemma_tar[tar]
             if (i, j) in alignment:
                 heatmap[src][tar] = 1
             else:
@@ -1,52 +1,81 @@
 """Statistical description of the data."""
 import csv
+import os
 from logging import basicConfig, getLogger, DEBUG
-from utils import load_pickle
-
-basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
-logger = getLogger(__name__)
-
-logger.info("[INFO] Loading...")
-
-DB = load_pickle("../cache/bitexts.db")
-
-n_bitext = {}
-n_bitext["total"] = 0
-source_token_lst = []
-target_token_dict = {}
-target_token_dict["total"] = []
-for translator in DB.translators:
-    bitext_lst = list(DB.query_bitext_by_translator(translator))
-    n_bitext[translator] = len(bitext_lst)
-    n_bitext["total"] += len(bitext_lst)
-    target_token_dict[translator] = []
-    for bitext in bitext_lst:
-        source = bitext.source
-        target = bitext.target
-        for token in source:
-            source_token_lst.append(token)
-        for token in target:
-            target_token_dict[translator].append(token)
-            target_token_dict["total"].append(token)
-
-n_source_token = len(source_token_lst)
-n_source_type = len(set(source_token_lst))
-
-n_token = {}
-n_type = {}
-for key in target_token_dict:
-    n_token[key] = len(target_token_dict[key])
-    n_type[key] = len(set(target_token_dict[key]))
-
-n_token["kokin"] = n_source_token
-n_type["kokin"] = n_source_type
-n_bitext["kokin"] = n_bitext["total"] / len(DB.translators)
-res = n_token, n_type, n_bitext
-
-with open("../artifacts/basic_stat.csv", 'w') as fp:
-    writer = csv.writer(fp, delimiter=",")
-    writer.writerow(["", "# of tokens", "# of types", "# of texts"])
-    for key in n_token.keys():
-        writer.writerow([key] + [f"{int(d[key])}" for d in res])
-
-logger.info("[Info] Done.")
+import numpy as np
+import corpus_store
+import registry
+
+
+STORE_PATH = "../cache/bitexts"
+
+
+def _corpus():
+    """Return translator names, translator code of every bitext and the
+    (IDs, offsets) of source and target tokens.
+
+    Only the projected columns of the corpus store are read; the DB is
+    used when no store has been built.
+    """
+    if os.path.isdir(STORE_PATH):
+        store = corpus_store.load(STORE_PATH,
+                                  ["source", "target", "translator"])
+        return (store["translator"].vocab.tolist(),
+                np.asarray(store["translator"].codes),
+                *((np.asarray(store[column].ids),
+                   np.asarray(store[column].offsets))
+                  for column in ("source", "target")))
+    packed = registry.get_db().packed
+    return (list(packed.translator_names), np.asarray(packed.translators),
+            (packed.source_ids, packed.source_offsets),
+            (packed.target_ids, packed.target_offsets))
+
+
+def main():
+    basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
+    logger = getLogger(__name__)
+    logger.info("[INFO] Loading...")
+
+    # Bitexts of the translators selected in the DB; token counts come
+    # from offsets and type counts from token IDs.
+    translators = list(registry.get_db().translators)
+    names, codes, (source_ids, source_offsets), (target_ids,
+                                                 target_offsets) = _corpus()
+    code_of = {name: code for code, name in enumerate(names)}
+    selected = [code_of.get(name, -1) for name in translators]
+    # translator of each token
+    source_codes = np.repeat(codes, np.diff(source_offsets))
+    target_codes = np.repeat(codes, np.diff(target_offsets))
+
+    n_bitext = {}
+    n_token = {}
+    n_type = {}
+    kept = np.isin(target_codes, selected)
+    n_bitext["total"] = int(np.isin(codes, selected).sum())
+    n_token["total"] = int(kept.sum())
+    n_type["total"] = len(np.unique(target_ids[kept]))
+    for name, code in zip(translators, selected):
+        n_bitext[name] = int((codes == code).sum())
+        n_token[name] = int((target_codes == code).sum())
+        n_type[name] = len(np.unique(target_ids[target_codes == code]))
+
+    source = source_ids[np.isin(source_codes, selected)]
+    n_source_token = len(source)
+    n_source_type = len(np.unique(source))
+
+    n_token["kokin"] = n_source_token
+    n_type["kokin"] = n_source_type
+    n_bitext["kokin"] = n_bitext["total"] / len(translators)
+    res = n_token, n_type, n_bitext
+
+    with open("../artifacts/basic_stat.csv", 'w') as fp:
+        writer = csv.writer(fp, delimiter=",")
+        writer.writerow(["", "# of tokens", "# of types", "# of texts"])
+        for key in n_token.keys():
+            writer.writerow([key] + [f"{int(d[key])}" for d in res])
+
+    logger.info("[Info] Done.")
+
+
+if __name__ == "__main__":
+    main()
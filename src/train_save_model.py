@@ -1,39 +1,130 @@
 """Train alignment models."""
 import os
+import shutil
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from logging import basicConfig, getLogger, DEBUG
+import numpy as np
 from utils import load_corpus, load_hyparam
-from methods import ibm2  # and other methods
+from methods import ibm2, ibm2_array, ibm2_numpy  # and other methods
 
 MODEL_PATH = "../model"
 if not os.path.exists(MODEL_PATH):
     os.makedirs(MODEL_PATH)
 
+ENGINES = {"ibm2": ibm2, "ibm2_numpy": ibm2_numpy}
+
+
+def _train_save(method,
+                source,
+                target,
+                hyparams,
+                fname,
+                model_format,
+                weight=None,
+                resume=False):
+    """Train and save one direction; return its wall time in seconds.
+
+    Training from scratch checkpoints every EM iteration to
+    ``{fname}.ckpt``, removed once the model is saved.
+    :param weight: float; share of the bitexts in the corpus when the model
+        saved at fname is updated with them (warm start)
+    :param resume: bool; continue from the checkpoint if it exists
+    """
+    start = time.perf_counter()
+    checkpoint = f"{fname}.ckpt"
+    if weight is not None:
+        model = ENGINES[method].train_warm(
+            source=source,
+            target=target,
+            model=ibm2.load(fname),
+            max_iter=hyparams.warm_iterations,
+            weight=weight,
+            workers=hyparams.workers,
+            model_format=model_format)
+    else:
+        options = {
+            "checkpoint": checkpoint,
+            "resume": resume,
+            "name": os.path.basename(fname)
+        }
+        if method == "ibm2_numpy":
+            options.update(workers=hyparams.workers,
+                           model_format=model_format)
+        model = ENGINES[method].train(source=source,
+                                      target=target,
+                                      max_iter=hyparams.iterations,
+                                      **options)
+    if model_format == "array":
+        model = ibm2_array.from_nltk(model)
+    ibm2.save(fname, model)
+    if os.path.isdir(checkpoint):
+        shutil.rmtree(checkpoint)
+    elif os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return time.perf_counter() - start
+
 
 def main(args):
     """Train and save alignment models."""
     basicConfig(format="%(asctime)s %(message)s", level=DEBUG)
     logger = getLogger(__name__)
     logger.info(f"[INFO] args: {args}")
-    corpus = load_corpus(args.corpus_path)
-    src = corpus.source
-    tar = corpus.target
-    if args.method == "ibm2":
-        logger.info("[INFO] Training IBM model 2...")
+    columns = ["source", "target"]
+    if args.warm_start:
+        columns.append("translator")
+    corpus = load_corpus(args.corpus_path, columns)
+    if args.method in ENGINES:
         hyparams = load_hyparam("hyparam_ibm2.yaml")
-        logger.info("[INFO] Training from source to target...")
-        model_fwd = ibm2.train(source=src,
-                               target=tar,
-                               max_iter=hyparams.iterations)
-        logger.info("[INFO] Training from target to source...")
-        model_bwd = ibm2.train(source=tar,
-                               target=src,
-                               max_iter=hyparams.iterations)
+        weight = None
+        if args.warm_start:
+            # New bitexts and a replayed sample of the ones already trained
+            new = corpus.translator.isin(args.translators).to_numpy()
+            old = np.flatnonzero(~new)
+            rng = np.random.default_rng(hyparams.seed)
+            replay = rng.choice(old,
+                                int(hyparams.replay * len(old)),
+                                replace=False)
+            rows = np.sort(np.concatenate([np.flatnonzero(new), replay]))
+            weight = len(rows) / len(corpus)
+            logger.info(f"[INFO] Updating IBM model 2 with {new.sum()} new "
+                        f"and {len(replay)} replayed bitexts...")
+            corpus = corpus.iloc[rows]
+        else:
+            logger.info("[INFO] Training IBM model 2...")
+        src = corpus.source.tolist()
+        tar = corpus.target.tolist()
         fp_fwd = os.path.join(MODEL_PATH, args.fn_fwd)
         fp_bwd = os.path.join(MODEL_PATH, args.fn_bwd)
-        logger.info(f"[INFO] Saving models to {MODEL_PATH}...")
-        ibm2.save(fp_fwd, model_fwd)
-        ibm2.save(fp_bwd, model_bwd)
+        directions = {
+            "source to target": (src, tar, fp_fwd),
+            "target to source": (tar, src, fp_bwd),
+        }
+        if args.jobs > 1:
+            # Both directions share the corpus parsed above
+            logger.info(f"[INFO] Training both directions with {args.jobs} "
+                        f"processes, saving models to {MODEL_PATH}...")
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                futures = {
+                    pool.submit(_train_save, args.method, source, target,
+                                hyparams, fname, args.format, weight,
+                                args.resume):
+                    direction
+                    for direction, (source, target, fname) in
+                    directions.items()
+                }
+                for future in as_completed(futures):
+                    logger.info(f"[INFO] Trained and saved {futures[future]} "
+                                f"in {future.result():.1f}s")
+        else:
+            for direction, (source, target, fname) in directions.items():
+                logger.info(f"[INFO] Training from {direction}...")
+                elapsed = _train_save(args.method, source, target, hyparams,
+                                      fname, args.format, weight,
+                                      args.resume)
+                logger.info(f"[INFO] Trained and saved {direction} to "
+                            f"{fname} in {elapsed:.1f}s")
         logger.info("[INFO] Done.")
 
 
@@ -41,13 +132,38 @@ def cli_main():
     """Arguement parser setting."""
     parser = argparse.ArgumentParser()
     parser.add_argument("-b", "--fn_bwd", help="path of output forward model")
-    parser.add_argument("-c", "--corpus_path", help="path of bitexts")
+    parser.add_argument("-c", "--corpus_path", help="path of bitexts (.csv or corpus store)")
     parser.add_argument("-f", "--fn_fwd", help="path of output backward model")
+    parser.add_argument("--format",
+                        choices=["nltk", "array"],
+                        default="nltk",
+                        help="model file format: dill pickle or .npy arrays")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=1,
+                        help="processes training both directions at once")
     parser.add_argument("-m",
                         "--method",
-                        choices=["ibm2"],
+                        choices=list(ENGINES),
                         help="selection of word alignment model")
+    parser.add_argument("-w",
+                        "--warm_start",
+                        action="store_true",
+                        help="update the models at -f/-b with the bitexts "
+                        "of -t instead of training from scratch")
+    parser.add_argument("-t",
+                        "--translators",
+                        nargs="+",
+                        default=[],
+                        help="translators whose bitexts are new (with -w)")
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="continue training from the checkpoints of "
+                        "-f/-b (.ckpt) of an interrupted run")
     args = parser.parse_args()
+    if args.warm_start and not args.translators:
+        parser.error("-w/--warm_start requires -t/--translators")
     main(args)
 
 
@@ -1,7 +1,9 @@
 """Input / output utils."""
+import os
+import shutil
+import tempfile
 import dill as pickle
-import pandas as pd
-from hydra import initialize, compose
+import numpy as np
 
 
 def write_pickle(data, fname):
@@ -16,9 +18,62 @@ def load_pickle(fname):
     return pickle.load(fp)
 
 
-def load_corpus(fname):
-    """Load .csv corpus file."""
-    return pd.read_csv(fname)
+def write_arrays(dirname, arrays):
+    """Output arrays as .npy files of one directory.
+
+    The directory is written under a temporary name and then moved into
+    place, so readers never see a partially written one.
+    :param arrays: dict; file stem -> numpy.ndarray
+    """
+    tmp_dirname = tempfile.mkdtemp(
+        dir=os.path.dirname(os.path.abspath(dirname)), prefix=".tmp-")
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dirname, f"{name}.npy"), array)
+    move_into_place(tmp_dirname, dirname)
+
+
+def move_into_place(tmp_dirname, dirname):
+    """Replace dirname by a directory written under a temporary name.
+
+    :param tmp_dirname: str; directory in the same parent as dirname
+    """
+    parent = os.path.dirname(os.path.abspath(dirname))
+    if os.path.lexists(dirname):
+        old_dirname = tempfile.mkdtemp(dir=parent, prefix=".old-")
+        os.replace(dirname, os.path.join(old_dirname, "old"))
+        os.replace(tmp_dirname, dirname)
+        shutil.rmtree(old_dirname)
+    else:
+        os.replace(tmp_dirname, dirname)
+
+
+def load_arrays(dirname, names=None):
+    """Load .npy files of a directory as read-only numpy.memmap.
+
+    :param names: iter; file stems to load (all by default)
+    :return: dict; file stem -> numpy.memmap
+    """
+    if names is None:
+        names = [
+            fname[:-4] for fname in sorted(os.listdir(dirname))
+            if fname.endswith(".npy")
+        ]
+    return {
+        name: np.load(os.path.join(dirname, f"{name}.npy"), mmap_mode="r")
+        for name in names
+    }
+
+
+def load_corpus(fname, columns=None):
+    """Load .csv corpus file or columnar corpus store directory.
+
+    :param columns: list; columns to read (all by default)
+    """
+    if os.path.isdir(fname):
+        import corpus_store
+        return corpus_store.load(fname, columns).to_frame(columns)
+    import pandas as pd
+    return pd.read_csv(fname, usecols=columns)
 
 
 def metacode2lemma_map(fp_dict, metacode):
@@ -29,23 +84,35 @@ def metacode2lemma_map(fp_dict, metacode):
 
 def load_hyparam(fname, fp_config="../params"):
     """Load model's hyperparameters."""
+    from hydra import initialize, compose
     with initialize(version_base=None, config_path=fp_config, job_name=None):
         hyparam = compose(config_name=fname)
     return hyparam
 
 
-def lemma2metacode(word, metacode2lemma_map):
-    """Convert lemma to bg-id format to query."""
-    def metacodes():
-        for key, value in metacode2lemma_map.items():
-            if word != value:
-                continue
-            yield key
+def lemma2metacode(word, metacode2lemma_map, resolve="ask"):
+    """Convert lemma to bg-id format to query.
+
+    :param metacode2lemma_map: dict or lemma_index.LemmaIndex; an index is
+        searched through its reverse index instead of scanned
+    :param resolve: str; for a lemma with several metacodes, "ask" prompts
+        for one, "first" takes the first one and "all" returns the list of
+        all metacodes (also for one or none)
+    """
+    if hasattr(metacode2lemma_map, "metacodes"):
+        metacode_lst = metacode2lemma_map.metacodes(word)
+    else:
+        metacode_lst = [
+            key for key, value in metacode2lemma_map.items() if word == value
+        ]
 
-    metacode_lst = list(metacodes())
+    if resolve == "all":
+        return metacode_lst
     if len(metacode_lst) == 1:
         return metacode_lst[0]
     elif len(metacode_lst) >= 2:
+        if resolve == "first":
+            return metacode_lst[0]
         print("Lemma has the following semantic codings:")
         multi_choice = {}
         for idx, metacode in enumerate(metacode_lst, 1):
@@ -53,3 +120,15 @@ def lemma2metacode(word, metacode2lemma_map):
             multi_choice[idx] = metacode
         choice = int(input("Input one ID to query:"))
         return multi_choice[choice]
+
+
+def lemmas2metacodes(words, metacode2lemma_map, resolve="ask"):
+    """Convert lemmas to metacodes with ``lemma2metacode``.
+
+    With resolve="all" every metacode of every lemma is returned.
+    """
+    metacodes = []
+    for word in words:
+        metacode = lemma2metacode(word, metacode2lemma_map, resolve)
+        metacodes.extend(metacode if resolve == "all" else [metacode])
+    return metacodes
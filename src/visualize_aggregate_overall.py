@@ -4,9 +4,10 @@ import argparse
 from plotly.graph_objs import Scatter, Layout, Figure
 from plotly.graph_objs.layout import XAxis, YAxis, Margin
 from plotly.offline import plot
-from utils import load_pickle, lemma2metacode
+from utils import lemmas2metacodes
+from registry import DATA
 from bitexts import AlignmentInfo
-from align2graph import translator_lst, metacode2lemma_map_src, romaji2kanji_map, retrive_igraph
+from align2graph import romaji2kanji_map, retrive_igraph
 
 
 def draw_plotly(*words):
@@ -55,7 +56,7 @@ def draw_plotly(*words):
     vertex_label = graph.vs["node"]
     edge_label = graph.es["weight"]
     title = ";<br>".join(
-        [f"{word} {metacode2lemma_map_src[word]}" for word in words])
+        [f"{word} {DATA.metacode2lemma_src[word]}" for word in words])
 
     # Betweenness centrality
     def betweenness_centrality():
@@ -77,7 +78,7 @@ def draw_plotly(*words):
             path = e["path"]
             count = e["weight"]
             hover_label = f"<b>{path}</b>: {count}<br><br>"
-            for translator in translator_lst:
+            for translator in DATA.translators:
                 label = f"<b>{romaji2kanji_map[translator]}</b>: {e[translator]}<br>"
                 hover_label += label
             yield hover_label
@@ -182,8 +183,7 @@ def draw_plotly(*words):
 
 
 def main(args):
-    metacode2lemma_map = load_pickle("../cache/metacode2lemma_src.pkl")
-    codes = [lemma2metacode(word, metacode2lemma_map) for word in args.words]
+    codes = lemmas2metacodes(args.words, DATA.metacode2lemma_src, args.resolve)
     fig = draw_plotly(*codes)
     plot(fig, filename=f"../artifacts/aggregate-{'-'.join(args.words)}.html")
 
@@ -191,6 +191,12 @@ def main(args):
 def cli_main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-w", "--words", nargs="+", help="words to query")
+    parser.add_argument("-r",
+                        "--resolve",
+                        choices=["ask", "first", "all"],
+                        default="ask",
+                        help="metacode(s) of a lemma with several: ask, "
+                        "the first one or all of them")
     args = parser.parse_args()
     main(args)
 
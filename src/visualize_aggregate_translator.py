@@ -4,9 +4,10 @@ import argparse
 from plotly.graph_objs import Scatter, Layout, Figure
 from plotly.graph_objs.layout import XAxis, YAxis, Margin
 from plotly.offline import plot
-from utils import load_pickle, lemma2metacode
+from utils import lemmas2metacodes
+from registry import DATA
 from bitexts import AlignmentInfo
-from align2graph import translator_lst, metacode2lemma_map_src, romaji2kanji_map, retrive_igraph_by_translator
+from align2graph import romaji2kanji_map, retrive_igraph_by_translator
 
 
 def draw_plotly_by_translator(*words):
@@ -58,7 +59,7 @@ def draw_plotly_by_translator(*words):
     # Annotations
     edge_label = graph.es["weight"]
     title = ";<br>".join(
-        [f"{word} {metacode2lemma_map_src[word]}" for word in words])
+        [f"{word} {DATA.metacode2lemma_src[word]}" for word in words])
 
     # Betweenness centrality
     def betweenness_centrality():
@@ -212,8 +213,7 @@ def draw_plotly_by_translator(*words):
 
 
 def main(args):
-    metacode2lemma_map = load_pickle("../cache/metacode2lemma_src.pkl")
-    codes = [lemma2metacode(word, metacode2lemma_map) for word in args.words]
+    codes = lemmas2metacodes(args.words, DATA.metacode2lemma_src, args.resolve)
     fig = draw_plotly_by_translator(*codes)
     fig.update_layout(
         title='',
@@ -234,6 +234,12 @@ def main(args):
 def cli_main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-w", "--words", nargs="+", help="words to query")
+    parser.add_argument("-r",
+                        "--resolve",
+                        choices=["ask", "first", "all"],
+                        default="ask",
+                        help="metacode(s) of a lemma with several: ask, "
+                        "the first one or all of them")
     args = parser.parse_args()
     main(args)
 
@@ -1,33 +1,30 @@
 """Input bitext ID, return alignment table."""
 import argparse
 from typing import Literal
-from numpy import NaN
+from numpy import nan as NaN
 import pandas as pd
 from plotly.graph_objects import Figure, Heatmap, Scatter, Layout
 from plotly.graph_objs.layout import XAxis, YAxis, Margin
 from plotly.offline import plot
-from utils import load_pickle, lemma2metacode
+from utils import lemma2metacode
+import registry
+from registry import DATA
 
-DB = load_pickle("../cache/bitexts.db")
-translator_lst = DB.translators
-metacode2lemma_map_src = load_pickle("../cache/metacode2lemma_src.pkl")
-metacode2lemma_map_tar = load_pickle("../cache/metacode2lemma_tar.pkl")
+# DB, translator_lst and metacode2lemma_map_* are loaded on first use
+__getattr__ = registry.module_getattr(__name__)
 
 Direction = Literal["source2target", "target2source", "bidirection",
                     "improper"]
-Translator = Literal[translator_lst]
+Translator = str  # one of DATA.translators
 
 
 def query(word: str, translator: Translator):
     """Return bitext dataframe."""
-    bitexts = DB.query_bitext_by_translator(translator)    
-    candidates = [bitext for bitext in bitexts if word in bitext.source]
-    return candidates
+    return list(DATA.db.query_bitexts(words=[word], translators=[translator]))
 
 def alignment_table(poem, translator, word):
     """Return alignment chessboard."""
-    bitexts = DB.query_bitext_by_translator(translator)    
-    bitext = [bitext for bitext in bitexts if bitext.poem == poem][0]
+    bitext = next(DATA.db.query_bitexts(poems=[poem], translators=[translator]))
     alignment_1 = bitext.alignment_source2target  # source to target
     alignment_2 = [i[::-1] for i in bitext.alignment_target2source]  # target to source
     alignment_3 = list(bitext.proper_alignment_idx())  # intersection
@@ -36,13 +33,13 @@ def alignment_table(poem, translator, word):
     targets = []
     for i, src in enumerate(bitext.source):
         if src == word:
-            src = str(i + 1) + "." + metacode2lemma_map_src[src]
+            src = str(i + 1) + "." + DATA.metacode2lemma_src[src]
             targets.append(src)
         else:
-            src = str(i + 1) + "." + metacode2lemma_map_src[src]
+            src = str(i + 1) + "." + DATA.metacode2lemma_src[src]
         heatmap[src] = {}
         for j, tar in enumerate(bitext.target):
-            tar = str(j + 1) + "." + metacode2lemma_map_tar[tar]
+            tar = str(j + 1) + "." + DATA.metacode2lemma_tar[tar]
             if (i, j) in alignment_3:
                 heatmap[src][tar] = 2.5
             elif (i, j) in alignment_4:
@@ -200,7 +197,7 @@ def visualize_heatmap(heatmap, targets):
 
 def main(args):
     print("Query results:")
-    word = lemma2metacode(args.word, metacode2lemma_map_src)
+    word = lemma2metacode(args.word, DATA.metacode2lemma_src)
     candidates = query(word, args.translator)
     multi_choice = {}
     for idx, candidate in enumerate(candidates, 1):
@@ -4,10 +4,11 @@ import argparse
 from plotly.graph_objs import Scatter, Layout, Figure
 from plotly.graph_objs.layout import XAxis, YAxis, Margin
 from plotly.offline import plot
-from utils import load_pickle, lemma2metacode
+from utils import lemma2metacode
+from registry import DATA
 from bitexts import AlignmentInfo
 import bitexts
-from align2graph import DB, translator_lst, metacode2lemma_map_src, romaji2kanji_map, retrive_igraph_by_poem_by_translator
+from align2graph import romaji2kanji_map, retrive_igraph_by_poem_by_translator
 
 
 def draw_plotly_by_translator_by_poem(word, idx):
@@ -224,9 +225,8 @@ def draw_plotly_by_translator_by_poem(word, idx):
 
 
 def main(args):
-    metacode2lemma_map = load_pickle("../cache/metacode2lemma_src.pkl")
-    code = lemma2metacode(args.word, metacode2lemma_map)
-    candidates = DB.query_bitext_by_word(code)
+    code = lemma2metacode(args.word, DATA.metacode2lemma_src)
+    candidates = DATA.db.query_bitext_by_word(code)
     poems = {}
     for candidate in candidates:
         if candidate.poem in poems.keys():
@@ -235,7 +235,7 @@ def main(args):
         print(candidate.poem, candidate.source_surface)
     idx = str(input("Input poem id: "))
     print(idx, poems[idx])
-    query = DB.query_by_poem(idx)
+    query = DATA.db.query_by_poem(idx)
     for candidate in query:
         print(candidate.translator, candidate.target_surface)
     print(code, idx)
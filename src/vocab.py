@@ -0,0 +1,64 @@
+"""Shared metacode vocabulary (metacode <-> int32 ID).
+
+IDs are assigned in order of first appearance and never change when the
+vocabulary is extended, so arrays encoded with an older vocabulary stay
+valid against a newer one.
+"""
+import os
+import tempfile
+import numpy as np
+
+UNKNOWN = -1
+
+
+class Vocabulary:
+    """Metacode <-> integer ID mapping."""
+
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.index = {}
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.index
+
+    def add(self, token):
+        """Return ID of token, adding it if new."""
+        if token not in self.index:
+            self.index[token] = len(self.tokens)
+            self.tokens.append(token)
+        return self.index[token]
+
+    def id(self, token):
+        """Return ID of token, UNKNOWN if it is not in the vocabulary."""
+        return self.index.get(token, UNKNOWN)
+
+    def encode(self, tokens, add=True):
+        """Return IDs of tokens as an int32 array.
+
+        :param add: bool; add new tokens, otherwise encode them as UNKNOWN
+        """
+        lookup = self.add if add else self.id
+        return np.array([lookup(token) for token in tokens], dtype=np.int32)
+
+    def decode(self, ids):
+        """Return metacodes of IDs."""
+        return [self.tokens[i] for i in np.asarray(ids).tolist()]
+
+
+def save(fname, vocabulary):
+    """Output vocabulary as .npy (tokens in ID order)."""
+    dirname = os.path.dirname(os.path.abspath(fname))
+    fd, tmp_fname = tempfile.mkstemp(dir=dirname, suffix=".npy")
+    with os.fdopen(fd, "wb") as fp:
+        np.save(fp, np.array(vocabulary.tokens, dtype=str))
+    os.replace(tmp_fname, fname)
+
+
+def load(fname):
+    """Load vocabulary from .npy."""
+    return Vocabulary(np.load(fname).tolist())
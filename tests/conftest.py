@@ -0,0 +1,79 @@
+"""Fixtures on a small synthetic corpus.
+
+Modules of src are imported as the scripts import each other, and the
+bitexts DB reads ../cache and ../model relative to the working directory,
+so DB tests run from a ``src`` directory of a temporary tree.
+"""
+import os
+import random
+import sys
+import pytest
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+sys.path.insert(0, SRC_PATH)
+
+TRANSLATORS = ["kaneko", "katagiri", "ozawa"]
+ITERATIONS = 3
+
+
+def synthetic_bitexts(n_poems=40, seed=0):
+    """Return bitexts.csv rows; each poem is translated by every translator.
+
+    Target words are noisy word-by-word translations of source words, in
+    roughly the same order, with a few words dropped and inserted.
+    """
+    rng = random.Random(seed)
+    lexicon = {f"s{k:02d}": [f"t{k:02d}", f"t{k:02d}b"] for k in range(12)}
+    rows = []
+    for poem in range(1, n_poems + 1):
+        source = rng.choices(sorted(lexicon), k=rng.randint(2, 6))
+        for translator in TRANSLATORS:
+            target = [rng.choice(lexicon[word]) for word in source
+                      if rng.random() > 0.15]
+            if not target or rng.random() < 0.3:
+                target.insert(rng.randint(0, len(target)), "t99")
+            rows.append([
+                str(poem), "/".join(source), f"src{poem}", "/".join(target),
+                f"{translator}{poem}", translator
+            ])
+    return rows
+
+
+def write_bitexts(fname, rows):
+    with open(fname, "w") as fp:
+        fp.write("idx,source,src_surface,target,tar_surface,translator\n")
+        for row in rows:
+            fp.write(",".join(row) + "\n")
+
+
+@pytest.fixture(scope="session")
+def rows():
+    return synthetic_bitexts()
+
+
+@pytest.fixture(scope="session")
+def corpus(rows):
+    """(source, target) columns of the synthetic bitexts."""
+    return [row[1] for row in rows], [row[3] for row in rows]
+
+
+@pytest.fixture(scope="session")
+def models(corpus):
+    """NLTK IBM 2 models of both directions."""
+    from methods import ibm2
+    source, target = corpus
+    return (ibm2.train(source, target, ITERATIONS),
+            ibm2.train(target, source, ITERATIONS))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, rows, models):
+    """Temporary tree with cache/bitexts.csv and the models; cwd is src."""
+    from methods import ibm2
+    for name in ("src", "cache", "model"):
+        (tmp_path / name).mkdir()
+    write_bitexts(tmp_path / "cache" / "bitexts.csv", rows)
+    ibm2.save(str(tmp_path / "model" / "ibm2_fwd.model"), models[0])
+    ibm2.save(str(tmp_path / "model" / "ibm2_bwd.model"), models[1])
+    monkeypatch.chdir(tmp_path / "src")
+    return tmp_path
@@ -0,0 +1,46 @@
+"""Importing the dashboard loads no data."""
+import os
+import subprocess
+import sys
+from conftest import SRC_PATH
+
+SCRIPT = """
+import registry
+import app
+
+# Neither the registry nor the README is read at import
+assert registry._LOADED == {}, registry._LOADED
+assert not set(registry.MODULE_DATA.values()) & set(vars(registry.DATA))
+
+
+class Index(dict):
+
+    def with_prefix(self, prefix):
+        return [k for k in self if k.startswith(prefix)]
+
+
+registry.DATA.metacode2lemma_src = Index({
+    "BG-01-5510-01-010": "hana",
+    "BG-01-5500-01-010": "ki",
+    "BG-01-2000-02-030": "koto",
+})
+with open("../README-app.md", "w") as fp:
+    fp.write("# About")
+layout = app.serve_layout()
+assert layout["readme"].children == "# About"
+assert [o["value"] for o in layout["target"].options] == [
+    "BG-01-5500-01-010:ki", "BG-01-5510-01-010:hana"
+]
+"""
+
+
+def test_import_loads_no_data(tmp_path):
+    # No README-app.md and no cache next to the working directory
+    (tmp_path / "src").mkdir()
+    env = dict(os.environ, PYTHONPATH=SRC_PATH)
+    proc = subprocess.run([sys.executable, "-c", SCRIPT],
+                          cwd=tmp_path / "src",
+                          env=env,
+                          capture_output=True,
+                          text=True)
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,140 @@
+"""Bitexts DB queries and in-place updates against fresh builds."""
+from dataclasses import astuple
+import pytest
+from conftest import ITERATIONS, TRANSLATORS
+import bitexts
+from methods import ibm2
+
+
+def _bitexts(db):
+    return [(b.poem, b.translator, b.source, b.target, b.source_surface,
+             b.target_surface, b.alignment_source2target,
+             b.alignment_target2source) for b in db]
+
+
+def _queries(db, words):
+    return (sorted(map(astuple, db.query_proper_alignment_by_word(*words))),
+            sorted(map(astuple, db.query_improper_alignment_by_word(*words))),
+            sorted((b.poem, b.translator)
+                   for b in db.query_bitext_by_word(*words)))
+
+
+def _words(db):
+    return sorted({word for bitext in db for word in bitext.source})
+
+
+def test_query_returns_each_bitext_once(workdir):
+    db = bitexts.Bitexts(TRANSLATORS)
+    words = _words(db)[:4]
+    expected = [(b.poem, b.translator)
+                for b in db
+                if any(word in b.source for word in words)]
+    found = [(b.poem, b.translator) for b in db.query_bitext_by_word(*words)]
+    assert found == expected
+    assert any(
+        sum(word in b.source for word in words) > 1 for b in db)
+    found = [(b.poem, b.translator)
+             for b in db.query_bitexts(words, translators=["ozawa"])]
+    assert found == [key for key in expected if key[1] == "ozawa"]
+    assert [b.poem for b in db.query_by_poem("3")] == ["3"] * len(TRANSLATORS)
+
+
+def test_lazy_matches_eager(workdir):
+    eager = bitexts.Bitexts(TRANSLATORS)
+    lazy = bitexts.Bitexts(TRANSLATORS, lazy=True)
+    lazy.precompute()
+    assert _bitexts(lazy) == _bitexts(eager)
+    words = _words(eager)
+    assert _queries(lazy, words) == _queries(eager, words)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_add_translator(workdir, lazy):
+    fresh = bitexts.Bitexts(TRANSLATORS)
+    db = bitexts.Bitexts(TRANSLATORS[:2], lazy=lazy)
+    db.add_translators(TRANSLATORS[2:])
+    db.precompute()
+    assert sorted(_bitexts(db)) == sorted(_bitexts(fresh))
+    words = _words(fresh)
+    assert _queries(db, words) == _queries(fresh, words)
+
+
+def test_drop_translator(workdir):
+    fresh = bitexts.Bitexts(TRANSLATORS[::2])
+    db = bitexts.Bitexts(TRANSLATORS)
+    db.drop_translators(TRANSLATORS[1:2])
+    assert db.translators == TRANSLATORS[::2]
+    assert _bitexts(db) == _bitexts(fresh)
+    words = _words(fresh)
+    assert _queries(db, words) == _queries(fresh, words)
+
+
+def test_redecode(workdir, corpus):
+    db = bitexts.Bitexts(TRANSLATORS)
+    source, target = corpus
+    model = workdir / "model"
+    ibm2.save(str(model / "ibm2_fwd.model"),
+              ibm2.train(source, target, ITERATIONS - 2))
+    ibm2.save(str(model / "ibm2_bwd.model"),
+              ibm2.train(target, source, ITERATIONS - 2))
+    fresh = bitexts.Bitexts(TRANSLATORS)
+    assert _bitexts(db) != _bitexts(fresh)
+    db.redecode()
+    assert _bitexts(db) == _bitexts(fresh)
+    words = _words(fresh)
+    assert _queries(db, words) == _queries(fresh, words)
+
+
+def test_mapped_update(workdir):
+    fresh = bitexts.Bitexts(TRANSLATORS)
+    bitexts.Bitexts(TRANSLATORS[:2]).save_mapped("../cache/bitexts.db")
+    db = bitexts.Bitexts.load_mapped("../cache/bitexts.db")
+    db.add_translators(TRANSLATORS[2:])
+    db.save_mapped("../cache/bitexts.db")
+    db = bitexts.Bitexts.load_mapped("../cache/bitexts.db")
+    assert sorted(_bitexts(db)) == sorted(_bitexts(fresh))
+    words = _words(fresh)
+    assert _queries(db, words) == _queries(fresh, words)
+
+
+def _baseline_state(db):
+    """Return the state the baseline version pickled for the same DB."""
+    rows = []
+    for bitext in db:
+        row = bitexts.Bitext.__new__(bitexts.Bitext)
+        row.__setstate__({
+            "poem": bitext.poem,
+            "source": bitext.source,
+            "source_raw": "/".join(bitext.source),
+            "source_surface": bitext.source_surface,
+            "target": bitext.target,
+            "target_raw": "/".join(bitext.target),
+            "target_surface": bitext.target_surface,
+            "translator": bitext.translator,
+            "model_source2target": db.model_source2target,
+            "model_target2source": db.model_target2source,
+            "method": db.method,
+            "alignment_source2target": bitext.alignment_source2target,
+            "alignment_target2source": bitext.alignment_target2source,
+        })
+        rows.append(row)
+    return {
+        "translators": db.translators,
+        "method": db.method,
+        "bitexts": rows,
+        "model_source2target": db.model_source2target,
+        "model_target2source": db.model_target2source,
+    }
+
+
+def test_baseline_pickle(workdir):
+    fresh = bitexts.Bitexts(TRANSLATORS)
+    db = bitexts.Bitexts.__new__(bitexts.Bitexts)
+    db.__setstate__(_baseline_state(fresh))
+    assert _bitexts(db) == _bitexts(fresh)
+    words = _words(fresh)
+    assert _queries(db, words) == _queries(fresh, words)
+    state = _baseline_state(fresh)
+    state["lazy"] = True
+    with pytest.raises(ValueError):
+        bitexts.Bitexts.__new__(bitexts.Bitexts).__setstate__(state)
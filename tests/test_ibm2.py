@@ -0,0 +1,175 @@
+"""IBM 2 trainers and batch decoding against NLTK."""
+import numpy as np
+import pytest
+from conftest import ITERATIONS
+from methods import ibm2, ibm2_array, ibm2_numpy
+from vocab import Vocabulary
+
+
+def _probabilities(model, source, target):
+    """Return every translation and alignment probability used by corpus."""
+    translation, alignment = [], []
+    for words, mots in zip(source, target):
+        words, mots = words.split("/"), mots.split("/")
+        l, m = len(mots), len(words)
+        for j, word in enumerate(words, 1):
+            for i, mot in enumerate([None] + mots):
+                translation.append(model.translation_table[word][mot])
+                alignment.append(model.alignment_table[i][j][l][m])
+    return np.array(translation), np.array(alignment)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _interrupt_after(monkeypatch, module, n_iter):
+    """Make training stop after n_iter iterations."""
+    log_iteration = module.log_iteration
+    done = []
+
+    def interrupted(*args):
+        log_iteration(*args)
+        done.append(args)
+        if len(done) == n_iter:
+            raise Interrupted
+
+    monkeypatch.setattr(module, "log_iteration", interrupted)
+
+
+def test_numpy_matches_nltk(corpus, models):
+    expected = _probabilities(models[0], *corpus)
+    model = ibm2_numpy.train(*corpus, ITERATIONS)
+    for got, want in zip(_probabilities(model, *corpus), expected):
+        np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-12)
+
+
+def test_array_model_matches_nltk(corpus, models):
+    expected = _probabilities(models[0], *corpus)
+    model = ibm2_numpy.train(*corpus, ITERATIONS, model_format="array")
+    for got, want in zip(_probabilities(model, *corpus), expected):
+        np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_sharded_matches_single_process(corpus, workers):
+    prepared = ibm2_numpy.prepare(*corpus)
+    translation, alignment = ibm2_numpy.fit(prepared, ITERATIONS)
+    sharded = ibm2_numpy.fit(prepared, ITERATIONS, workers)
+    again = ibm2_numpy.fit(prepared, ITERATIONS, workers)
+    np.testing.assert_allclose(sharded[0], translation, rtol=1e-12)
+    for got, want in zip(sharded[1], alignment):
+        np.testing.assert_allclose(got, want, rtol=1e-12)
+    # Deterministic for a fixed number of shards
+    np.testing.assert_array_equal(again[0], sharded[0])
+    for got, want in zip(again[1], sharded[1]):
+        np.testing.assert_array_equal(got, want)
+
+
+@pytest.mark.parametrize("n_iter", [2, 2 * ITERATIONS + 2])
+def test_numpy_resume(corpus, tmp_path, monkeypatch, n_iter):
+    prepared = ibm2_numpy.prepare(*corpus)
+    translation, alignment = ibm2_numpy.fit(prepared, ITERATIONS)
+    checkpoint = str(tmp_path / "fwd.ckpt")
+    with monkeypatch.context() as patch:
+        _interrupt_after(patch, ibm2_numpy, n_iter)
+        with pytest.raises(Interrupted):
+            ibm2_numpy.fit(prepared, ITERATIONS, checkpoint=checkpoint)
+    resumed = ibm2_numpy.fit(prepared,
+                             ITERATIONS,
+                             checkpoint=checkpoint,
+                             resume=True)
+    np.testing.assert_array_equal(resumed[0], translation)
+    for got, want in zip(resumed[1], alignment):
+        np.testing.assert_array_equal(got, want)
+    with pytest.raises(ValueError):
+        ibm2_numpy.fit(prepared,
+                       ITERATIONS + 1,
+                       checkpoint=checkpoint,
+                       resume=True)
+
+
+@pytest.mark.parametrize("n_iter", [2, 2 * ITERATIONS + 2])
+def test_nltk_resume(corpus, models, tmp_path, monkeypatch, n_iter):
+    checkpoint = str(tmp_path / "fwd.ckpt")
+    with monkeypatch.context() as patch:
+        _interrupt_after(patch, ibm2, n_iter)
+        with pytest.raises(Interrupted):
+            ibm2.train(*corpus, ITERATIONS, checkpoint=checkpoint)
+    resumed = ibm2.train(*corpus,
+                         ITERATIONS,
+                         checkpoint=checkpoint,
+                         resume=True)
+    for got, want in zip(_probabilities(resumed, *corpus),
+                         _probabilities(models[0], *corpus)):
+        np.testing.assert_array_equal(got, want)
+    # Defaults of pairs not in the corpus
+    assert (resumed.translation_table["s00"]["t98"] ==
+            models[0].translation_table["s00"]["t98"])
+    source, target = corpus
+    with pytest.raises(ValueError):
+        ibm2.train(source[1:],
+                   target[1:],
+                   ITERATIONS,
+                   checkpoint=checkpoint,
+                   resume=True)
+
+
+@pytest.mark.parametrize("engine", [ibm2, ibm2_numpy])
+def test_log_names_model(corpus, tmp_path, caplog, engine):
+    checkpoint = str(tmp_path / "ibm2_fwd.model.ckpt")
+    with caplog.at_level("INFO"):
+        engine.train(*corpus,
+                     1,
+                     checkpoint=checkpoint,
+                     name="ibm2_fwd.model")
+    assert len(caplog.messages) == 3
+    for message in caplog.messages:
+        assert message.startswith("[INFO] ibm2_fwd.model: IBM ")
+        assert str(tmp_path) not in message
+
+
+def test_align_corpus_matches_aligned(corpus, models):
+    model = models[0]
+    sources = [s.split("/") for s in corpus[0]]
+    targets = [t.split("/") for t in corpus[1]]
+    # Unknown words and a length pair the model has not seen
+    sources.append(["s00", "s99", "s01", "s02", "s03", "s04", "s05", "s06"])
+    targets.append(["t00", "t98"])
+    expected = [
+        list(ibm2.aligned(source, target, model))
+        for source, target in zip(sources, targets)
+    ]
+    assert ibm2.align_corpus(sources, targets, model) == expected
+    array_model = ibm2_array.from_nltk(model)
+    assert ibm2.align_corpus(sources, targets, array_model) == expected
+    vocabulary = Vocabulary()
+    assert ibm2.align_corpus([vocabulary.encode(s) for s in sources],
+                             [vocabulary.encode(t) for t in targets], model,
+                             vocabulary) == expected
+
+
+def _source_sums(model):
+    """Return sum over target words of P(t | s) for every source word s."""
+    arrays = model.arrays
+    return np.bincount(arrays["indices"],
+                       arrays["data"])[np.unique(arrays["indices"])]
+
+
+@pytest.mark.parametrize("max_iter", [0, 2])
+def test_warm_start_stays_normalized(rows, max_iter):
+    old = [row for row in rows if row[5] != "ozawa"]
+    new = [row for row in rows if row[5] == "ozawa"]
+    # Words new to the model on both sides
+    new.append(["99", "s00/s98/s01", "", "t00/t97/t01", "", "ozawa"])
+    model = ibm2_numpy.train([row[1] for row in old], [row[3] for row in old],
+                             ITERATIONS,
+                             model_format="array")
+    np.testing.assert_allclose(_source_sums(model), 1, rtol=1e-9)
+    updated = ibm2_numpy.train_warm([row[1] for row in new],
+                                    [row[3] for row in new],
+                                    model,
+                                    max_iter,
+                                    len(new) / (len(old) + len(new)),
+                                    model_format="array")
+    np.testing.assert_allclose(_source_sums(updated), 1, rtol=1e-9)
@@ -0,0 +1,59 @@
+"""Streaming bitext ingestion against the in-memory path."""
+import argparse
+import os
+import random
+import pytest
+import make_bitext
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """Synthetic Hachidaishu file and translation file."""
+    rng = random.Random(0)
+    words = [f"BG-01-{k:04d}-01-010" for k in range(10)] + [
+        "BG-16-0000-00-000"
+    ]
+    with open(tmp_path / "hachidai.db", "w") as fp:
+        for anthology, n_poems in (("01", 20), ("02", 5)):
+            for poem in range(1, n_poems + 1):
+                for token in range(1, rng.randint(2, 8)):
+                    fp.write(f"{anthology}:{poem:06d}:{token:04d} "
+                             f"{rng.choice(['A00', 'B00', 'C01', 'D00'])} "
+                             f"{rng.choice(words)} x s{token} l r k kr\n")
+    with open(tmp_path / "translations.txt", "w") as fp:
+        for translator in make_bitext.translator_lst[:3]:
+            for poem in range(1, 22):
+                for _ in range(rng.randint(1, 6)):
+                    fp.write(f"v {translator} {poem} {rng.choice('0112')} "
+                             f"a b c {rng.choice(words)} w{poem} r l\n")
+    return tmp_path
+
+
+def _make_bitext(databases, name, stream, chunksize):
+    args = argparse.Namespace(src_path=str(databases / "hachidai.db"),
+                              tar_path=str(databases / "translations.txt"),
+                              out_path=str(databases / f"{name}.csv"),
+                              store_path=str(databases / name),
+                              vocab_path=None,
+                              chunksize=chunksize,
+                              stream=stream,
+                              jobs=1)
+    make_bitext.main(args)
+    return args
+
+
+def _read(fname):
+    with open(fname, "rb") as fp:
+        return fp.read()
+
+
+@pytest.mark.parametrize("chunksize", [5, 1000])
+def test_stream_matches_in_memory(databases, chunksize):
+    expected = _make_bitext(databases, "memory", False, None)
+    got = _make_bitext(databases, "stream", True, chunksize)
+    assert _read(got.out_path) == _read(expected.out_path)
+    assert sorted(os.listdir(got.store_path)) == sorted(
+        os.listdir(expected.store_path))
+    for fname in os.listdir(expected.store_path):
+        assert _read(os.path.join(got.store_path, fname)) == _read(
+            os.path.join(expected.store_path, fname))
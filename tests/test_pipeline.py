@@ -0,0 +1,114 @@
+"""Pipeline stage skipping and invalidation."""
+import pytest
+import pipeline
+
+# Copies its input to its output and counts its runs
+SCRIPT = """import sys
+source, output, runs = sys.argv[1:4]
+with open(source) as fp:
+    content = fp.read()
+with open(output, "w") as fp:
+    fp.write(content)
+with open(runs, "a") as fp:
+    fp.write(output + "\\n")
+"""
+
+
+@pytest.fixture
+def stages(tmp_path):
+    script = tmp_path / "copy.py"
+    script.write_text(SCRIPT)
+    (tmp_path / "input.txt").write_text("first")
+    runs = str(tmp_path / "runs.txt")
+
+    def stage(source, output, deps):
+        return {
+            "script": str(script),
+            "args": [str(tmp_path / source),
+                     str(tmp_path / output), runs],
+            "inputs": [str(tmp_path / source)] if not deps else [],
+            "outputs": [str(tmp_path / output)],
+            "deps": deps,
+        }
+
+    return {
+        "parse": stage("input.txt", "parsed.txt", []),
+        "train": stage("parsed.txt", "model.txt", ["parse"]),
+        "other": stage("input.txt", "other.txt", []),
+    }
+
+
+def _run(stages, manifest, tmp_path, targets=None, **options):
+    report = pipeline.run(stages, targets or list(stages), manifest,
+                          str(tmp_path / "pipeline.json"), **options)
+    return {name: status for name, (status, _) in report.items()}
+
+
+def _runs(tmp_path):
+    runs = tmp_path / "runs.txt"
+    lines = runs.read_text().split() if runs.exists() else []
+    runs.write_text("")
+    return sorted(line.rsplit("/", 1)[1] for line in lines)
+
+
+def test_skip_and_invalidate(stages, tmp_path):
+    manifest = pipeline.load_manifest(str(tmp_path / "pipeline.json"))
+    assert set(_run(stages, manifest, tmp_path).values()) == {"done"}
+    assert _runs(tmp_path) == ["model.txt", "other.txt", "parsed.txt"]
+
+    # Nothing changed, also for a manifest loaded again
+    manifest = pipeline.load_manifest(str(tmp_path / "pipeline.json"))
+    assert set(_run(stages, manifest, tmp_path).values()) == {"skipped"}
+    assert _runs(tmp_path) == []
+
+    # An edited input reruns its stages and the stages downstream
+    (tmp_path / "input.txt").write_text("second")
+    assert _run(stages, manifest, tmp_path, ["train"]) == {
+        "parse": "done",
+        "train": "done"
+    }
+    assert (tmp_path / "model.txt").read_text() == "second"
+    assert _run(stages, manifest, tmp_path) == {
+        "parse": "skipped",
+        "train": "skipped",
+        "other": "done"
+    }
+    assert _runs(tmp_path) == ["model.txt", "other.txt", "parsed.txt"]
+
+    # A missing output reruns its stage only
+    (tmp_path / "model.txt").unlink()
+    assert _run(stages, manifest, tmp_path) == {
+        "parse": "skipped",
+        "train": "done",
+        "other": "skipped"
+    }
+    # So do changed arguments
+    stages["other"]["args"].append("unused")
+    assert _run(stages, manifest, tmp_path, dry_run=True) == {
+        "parse": "skipped",
+        "train": "skipped",
+        "other": "outdated"
+    }
+    assert _run(stages, manifest, tmp_path, force=True) == {
+        "parse": "done",
+        "train": "done",
+        "other": "done"
+    }
+
+
+def test_failed_stage_blocks_dependents(stages, tmp_path):
+    manifest = pipeline.load_manifest(str(tmp_path / "pipeline.json"))
+    stages["parse"]["args"][0] = str(tmp_path / "missing.txt")
+    assert _run(stages, manifest, tmp_path) == {
+        "parse": "failed",
+        "train": "blocked",
+        "other": "done"
+    }
+    assert "parse" not in manifest["stages"]
+
+
+def test_local_modules():
+    modules = pipeline.local_modules("train_save_model.py")
+    names = [fname.rsplit("src/", 1)[1] for fname in modules]
+    assert "methods/ibm2.py" in names
+    assert "utils.py" in names